@@ -0,0 +1,611 @@
+"""
+Throughput of the build pipeline, stage by stage, on a synthetic repository.
+
+A Python repository of the requested shape is generated first, then every stage
+of a build is timed on its own: walking the directory, hashing, decoding and
+parsing, splitting into chunks, formatting with black, the combined chunking of
+iterate_processed_files, exporting the nodes and writing them to the database.
+Without --neo4j the writes go to an in-process stand-in of the driver, which
+measures the batching done on the client only. With --neo4j they go to the
+database configured by NEO4J_URI, NEO4J_NAME and NEO4J_PASSWORD, the benchmark
+repository is reset before and after.
+
+The report is JSON, written to --output or printed, and a previous report can be
+passed to --compare to print the throughput change of every stage:
+
+    python benchmarks/build_pipeline.py --files 2000 --output after.json \\
+        --compare before.json
+"""
+
+from __future__ import annotations
+
+import ast
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+from pathlib import Path
+from unittest import mock
+
+import click
+
+from lilith.core.code_file_splitting import NORMALIZE_FAST
+from lilith.core.code_file_splitting import NORMALIZE_NONE
+from lilith.core.code_file_splitting import format_code
+from lilith.core.code_file_splitting import get_function_and_class_bounds
+from lilith.core.code_tree import iterate_code_tree_streaming
+from lilith.core.code_tree import iterate_processed_files
+from lilith.core.code_tree import walk_code_tree
+from lilith.core.file_reading import decode_python_source
+from lilith.core.file_reading import hash_buffer
+from lilith.core.file_reading import open_file_buffer
+from lilith.core.metrics import get_peak_rss
+
+
+REPORT_VERSION = 1
+BENCHMARK_REPOSITORY = "lilith-benchmark"
+
+STAGES = (
+    "walk",
+    "hash",
+    "parse",
+    "split",
+    "format",
+    "chunk",
+    "export",
+    "db_write",
+)
+
+
+def generate_function(generator: random.Random, name: str, lines: int) -> list[str]:
+    parameters = ", ".join(f"arg_{i}" for i in range(generator.randint(0, 4)))
+    output = []
+
+    if generator.random() < 0.2:
+        output.append("@staticmethod" if generator.random() < 0.5 else "@cache")
+
+    prefix = "async def" if generator.random() < 0.1 else "def"
+    output.append(f"{prefix} {name}({parameters}):")
+    output.append(f'    """Synthetic function {name}."""')
+    output.append("    total = 0")
+
+    for i in range(max(lines - 4, 1)):
+        if i % 7 == 3:
+            output.append(f"    # step {i} of {name}")
+        elif i % 5 == 1:
+            output.append(f"    if total > {generator.randint(0, 1000)}:")
+            output.append(f"        total -= {generator.randint(1, 9)}")
+        else:
+            output.append(f"    total += {generator.randint(0, 100)} * {i}")
+
+    output.append("    return total")
+    return output
+
+
+def generate_module(
+    generator: random.Random,
+    module_index: int,
+    functions_per_file: int,
+    classes_per_file: int,
+    methods_per_class: int,
+    lines_per_function: int,
+) -> str:
+    lines = [
+        f'"""Synthetic module {module_index}."""',
+        "",
+        "import os",
+        "from functools import cache",
+        "",
+        f"CONSTANT_{module_index} = {generator.randint(0, 10_000)}",
+        "",
+    ]
+
+    for i in range(functions_per_file):
+        lines.extend(generate_function(generator, f"function_{i}", lines_per_function))
+        lines.append("")
+
+        # top level statements between definitions become code pieces
+        if i % 3 == 2:
+            lines.append(f"REGISTRY_{i} = [function_{i}]")
+            lines.append("")
+
+    for i in range(classes_per_file):
+        lines.append(f"class Class{i}:")
+        lines.append(f'    """Synthetic class {i}."""')
+        lines.append("")
+
+        for j in range(methods_per_class):
+            method = generate_function(generator, f"method_{j}", lines_per_function)
+            lines.extend(f"    {line}" for line in method)
+            lines.append("")
+
+    lines.append('if __name__ == "__main__":')
+    lines.append("    print(os.getcwd())")
+
+    return "\n".join(lines) + "\n"
+
+
+def generate_repository(
+    root: Path,
+    files: int,
+    depth: int,
+    fanout: int,
+    functions_per_file: int,
+    classes_per_file: int,
+    methods_per_class: int,
+    lines_per_function: int,
+    seed: int,
+) -> dict:
+    """
+    Writes a synthetic Python repository.
+
+    Folders form a tree of the given depth where every folder has fanout sub
+    folders, the files are spread over all folders round robin.
+
+    Returns:
+        dict: Number of 'files', 'folders', 'bytes' and 'lines' written.
+    """
+    generator = random.Random(seed)
+
+    folders = [root]
+    level = [root]
+    for _ in range(depth):
+        level = [folder / f"package_{i}" for folder in level for i in range(fanout)]
+        folders.extend(level)
+
+    for folder in folders:
+        folder.mkdir(parents=True, exist_ok=True)
+        (folder / "__init__.py").write_text("", encoding="utf-8")
+
+    total_bytes = 0
+    total_lines = 0
+
+    for i in range(files):
+        source = generate_module(
+            generator,
+            i,
+            functions_per_file,
+            classes_per_file,
+            methods_per_class,
+            lines_per_function,
+        )
+        (folders[i % len(folders)] / f"module_{i}.py").write_text(
+            source, encoding="utf-8"
+        )
+        total_bytes += len(source.encode("utf-8"))
+        total_lines += source.count("\n")
+
+    return {
+        "files": files + len(folders),
+        "folders": len(folders),
+        "bytes": total_bytes,
+        "lines": total_lines,
+    }
+
+
+class MockResult:
+    def consume(self):
+        return None
+
+    def single(self):
+        return {"node_count": 0, "deleted": 0}
+
+    def __iter__(self):
+        return iter(())
+
+
+class MockTransaction:
+    def __init__(self, driver: MockDriver) -> None:
+        self.__driver = driver
+
+    def run(self, query, parameters=None, **kwargs):
+        self.__driver.statement_count += 1
+        self.__driver.row_count += len(kwargs.get("rows", ()))
+        return MockResult()
+
+
+class MockSession:
+    def __init__(self, driver: MockDriver) -> None:
+        self.__driver = driver
+
+    def execute_write(self, work, *args):
+        return work(MockTransaction(self.__driver), *args)
+
+    def execute_read(self, work, *args):
+        return work(MockTransaction(self.__driver), *args)
+
+    def run(self, query, parameters=None, **kwargs):
+        return MockTransaction(self.__driver).run(query, parameters, **kwargs)
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class MockDriver:
+    """In-process stand-in of the neo4j driver, counting statements and rows."""
+
+    def __init__(self) -> None:
+        self.statement_count = 0
+        self.row_count = 0
+
+    def session(self, **kwargs):
+        return MockSession(self)
+
+    def verify_connectivity(self):
+        pass
+
+    def close(self):
+        pass
+
+
+class MockGraphDatabase:
+    driver_instance = None
+
+    @classmethod
+    def driver(cls, uri, auth=None, **kwargs):
+        cls.driver_instance = MockDriver()
+        return cls.driver_instance
+
+
+def run_stage(name: str, unit: str, work) -> dict:
+    """
+    Times one stage.
+
+    Args:
+        name (str): Name of the stage.
+        unit (str): What the counted items of the stage are.
+        work: Callable returning the number of processed items, or a tuple of the
+            items and the processed bytes.
+
+    Returns:
+        dict: The measurements of the stage.
+    """
+    start = time.perf_counter()
+    counts = work()
+    elapsed = time.perf_counter() - start
+
+    items, processed_bytes = counts if isinstance(counts, tuple) else (counts, None)
+
+    stage = {
+        "seconds": elapsed,
+        "items": items,
+        "unit": unit,
+        "items_per_second": items / elapsed if elapsed > 0 else None,
+        "peak_rss_bytes": get_peak_rss(),
+    }
+
+    if processed_bytes is not None:
+        stage["bytes_per_second"] = processed_bytes / elapsed if elapsed > 0 else None
+
+    click.echo(
+        f"{name:<10} {elapsed:9.3f} s  {stage['items_per_second'] or 0:12.0f} {unit}/s",
+        err=True,
+    )
+
+    return stage
+
+
+def benchmark_build(
+    root: Path,
+    jobs: int,
+    normalize: str,
+    batch_size: int,
+    neo4j: bool,
+    write_concurrency: int | None = None,
+) -> dict:
+    stages = {}
+    state = {}
+
+    def walk():
+        state["tree_root"], state["pending_files"] = walk_code_tree(
+            root, repository=BENCHMARK_REPOSITORY
+        )
+        return len(state["pending_files"])
+
+    def hash_files():
+        total_bytes = 0
+        for file_node in state["pending_files"]:
+            with open_file_buffer(file_node.file_path) as buffer:
+                hash_buffer(buffer)
+                total_bytes += len(buffer)
+        return len(state["pending_files"]), total_bytes
+
+    def parse():
+        state["sources"] = []
+        total_bytes = 0
+        for file_node in state["pending_files"]:
+            with open_file_buffer(file_node.file_path) as buffer:
+                source = decode_python_source(buffer)
+                total_bytes += len(buffer)
+            state["sources"].append((source, ast.parse(source, type_comments=True)))
+        return len(state["sources"]), total_bytes
+
+    def split():
+        state["chunks"] = [
+            chunk
+            for source, tree in state["sources"]
+            for chunk in get_function_and_class_bounds(tree, source)
+        ]
+        return len(state["chunks"])
+
+    def format_chunks():
+        for chunk in state["chunks"]:
+            format_code(chunk["code"], normalize=normalize)
+        return len(state["chunks"])
+
+    def chunk():
+        count = 0
+        for _ in iterate_processed_files(
+            state["pending_files"], jobs=jobs, normalize=NORMALIZE_NONE
+        ):
+            count += 1
+        return count
+
+    def export():
+        # the files are chunked already, the streaming export only walks the tree
+        state["nodes"] = [
+            node.dictify_for_neo4j()
+            for node in iterate_code_tree_streaming(
+                state["tree_root"], iter(state["pending_files"])
+            )
+        ]
+        return len(state["nodes"])
+
+    def db_write():
+        from lilith.database.database import Neo4jGraphDatabase
+
+        with Neo4jGraphDatabase(batch_size=batch_size) as db:
+            if neo4j:
+                db.reset_database(repository=BENCHMARK_REPOSITORY)
+
+            start = time.perf_counter()
+            written = db.insert_data(
+                iter(state["nodes"]),
+                write_concurrency=write_concurrency if neo4j else None,
+            )
+            state["db_write_seconds"] = time.perf_counter() - start
+
+            if neo4j:
+                db.reset_database(repository=BENCHMARK_REPOSITORY)
+
+        return written
+
+    stages["walk"] = run_stage("walk", "file", walk)
+    stages["hash"] = run_stage("hash", "file", hash_files)
+    stages["parse"] = run_stage("parse", "file", parse)
+    stages["split"] = run_stage("split", "chunk", split)
+    stages["format"] = run_stage("format", "chunk", format_chunks)
+    stages["chunk"] = run_stage("chunk", "file", chunk)
+    stages["export"] = run_stage("export", "node", export)
+
+    if neo4j:
+        stages["db_write"] = run_stage("db_write", "node", db_write)
+    else:
+        with mock.patch.dict(
+            os.environ,
+            {
+                "NEO4J_URI": "bolt://mock",
+                "NEO4J_NAME": "mock",
+                "NEO4J_PASSWORD": "mock",
+            },
+        ), mock.patch("lilith.database.database.GraphDatabase", MockGraphDatabase):
+            stages["db_write"] = run_stage("db_write", "node", db_write)
+
+        stages["db_write"][
+            "statements"
+        ] = MockGraphDatabase.driver_instance.statement_count
+
+    return stages
+
+
+def get_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=Path(__file__).parent,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def merge_runs(runs: list[dict]) -> dict:
+    """Takes the median of every timing over the repeated runs."""
+    stages = {}
+
+    for name in runs[0]:
+        median_run = sorted(runs, key=lambda run: run[name]["seconds"])[len(runs) // 2]
+        stages[name] = {
+            **median_run[name],
+            "seconds_all": [run[name]["seconds"] for run in runs],
+            "seconds_stdev": (
+                statistics.stdev(run[name]["seconds"] for run in runs)
+                if len(runs) > 1
+                else 0.0
+            ),
+        }
+
+    return stages
+
+
+def print_comparison(report: dict, baseline: dict) -> None:
+    click.echo(
+        f"{'stage':<10} {'baseline':>14} {'current':>14} {'change':>8}", err=True
+    )
+
+    for name in STAGES:
+        current = report["stages"].get(name, {}).get("items_per_second")
+        previous = baseline.get("stages", {}).get(name, {}).get("items_per_second")
+
+        if not current or not previous:
+            continue
+
+        click.echo(
+            f"{name:<10} {previous:14.0f} {current:14.0f} {current / previous - 1:+8.1%}",
+            err=True,
+        )
+
+
+@click.command()
+@click.option("--files", default=1000, show_default=True, help="Python modules.")
+@click.option("--depth", default=3, show_default=True, help="Folder depth.")
+@click.option("--fanout", default=3, show_default=True, help="Sub folders per folder.")
+@click.option("--functions-per-file", default=10, show_default=True)
+@click.option("--classes-per-file", default=2, show_default=True)
+@click.option("--methods-per-class", default=5, show_default=True)
+@click.option(
+    "--lines-per-function",
+    default=15,
+    show_default=True,
+    help="Controls the file size together with the counts above.",
+)
+@click.option("--seed", default=0, show_default=True)
+@click.option(
+    "--jobs", "-j", default=1, show_default=True, help="Workers of the chunk stage."
+)
+@click.option(
+    "--normalize",
+    type=click.Choice([NORMALIZE_FAST, "full"]),
+    default=NORMALIZE_FAST,
+    show_default=True,
+    help="Black mode of the format stage.",
+)
+@click.option("--batch-size", default=5000, show_default=True)
+@click.option(
+    "--repeat", default=1, show_default=True, help="Runs, the median is reported."
+)
+@click.option(
+    "--neo4j", is_flag=True, help="Write to a database instead of the stand-in."
+)
+@click.option(
+    "--write-concurrency",
+    type=int,
+    default=None,
+    help="Write with the pipelined writer and this many transactions, with --neo4j.",
+)
+@click.option(
+    "--repository-dir",
+    type=click.Path(file_okay=False, path_type=Path),
+    default=None,
+    help="Generate the repository here and keep it, defaults to a temporary directory.",
+)
+@click.option(
+    "--output",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="Write the JSON report here instead of printing it.",
+)
+@click.option(
+    "--compare",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=None,
+    help="Previous JSON report to compare the throughput with.",
+)
+def main(
+    files,
+    depth,
+    fanout,
+    functions_per_file,
+    classes_per_file,
+    methods_per_class,
+    lines_per_function,
+    seed,
+    jobs,
+    normalize,
+    batch_size,
+    repeat,
+    neo4j,
+    write_concurrency,
+    repository_dir,
+    output,
+    compare,
+):
+    parameters = {
+        "files": files,
+        "depth": depth,
+        "fanout": fanout,
+        "functions_per_file": functions_per_file,
+        "classes_per_file": classes_per_file,
+        "methods_per_class": methods_per_class,
+        "lines_per_function": lines_per_function,
+        "seed": seed,
+        "jobs": jobs,
+        "normalize": normalize,
+        "batch_size": batch_size,
+        "repeat": repeat,
+        "neo4j": neo4j,
+        "write_concurrency": write_concurrency,
+    }
+
+    temporary_dir = None
+    if repository_dir is None:
+        temporary_dir = tempfile.mkdtemp(prefix="lilith-benchmark-")
+        repository_dir = Path(temporary_dir)
+
+    try:
+        start = time.perf_counter()
+        repository = generate_repository(
+            repository_dir,
+            files=files,
+            depth=depth,
+            fanout=fanout,
+            functions_per_file=functions_per_file,
+            classes_per_file=classes_per_file,
+            methods_per_class=methods_per_class,
+            lines_per_function=lines_per_function,
+            seed=seed,
+        )
+        click.echo(
+            f"Generated {repository['files']} files, {repository['bytes']} bytes in "
+            f"{time.perf_counter() - start:.2f}s",
+            err=True,
+        )
+
+        runs = [
+            benchmark_build(
+                repository_dir, jobs, normalize, batch_size, neo4j, write_concurrency
+            )
+            for _ in range(repeat)
+        ]
+    finally:
+        if temporary_dir is not None:
+            shutil.rmtree(temporary_dir, ignore_errors=True)
+
+    stages = merge_runs(runs)
+    report = {
+        "version": REPORT_VERSION,
+        "commit": get_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "parameters": parameters,
+        "repository": repository,
+        "stages": stages,
+        "total_seconds": sum(stage["seconds"] for stage in stages.values()),
+    }
+
+    if output is None:
+        click.echo(json.dumps(report, indent=2))
+    else:
+        output.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    if compare is not None:
+        print_comparison(report, json.loads(compare.read_text(encoding="utf-8")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+"""
+Latency of the top-k similarity search, Neo4j vector index against the brute-force
+NumPy fallback, on synthetic embeddings.
+
+Without --neo4j only the in-process BruteForceVectorIndex is measured. With --neo4j
+the synthetic chunks are written as their own repository to the database
+configured by NEO4J_URI, NEO4J_NAME and NEO4J_PASSWORD, and deleted again after
+every size. The vector index is dropped for the brute-force measurement, an
+existing one is recreated with its settings afterwards:
+
+    python benchmarks/vector_search.py --sizes 10000,100000,1000000 --neo4j
+"""
+
+from __future__ import annotations
+
+import statistics
+import time
+
+import click
+
+from lilith.database.vector_search import BruteForceVectorIndex
+from lilith.database.vector_search import import_numpy
+
+
+CHUNK_TYPES = ("function", "class", "code_piece")
+
+BENCHMARK_REPOSITORY = "lilith-vector-benchmark"
+
+
+def generate_vectors(count: int, dimensions: int, seed: int):
+    numpy = import_numpy()
+
+    generator = numpy.random.default_rng(seed)
+    return generator.standard_normal((count, dimensions), dtype=numpy.float32)
+
+
+def generate_nodes(vectors):
+    for i, vector in enumerate(vectors):
+        yield {
+            "id": f"benchmark-{i}",
+            "type": CHUNK_TYPES[i % len(CHUNK_TYPES)],
+            "repository": BENCHMARK_REPOSITORY,
+            "name": f"chunk_{i}",
+            "path": f"benchmark/module_{i // 100}.py",
+            "parent": None,
+            "code_content": "pass",
+            "embedding": vector.tolist(),
+            "description": None,
+            "content_hash": None,
+            "start_line": 1,
+            "end_line": 1,
+        }
+
+
+def measure(search, queries) -> list[float]:
+    timings = []
+
+    for query in queries:
+        start = time.perf_counter()
+        search(query)
+        timings.append((time.perf_counter() - start) * 1000)
+
+    return timings
+
+
+def format_timings(label: str, size: int, timings: list[float]) -> str:
+    timings = sorted(timings)
+    p95 = timings[min(len(timings) - 1, int(len(timings) * 0.95))]
+
+    return (
+        f"{label:<28} {size:>9} "
+        f"p50 {statistics.median(timings):9.2f} ms  p95 {p95:9.2f} ms"
+    )
+
+
+def get_recall(expected: list[list[str]], actual: list[list[str]]) -> float:
+    hits = sum(len(set(e) & set(a)) for e, a in zip(expected, actual))
+    total = sum(len(e) for e in expected)
+
+    return hits / total if total else 1.0
+
+
+def benchmark_neo4j(vectors, queries, k: int, type_filter, batch_size: int) -> None:
+    from lilith.database.database import Neo4jGraphDatabase
+
+    with Neo4jGraphDatabase(batch_size=batch_size) as db:
+        # search_similar only searches brute-force without an online index
+        vector_index = db.get_vector_index()
+        db.drop_vector_index()
+        db.reset_database(repository=BENCHMARK_REPOSITORY)
+
+        try:
+            benchmark_neo4j_searches(db, vectors, queries, k, type_filter)
+        finally:
+            db.reset_database(repository=BENCHMARK_REPOSITORY)
+            db.drop_vector_index()
+
+            if vector_index is not None:
+                db.ensure_vector_index(
+                    vector_index["dimensions"], vector_index["similarity"]
+                )
+
+
+def benchmark_neo4j_searches(db, vectors, queries, k: int, type_filter) -> None:
+    size = len(vectors)
+
+    db.insert_data(generate_nodes(vectors))
+
+    start = time.perf_counter()
+    db.search_similar(queries[0].tolist(), k, type_filter)
+    click.echo(
+        f"{'neo4j brute-force load':<28} {size:>9} "
+        f"{(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+
+    exact = []
+    timings = measure(
+        lambda query: exact.append(
+            [row["id"] for row in db.search_similar(query.tolist(), k, type_filter)]
+        ),
+        queries,
+    )
+    click.echo(format_timings("neo4j brute-force", size, timings))
+
+    start = time.perf_counter()
+    db.ensure_vector_index(vectors.shape[1])
+    click.echo(
+        f"{'neo4j vector index build':<28} {size:>9} "
+        f"{(time.perf_counter() - start) * 1000:.0f} ms"
+    )
+
+    approximate = []
+    timings = measure(
+        lambda query: approximate.append(
+            [row["id"] for row in db.search_similar(query.tolist(), k, type_filter)]
+        ),
+        queries,
+    )
+    click.echo(format_timings("neo4j vector index", size, timings))
+    click.echo(
+        f"{'vector index recall':<28} {size:>9} {get_recall(exact, approximate):.3f}"
+    )
+
+
+@click.command()
+@click.option(
+    "--sizes",
+    default="10000,100000,1000000",
+    show_default=True,
+    help="Comma separated numbers of chunks.",
+)
+@click.option("--dimensions", default=256, show_default=True)
+@click.option("--queries", "query_count", default=100, show_default=True)
+@click.option("-k", default=10, show_default=True)
+@click.option(
+    "--type-filter",
+    type=click.Choice(CHUNK_TYPES),
+    default=None,
+    help="Only search chunks of this type.",
+)
+@click.option("--neo4j", is_flag=True, help="Also benchmark against a database.")
+@click.option("--batch-size", default=5000, show_default=True)
+@click.option("--seed", default=0, show_default=True)
+def main(sizes, dimensions, query_count, k, type_filter, neo4j, batch_size, seed):
+    for size in (int(size) for size in sizes.split(",")):
+        vectors = generate_vectors(size, dimensions, seed)
+        queries = generate_vectors(query_count, dimensions, seed + 1)
+        types = [CHUNK_TYPES[i % len(CHUNK_TYPES)] for i in range(size)]
+
+        start = time.perf_counter()
+        index = BruteForceVectorIndex(
+            [f"benchmark-{i}" for i in range(size)], types, vectors
+        )
+        click.echo(
+            f"{'numpy index build':<28} {size:>9} "
+            f"{(time.perf_counter() - start) * 1000:.0f} ms"
+        )
+
+        timings = measure(
+            lambda query, index=index: index.search(query, k, type_filter), queries
+        )
+        click.echo(format_timings("numpy brute-force", size, timings))
+
+        if neo4j:
+            benchmark_neo4j(vectors, queries, k, type_filter, batch_size)
+
+
+if __name__ == "__main__":
+    main()
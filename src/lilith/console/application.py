@@ -52,10 +52,251 @@ def cli(app, log_level):
     help="Path to the project root directory.",
 )
 @click.option(
-    "--reset", is_flag=True, default=False, help="Reset the build before starting."
+    "--reset",
+    is_flag=True,
+    default=False,
+    help="Delete the nodes of the repository before starting.",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=5000,
+    show_default=True,
+    help="Number of rows written to the database per transaction.",
+)
+@click.option(
+    "--incremental",
+    is_flag=True,
+    default=False,
+    help="Only re-ingest files that were added, changed or removed since the last build.",
+)
+@click.option(
+    "--merge",
+    is_flag=True,
+    default=False,
+    help="Upsert nodes by their deterministic id instead of requiring an empty database. Every file is split again, and files, folders and chunks removed from the project are deleted as in --incremental builds.",
+)
+@click.option(
+    "--pipeline/--no-pipeline",
+    default=True,
+    show_default=True,
+    help="Write batches to the database concurrently while the project is still being split, instead of one after another.",
+)
+@click.option(
+    "--write-concurrency",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Write transactions in flight at the same time with --pipeline.",
+)
+@click.option(
+    "--queue-size",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Batches waiting to be written before splitting is paused, with --pipeline.",
+)
+@click.option(
+    "--jobs",
+    "-j",
+    type=click.IntRange(min=1),
+    default=1,
+    show_default=True,
+    help="Number of worker processes used to split code files into chunks.",
+)
+@click.option(
+    "--max-file-size",
+    type=click.IntRange(min=0),
+    default=5 * 1024 * 1024,
+    show_default=True,
+    help="Python files larger than this many bytes are not split into chunks.",
+)
+@click.option(
+    "--normalize",
+    type=click.Choice(["none", "fast", "full"]),
+    default="none",
+    show_default=True,
+    help="How chunks are normalized: keep the source, black with fast=True, or black with the AST equivalence check.",
+)
+@click.option(
+    "--max-chunk-depth",
+    type=click.IntRange(min=0),
+    default=2,
+    show_default=True,
+    help="Nesting depth of chunks: methods and nested classes of large classes become child nodes of their class, 0 keeps every class a single chunk.",
+)
+@click.option(
+    "--split-min-lines",
+    type=click.IntRange(min=0),
+    default=100,
+    show_default=True,
+    help="Classes spanning at most this many lines are not split into method chunks.",
+)
+@click.option(
+    "--max-chunk-size",
+    type=click.IntRange(min=1),
+    default=24_000,
+    show_default=True,
+    help="Size limit of chunks in characters, about 8000 tokens by default. Larger functions, classes and code pieces are split at statement boundaries into ordered parts.",
+)
+@click.option(
+    "--chunk-overlap-lines",
+    type=click.IntRange(min=0),
+    default=2,
+    show_default=True,
+    help="Lines of the previous part repeated at the start of the next part of a split chunk.",
+)
+@click.option(
+    "--format-cache/--no-format-cache",
+    default=True,
+    show_default=True,
+    help="Reuse black formatted chunks from the on-disk cache across builds.",
+)
+@click.option(
+    "--parse-cache/--no-parse-cache",
+    default=True,
+    show_default=True,
+    help="Reuse the chunks of unchanged files from .lilith/parse_cache.sqlite3 in the project.",
+)
+@click.option(
+    "--parse-cache-size",
+    type=click.IntRange(min=1),
+    default=256,
+    show_default=True,
+    help="Size limit of the parse cache in MiB, least recently used files are evicted first.",
+)
+@click.option(
+    "--exclude",
+    "exclude_patterns",
+    multiple=True,
+    help="Gitignore style pattern of paths to leave out of the build, can be repeated.",
+)
+@click.option(
+    "--default-excludes/--no-default-excludes",
+    default=True,
+    show_default=True,
+    help="Leave out VCS, virtualenv, cache and build directories.",
+)
+@click.option(
+    "--gitignore/--no-gitignore",
+    default=True,
+    show_default=True,
+    help="Respect .gitignore files in the project.",
+)
+@click.option(
+    "--embed",
+    type=click.Choice(["none", "openai", "hash"]),
+    default="none",
+    show_default=True,
+    help="Embedding backend for code chunks: an OpenAI compatible API, or the local deterministic 'hash' stand-in.",
+)
+@click.option(
+    "--embedding-model",
+    default=None,
+    help="Model of the openai embedding backend, defaults to $OPENAI_EMBEDDING_MODEL or text-embedding-3-small.",
+)
+@click.option(
+    "--embedding-dimensions",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Size of the embedding vectors.",
+)
+@click.option(
+    "--embedding-concurrency",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Maximum number of embedding requests in flight.",
+)
+@click.option(
+    "--embedding-batch-tokens",
+    type=click.IntRange(min=1),
+    default=100_000,
+    show_default=True,
+    help="Estimated token budget of one embedding request.",
+)
+@click.option(
+    "--vector-similarity",
+    type=click.Choice(["cosine", "euclidean"]),
+    default="cosine",
+    show_default=True,
+    help="Similarity function of the vector index created over the embeddings.",
+)
+@click.option(
+    "--repository",
+    default=None,
+    help="Namespace of the project in the database, defaults to the name of its folder followed by a short hash of its resolved path. Projects of different namespaces are built and reset independently.",
+)
+@click.option(
+    "--export-dir",
+    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
+    default=None,
+    help="Write the graph as files for neo4j-admin database import instead of into the database, for fast first-time builds.",
+)
+@click.option(
+    "--export-format",
+    type=click.Choice(["csv", "parquet"]),
+    default="csv",
+    show_default=True,
+    help="Format of the --export-dir files, parquet requires pyarrow.",
+)
+@click.option(
+    "--profile",
+    "profile_path",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="Profile the build with cProfile and write the pstats file here.",
+)
+@click.option(
+    "--metrics-file",
+    type=click.Path(dir_okay=False, path_type=Path),
+    default=None,
+    help="Write stage timings, counters, rates and peak memory of the build here.",
+)
+@click.option(
+    "--metrics-format",
+    type=click.Choice(["json", "prometheus"]),
+    default="json",
+    show_default=True,
+    help="Format of the --metrics-file, prometheus writes the text exposition format.",
 )
 @click.pass_context
-def build(ctx, path, reset):
+def build(
+    ctx,
+    path,
+    reset,
+    batch_size,
+    incremental,
+    merge,
+    pipeline,
+    write_concurrency,
+    queue_size,
+    jobs,
+    max_file_size,
+    normalize,
+    max_chunk_depth,
+    split_min_lines,
+    max_chunk_size,
+    chunk_overlap_lines,
+    format_cache,
+    parse_cache,
+    parse_cache_size,
+    exclude_patterns,
+    default_excludes,
+    gitignore,
+    embed,
+    embedding_model,
+    embedding_dimensions,
+    embedding_concurrency,
+    embedding_batch_tokens,
+    vector_similarity,
+    repository,
+    export_dir,
+    export_format,
+    profile_path,
+    metrics_file,
+    metrics_format,
+):
     """Builds the project at the specified path."""
 
     build_path = Path(path).resolve()
@@ -63,7 +304,40 @@ def build(ctx, path, reset):
         from lilith.console.commands.build import BuildCommand
 
         logger.info(f"Building project at {build_path}")
-        BuildCommand(build_path=build_path, reset=reset).run()
+        BuildCommand(
+            build_path=build_path,
+            reset=reset,
+            batch_size=batch_size,
+            incremental=incremental,
+            merge=merge,
+            write_concurrency=write_concurrency if pipeline else None,
+            queue_size=queue_size,
+            jobs=jobs,
+            max_file_size=max_file_size,
+            normalize=normalize,
+            max_chunk_depth=max_chunk_depth,
+            split_min_lines=split_min_lines,
+            max_chunk_size=max_chunk_size,
+            chunk_overlap_lines=chunk_overlap_lines,
+            format_cache=format_cache,
+            parse_cache=parse_cache,
+            parse_cache_size=parse_cache_size,
+            exclude_patterns=exclude_patterns,
+            use_default_excludes=default_excludes,
+            use_gitignore=gitignore,
+            embed=embed,
+            embedding_model=embedding_model,
+            embedding_dimensions=embedding_dimensions,
+            embedding_concurrency=embedding_concurrency,
+            embedding_batch_tokens=embedding_batch_tokens,
+            vector_similarity=vector_similarity,
+            repository=repository,
+            export_dir=export_dir,
+            export_format=export_format,
+            profile_path=profile_path,
+            metrics_file=metrics_file,
+            metrics_format=metrics_format,
+        ).run()
         return 0
 
     except Exception as e:
@@ -72,6 +346,202 @@ def build(ctx, path, reset):
         return 1
 
 
+@cli.command()
+@click.option(
+    "--path",
+    type=click.Path(file_okay=False, dir_okay=True, path_type=Path),
+    default=None,
+    help="Only delete the nodes of the project built from this path, as given to build.",
+)
+@click.option(
+    "--repository",
+    default=None,
+    help="Only delete the nodes of this repository namespace.",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=5000,
+    show_default=True,
+    help="Number of nodes deleted per transaction.",
+)
+@click.option("--yes", is_flag=True, default=False, help="Do not ask for confirmation.")
+def reset(path, repository, batch_size, yes):
+    """Deletes the built graph, or only the nodes of one project."""
+
+    try:
+        from lilith.console.commands.reset import ResetCommand
+
+        command = ResetCommand(
+            root_path=path, repository=repository, batch_size=batch_size
+        )
+
+        if repository is not None:
+            target = f"every node of repository {repository}"
+        elif path is not None:
+            target = f"every node of {path.resolve()}"
+        else:
+            target = "the whole database"
+
+        if not yes and not click.confirm(f"Delete {target}?"):
+            return 1
+
+        command.run()
+        return 0
+
+    except Exception as e:
+        logger.error(f"An error occurred during reset: {e}")
+        logger.info(traceback.format_exc())
+        return 1
+
+
+@cli.command()
+@click.option(
+    "--backend",
+    type=click.Choice(["openai", "mock"]),
+    default="openai",
+    show_default=True,
+    help="Language model backend, 'mock' generates placeholder descriptions offline.",
+)
+@click.option(
+    "--model",
+    default=None,
+    help="Model of the openai backend, defaults to $OPENAI_DESCRIPTION_MODEL or gpt-4o-mini.",
+)
+@click.option(
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=4,
+    show_default=True,
+    help="Maximum number of description requests in flight.",
+)
+@click.option(
+    "--tokens-per-minute",
+    type=click.IntRange(min=1),
+    default=200_000,
+    show_default=True,
+    help="Estimated prompt and completion tokens sent per minute.",
+)
+@click.option(
+    "--max-retries",
+    type=click.IntRange(min=0),
+    default=5,
+    show_default=True,
+    help="Retries of a request failing on rate limits, timeouts or server errors.",
+)
+@click.option(
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=5000,
+    show_default=True,
+    help="Number of chunks read from and written to the database per transaction.",
+)
+@click.option(
+    "--cache/--no-cache",
+    default=True,
+    show_default=True,
+    help="Reuse descriptions of identical code from the description cache.",
+)
+@click.option(
+    "--repository",
+    default=None,
+    help="Only describe the chunks of this repository namespace.",
+)
+def describe(
+    backend,
+    model,
+    concurrency,
+    tokens_per_minute,
+    max_retries,
+    batch_size,
+    cache,
+    repository,
+):
+    """Generates descriptions of the functions and classes in the graph."""
+
+    try:
+        from lilith.console.commands.describe import DescribeCommand
+
+        DescribeCommand(
+            backend=backend,
+            model=model,
+            concurrency=concurrency,
+            tokens_per_minute=tokens_per_minute,
+            max_retries=max_retries,
+            batch_size=batch_size,
+            use_cache=cache,
+            repository=repository,
+        ).run()
+        return 0
+
+    except Exception as e:
+        logger.error(f"An error occurred during describe: {e}")
+        logger.info(traceback.format_exc())
+        return 1
+
+
+@cli.command()
+@click.option("--host", default="127.0.0.1", show_default=True)
+@click.option("--port", type=click.IntRange(1, 65535), default=8000, show_default=True)
+@click.option(
+    "--query-timeout",
+    type=click.FloatRange(min=0, min_open=True),
+    default=10.0,
+    show_default=True,
+    help="Transaction timeout of every query in seconds.",
+)
+@click.option(
+    "--max-connections",
+    type=click.IntRange(min=1),
+    default=100,
+    show_default=True,
+    help="Size of the connection pool shared by all requests.",
+)
+@click.option(
+    "--embed",
+    type=click.Choice(["none", "openai", "hash"]),
+    default="none",
+    show_default=True,
+    help="Embedding backend for text similarity searches, the one the graph was built with.",
+)
+@click.option("--embedding-model", default=None, help="Model of the openai backend.")
+@click.option(
+    "--embedding-dimensions",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Size of the embedding vectors.",
+)
+def serve(
+    host,
+    port,
+    query_timeout,
+    max_connections,
+    embed,
+    embedding_model,
+    embedding_dimensions,
+):
+    """Serves read-only queries over the built graph."""
+
+    try:
+        from lilith.console.commands.serve import ServeCommand
+
+        ServeCommand(
+            host=host,
+            port=port,
+            query_timeout=query_timeout,
+            max_connections=max_connections,
+            embed=embed,
+            embedding_model=embedding_model,
+            embedding_dimensions=embedding_dimensions,
+        ).run()
+        return 0
+
+    except Exception as e:
+        logger.error(f"An error occurred while serving: {e}")
+        logger.info(traceback.format_exc())
+        return 1
+
+
 def main():
     app = Application()
     exit_code = app.run()
@@ -1,43 +1,389 @@
 from __future__ import annotations
 
+import hashlib
+import io
 import logging
+import os
 
-from typing import TYPE_CHECKING
+from contextlib import nullcontext
+from pathlib import Path
 
 from lilith.console.utils import ConsoleError
 
 
-if TYPE_CHECKING:
-    from pathlib import Path
-
 logger = logging.getLogger(__name__)
 
+# functions listed in the log when profiling
+PROFILE_SUMMARY_LINES = 25
+
+# hex digits of the path hash in default repository names
+REPOSITORY_HASH_LENGTH = 8
+
+
+def get_default_repository(build_path: Path) -> str:
+    """
+    Returns the repository namespace of a project built without --repository.
+
+    The name of the folder is followed by a short hash of its resolved path, so
+    folders of the same name in different places are kept apart.
+
+    Args:
+        build_path (Path): The project root.
+
+    Returns:
+        str: The repository name, e.g. 'project-1a2b3c4d'.
+    """
+    resolved_path = Path(build_path).resolve()
+    path_hash = hashlib.sha256(os.fspath(resolved_path).encode("utf-8")).hexdigest()
+    return f"{resolved_path.name}-{path_hash[:REPOSITORY_HASH_LENGTH]}"
+
 
 class BuildCommand:
-    def __init__(self, build_path: Path, reset: bool) -> None:
+    def __init__(
+        self,
+        build_path: Path,
+        reset: bool,
+        batch_size: int,
+        incremental: bool,
+        merge: bool,
+        write_concurrency: int | None,
+        queue_size: int,
+        jobs: int,
+        max_file_size: int,
+        normalize: str,
+        max_chunk_depth: int,
+        split_min_lines: int,
+        max_chunk_size: int,
+        chunk_overlap_lines: int,
+        format_cache: bool,
+        parse_cache: bool,
+        parse_cache_size: int,
+        exclude_patterns: tuple[str, ...],
+        use_default_excludes: bool,
+        use_gitignore: bool,
+        embed: str,
+        embedding_model: str | None,
+        embedding_dimensions: int | None,
+        embedding_concurrency: int,
+        embedding_batch_tokens: int,
+        vector_similarity: str,
+        repository: str | None,
+        export_dir: Path | None,
+        export_format: str,
+        profile_path: Path | None = None,
+        metrics_file: Path | None = None,
+        metrics_format: str = "json",
+    ) -> None:
         self.path = build_path
         self.reset = reset
+        self.batch_size = batch_size
+        self.incremental = incremental
+        self.merge = merge
+        self.write_concurrency = write_concurrency
+        self.queue_size = queue_size
+        self.jobs = jobs
+        self.max_file_size = max_file_size
+        self.normalize = normalize
+        self.max_chunk_depth = max_chunk_depth
+        self.split_min_lines = split_min_lines
+        self.max_chunk_size = max_chunk_size
+        self.chunk_overlap_lines = chunk_overlap_lines
+        self.format_cache = None
+        self.parse_cache = parse_cache
+        self.parse_cache_size = parse_cache_size
+        self.exclude_patterns = exclude_patterns
+        self.use_default_excludes = use_default_excludes
+        self.use_gitignore = use_gitignore
+        self.embed = embed
+        self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
+        self.embedding_concurrency = embedding_concurrency
+        self.embedding_batch_tokens = embedding_batch_tokens
+        self.vector_similarity = vector_similarity
+        self.repository = repository or get_default_repository(build_path)
+        self.export_dir = export_dir
+        self.export_format = export_format
+        self.profile_path = profile_path
+        self.metrics_file = metrics_file
+        self.metrics_format = metrics_format
+        self.embedding_pipeline = None
+
+        if self.reset and self.incremental:
+            raise ConsoleError(
+                "The --reset and --incremental options cannot be used together."
+            )
+
+        if self.export_dir is not None and (self.reset or self.incremental or merge):
+            raise ConsoleError(
+                "The --export-dir option writes files for an offline import, it cannot be used with --reset, --incremental or --merge."
+            )
+
+        # chunks are only formatted, and the cache only used, when normalizing
+        if format_cache and normalize != "none":
+            from lilith.core.format_cache import FormatCache
+            from lilith.core.utils import get_cache_dir
+
+            self.format_cache = FormatCache(get_cache_dir() / "format")
 
     def run(self):
-        from lilith.core.code_tree import build_tree_recursive
-        from lilith.core.code_tree import export_code_tree
-        from lilith.database.database import Neo4jGraphDatabase
+        import cProfile
+
+        from lilith.core.metrics import build_metrics
 
-        tree_root = build_tree_recursive(self.path)
-        export_data = export_code_tree(tree_root)
+        build_metrics.reset()
+        profiler = cProfile.Profile() if self.profile_path is not None else None
 
-        with Neo4jGraphDatabase() as db:
+        try:
+            with build_metrics.timer("total"):
+                if profiler is not None:
+                    profiler.enable()
 
-            if self.reset:
-                logger.info("Resetting database...")
-                db.reset_database()
+                try:
+                    self.__run()
+                finally:
+                    if profiler is not None:
+                        profiler.disable()
+        finally:
+            # a failed build is reported as well, it is the one worth looking at
+            self.__report_metrics(profiler)
+
+    def __report_metrics(self, profiler) -> None:
+        from lilith.core.metrics import build_metrics
+
+        snapshot = build_metrics.snapshot()
+        timers = snapshot["timers"]
+        counters = snapshot["counters"]
+
+        logger.info(
+            f"Build took {timers.get('total', 0):.2f}s: walk {timers.get('walk', 0):.2f}s, "
+            f"read {timers.get('file_read', 0):.2f}s, parse {timers.get('file_parse', 0):.2f}s, "
+            f"format {timers.get('file_format', 0):.2f}s, database {timers.get('db_write', 0):.2f}s; "
+            f"{counters.get('files_processed', 0)} files, {counters.get('bytes_read', 0)} bytes, "
+            f"{counters.get('chunks_produced', 0)} chunks, "
+            f"{counters.get('db_transactions', 0)} transactions."
+        )
+
+        if self.metrics_file is not None:
+            build_metrics.write(
+                self.metrics_file,
+                metrics_format=self.metrics_format,
+                labels={"repository": self.repository},
+            )
+            logger.info(f"Metrics written to {self.metrics_file}.")
+
+        if profiler is not None:
+            import pstats
+
+            profiler.dump_stats(self.profile_path)
+            logger.info(
+                f"Profile written to {self.profile_path}, worker processes and the "
+                "writer thread are not included. Top functions by cumulative time:"
+            )
+
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(
+                PROFILE_SUMMARY_LINES
+            )
+            logger.info(stream.getvalue())
+
+    def __run(self):
+        logger.info(f"Repository namespace: {self.repository}")
+
+        if self.export_dir is not None:
+            self.__run_export()
+            return
+
+        from lilith.database.database import Neo4jGraphDatabase
+
+        with Neo4jGraphDatabase(
+            batch_size=self.batch_size
+        ) as db, self.__create_embedding_pipeline() as embedding_pipeline:
+            self.embedding_pipeline = embedding_pipeline
+
+            if self.incremental:
+                self.__run_incremental(db)
             else:
-                node_count = db.get_node_count()
-                if node_count > 0:
-                    raise ConsoleError(
-                        f"The database currently contains {node_count} nodes. To rebuild the database and start fresh, please run the build command again with the --reset option."
-                    )
+                self.__run_full(db)
 
-            db.insert_data(export_data)
+            if embedding_pipeline is not None:
+                self.__create_vector_index(db, embedding_pipeline.dimensions)
 
         logger.info("Build successfully finished!")
+
+    def __run_export(self):
+        from lilith.database.bulk_export import export_bulk_import_files
+
+        with self.__create_embedding_pipeline() as embedding_pipeline:
+            self.embedding_pipeline = embedding_pipeline
+
+            export_bulk_import_files(
+                self.__embed(
+                    node.dictify_for_neo4j() for node in self.__stream_code_tree()
+                ),
+                self.export_dir,
+                export_format=self.export_format,
+            )
+
+        logger.info("Export successfully finished!")
+
+    def __create_embedding_pipeline(self):
+        if self.embed == "none":
+            return nullcontext()
+
+        from lilith.core.utils import get_cache_dir
+        from lilith.embedding.embedding import EmbeddingPipeline
+        from lilith.embedding.embedding import get_embedding_backend
+        from lilith.embedding.utils import EmbeddingCache
+
+        backend = get_embedding_backend(
+            self.embed,
+            model=self.embedding_model,
+            dimensions=self.embedding_dimensions,
+        )
+
+        return EmbeddingPipeline(
+            backend,
+            cache=EmbeddingCache(get_cache_dir() / "embeddings"),
+            max_batch_tokens=self.embedding_batch_tokens,
+            max_concurrency=self.embedding_concurrency,
+        )
+
+    def __create_vector_index(self, db, dimensions: int | None):
+        if dimensions is None:
+            logger.info("No embeddings were produced, skipping the vector index.")
+            return
+
+        logger.info(
+            f"Creating vector index ({dimensions} dimensions, {self.vector_similarity})..."
+        )
+        db.ensure_vector_index(dimensions, similarity=self.vector_similarity)
+
+    def __embed(self, nodes):
+        if self.embedding_pipeline is None:
+            return nodes
+
+        return self.embedding_pipeline.embed_nodes(nodes)
+
+    def __create_parse_cache(self):
+        if not self.parse_cache:
+            return None
+
+        from lilith.core.parse_cache import PARSE_CACHE_DIR_NAME
+        from lilith.core.parse_cache import PARSE_CACHE_FILE_NAME
+        from lilith.core.parse_cache import ParseCache
+
+        cache_dir = Path(self.path) / PARSE_CACHE_DIR_NAME
+
+        try:
+            cache_dir.mkdir(exist_ok=True)
+        except OSError as e:
+            logger.warning(f"Parse cache disabled, {cache_dir} is not writable: {e}")
+            return None
+
+        return ParseCache(
+            cache_dir / PARSE_CACHE_FILE_NAME,
+            max_size=self.parse_cache_size * 1024 * 1024,
+        )
+
+    def __stream_code_tree(self, known_file_hashes: dict[str, str] | None = None):
+        from lilith.core.code_tree import iterate_code_tree_streaming
+        from lilith.core.code_tree import iterate_processed_files
+        from lilith.core.code_tree import walk_code_tree
+
+        parse_cache = self.__create_parse_cache()
+
+        tree_root, pending_files = walk_code_tree(
+            self.path,
+            known_file_hashes=known_file_hashes,
+            exclude_patterns=self.exclude_patterns,
+            use_default_excludes=self.use_default_excludes,
+            use_gitignore=self.use_gitignore,
+            repository=self.repository,
+        )
+        processed_files = iterate_processed_files(
+            pending_files,
+            known_file_hashes=known_file_hashes,
+            jobs=self.jobs,
+            max_file_size=self.max_file_size,
+            normalize=self.normalize,
+            format_cache=self.format_cache,
+            parse_cache=parse_cache,
+            max_chunk_depth=self.max_chunk_depth,
+            split_min_lines=self.split_min_lines,
+            max_chunk_size=self.max_chunk_size,
+            chunk_overlap_lines=self.chunk_overlap_lines,
+        )
+
+        # the cache is closed, and evicted, once the stream is consumed
+        try:
+            yield from iterate_code_tree_streaming(tree_root, processed_files)
+        finally:
+            if parse_cache is not None:
+                parse_cache.close()
+
+    def __run_full(self, db):
+        if self.reset:
+            logger.info(f"Resetting repository {self.repository}...")
+            deleted = db.reset_database(repository=self.repository)
+            logger.info(f"Deleted {deleted} nodes.")
+        elif self.merge:
+            # upserts alone would leave removed files and chunks in the graph, so
+            # a merge is pruned like an incremental build, with every file split
+            self.__run_merge(db, skip_unchanged=False)
+            return
+        else:
+            node_count = db.get_node_count(repository=self.repository)
+            if node_count > 0:
+                raise ConsoleError(
+                    f"The repository {self.repository} currently contains {node_count} nodes. To rebuild it and start fresh, please run the build command again with the --reset option."
+                )
+
+        db.insert_data(
+            self.__embed(
+                node.dictify_for_neo4j() for node in self.__stream_code_tree()
+            ),
+            merge=self.merge,
+            write_concurrency=self.write_concurrency,
+            queue_size=self.queue_size,
+        )
+
+    def __run_incremental(self, db):
+        self.__run_merge(db, skip_unchanged=True)
+
+    def __run_merge(self, db, skip_unchanged: bool):
+        from lilith.core.code_tree import iterate_code_tree_changes
+
+        db.ensure_constraints()
+        indexed_nodes = db.get_indexed_files(repository=self.repository)
+        known_file_hashes = {
+            item["path"]: item["content_hash"]
+            for item in indexed_nodes
+            if item["type"] == "file"
+        }
+
+        # stale subtrees never share ids with current nodes, so they are deleted
+        # and pruned once the stream is written and both collections are complete
+        stale_ids = []
+        kept_descendants = {}
+        written = db.insert_data(
+            self.__embed(
+                iterate_code_tree_changes(
+                    self.__stream_code_tree(
+                        known_file_hashes if skip_unchanged else None
+                    ),
+                    indexed_nodes,
+                    stale_ids,
+                    kept_descendants,
+                )
+            ),
+            merge=True,
+            write_concurrency=self.write_concurrency,
+            queue_size=self.queue_size,
+        )
+
+        logger.info(
+            f"{'Incremental build' if skip_unchanged else 'Merge'}: upserted {written} nodes, deleting {len(stale_ids)} stale subtrees and pruning {len(kept_descendants)} changed files."
+        )
+
+        db.delete_subtrees(stale_ids)
+        db.prune_subtrees(kept_descendants)
@@ -0,0 +1,61 @@
+from __future__ import annotations
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class DescribeCommand:
+    def __init__(
+        self,
+        backend: str,
+        model: str | None,
+        concurrency: int,
+        tokens_per_minute: int,
+        max_retries: int,
+        batch_size: int,
+        use_cache: bool,
+        repository: str | None,
+    ) -> None:
+        self.backend = backend
+        self.model = model
+        self.concurrency = concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.batch_size = batch_size
+        self.use_cache = use_cache
+        self.repository = repository
+
+    def run(self):
+        from lilith.core.utils import get_cache_dir
+        from lilith.database.database import Neo4jGraphDatabase
+        from lilith.description.description import DescriptionPipeline
+        from lilith.description.description import get_description_backend
+        from lilith.description.utils import DescriptionCache
+
+        cache = None
+        if self.use_cache:
+            cache = DescriptionCache(get_cache_dir() / "descriptions")
+
+        with Neo4jGraphDatabase(
+            batch_size=self.batch_size
+        ) as db, DescriptionPipeline(
+            get_description_backend(self.backend, model=self.model),
+            cache=cache,
+            max_concurrency=self.concurrency,
+            tokens_per_minute=self.tokens_per_minute,
+            max_retries=self.max_retries,
+        ) as pipeline:
+            written = 0
+
+            # every window is written as soon as it is described, an interrupted
+            # run continues with the chunks that are still missing a description
+            for descriptions in pipeline.describe_nodes(
+                db.iterate_undescribed_chunks(repository=self.repository)
+            ):
+                db.set_descriptions(descriptions)
+                written += len(descriptions)
+                logger.info(f"{written} descriptions written.")
+
+        logger.info("Describe successfully finished!")
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import logging
+import os
+
+from pathlib import Path
+
+from lilith.console.utils import ConsoleError
+
+
+logger = logging.getLogger(__name__)
+
+
+class ResetCommand:
+    def __init__(
+        self, root_path: Path | None, repository: str | None, batch_size: int
+    ) -> None:
+        self.root_path = root_path
+        self.repository = repository
+        self.batch_size = batch_size
+
+        if self.root_path is not None and self.repository is not None:
+            raise ConsoleError(
+                "The --path and --repository options cannot be used together."
+            )
+
+    def run(self):
+        from lilith.database.database import Neo4jGraphDatabase
+
+        root_path = None
+        if self.root_path is not None:
+            # the root folder is stored with the resolved path it was built from
+            root_path = os.fspath(Path(self.root_path).resolve())
+
+        with Neo4jGraphDatabase(batch_size=self.batch_size) as db:
+            deleted = db.reset_database(
+                root_path=root_path, repository=self.repository
+            )
+
+        if self.repository is not None:
+            logger.info(f"Deleted {deleted} nodes of repository {self.repository}.")
+        elif root_path is not None:
+            logger.info(f"Deleted {deleted} nodes of {root_path}.")
+        else:
+            logger.info(f"Deleted {deleted} nodes, the database is empty.")
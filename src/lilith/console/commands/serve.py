@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import logging
+
+
+logger = logging.getLogger(__name__)
+
+
+class ServeCommand:
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        query_timeout: float,
+        max_connections: int,
+        embed: str,
+        embedding_model: str | None,
+        embedding_dimensions: int | None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.query_timeout = query_timeout
+        self.max_connections = max_connections
+        self.embed = embed
+        self.embedding_model = embedding_model
+        self.embedding_dimensions = embedding_dimensions
+
+    def run(self):
+        import uvicorn
+
+        from lilith.lilith_server.server import create_app
+
+        embedding_backend = None
+
+        if self.embed != "none":
+            from lilith.embedding.embedding import get_embedding_backend
+
+            embedding_backend = get_embedding_backend(
+                self.embed,
+                model=self.embedding_model,
+                dimensions=self.embedding_dimensions,
+            )
+
+        app = create_app(
+            query_timeout=self.query_timeout,
+            max_connection_pool_size=self.max_connections,
+            embedding_backend=embedding_backend,
+        )
+
+        logger.info(f"Serving on http://{self.host}:{self.port}")
+        uvicorn.run(
+            app,
+            host=self.host,
+            port=self.port,
+            log_level=logging.getLevelName(logging.getLogger("lilith").level).lower(),
+        )
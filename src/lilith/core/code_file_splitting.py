@@ -1,34 +1,166 @@
 from __future__ import annotations
 
 import ast
+import io
+import logging
 import os
+import textwrap
+import time
 
+from bisect import bisect_left
+from bisect import bisect_right
+from itertools import accumulate
 from itertools import groupby
+from itertools import pairwise
 from typing import TYPE_CHECKING
 
 import black
 
+from lilith.core.file_reading import BINARY_CHECK_SIZE
+from lilith.core.file_reading import DEFAULT_MAX_FILE_SIZE
+from lilith.core.file_reading import decode_python_source
+from lilith.core.file_reading import hash_buffer
+from lilith.core.file_reading import is_binary
+from lilith.core.file_reading import open_file_buffer
+from lilith.core.file_reading import read_file_buffer
+
 
 if TYPE_CHECKING:
     from pathlib import Path
 
+    from lilith.core.format_cache import FormatCache
+    from lilith.core.parse_cache import ParseCache
+
+
+NORMALIZE_NONE = "none"
+NORMALIZE_FAST = "fast"
+NORMALIZE_FULL = "full"
+NORMALIZE_MODES = (NORMALIZE_NONE, NORMALIZE_FAST, NORMALIZE_FULL)
+
+# part of the parse cache identity, bump it when the produced chunks change
+CHUNK_FORMAT_VERSION = 5
+
+# methods of classes and of the classes nested in them are split into chunks
+DEFAULT_MAX_CHUNK_DEPTH = 2
+# classes spanning at most this many lines stay a single chunk
+DEFAULT_SPLIT_MIN_LINES = 100
+# characters, the 8000 token input limit of embedding models at the 3 characters
+# per token that embedding inputs are truncated at
+DEFAULT_MAX_CHUNK_SIZE = 24_000
+# lines of the previous part repeated at the start of a part of a split chunk
+DEFAULT_CHUNK_OVERLAP_LINES = 2
+
+DEFINITION_TYPES = (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)
 
-def join_code_pieces(node_array: list[dict[str, str]]) -> list[dict[str, str]]:
+# code black cannot parse, and output failing its AST equivalence or stability
+# checks, the latter are raised as AssertionError
+BLACK_ERRORS = (
+    black.InvalidInput,
+    black.parsing.ASTSafetyError,
+    black.parsing.SourceASTParseError,
+    AssertionError,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_chunking_key(
+    normalize: str = NORMALIZE_NONE,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    max_chunk_depth: int = DEFAULT_MAX_CHUNK_DEPTH,
+    split_min_lines: int = DEFAULT_SPLIT_MIN_LINES,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    chunk_overlap_lines: int = DEFAULT_CHUNK_OVERLAP_LINES,
+) -> str:
     """
-    Joins consecutive 'code_piece' entries into a single entry, separated by os.linesep.
+    Returns the identity of the chunking settings, chunks split with different
+    settings are never mixed up in the parse cache.
 
     Args:
-        node_array (List[Dict[str, str]]): List of nodes with 'type' and 'code'.
+        normalize (str, optional): Chunk normalization mode. Defaults to 'none'.
+        max_file_size (int, optional): Larger files are not split. Defaults to 5 MiB.
+        max_chunk_depth (int, optional): Nesting depth of chunks. Defaults to 2.
+        split_min_lines (int, optional): Smaller classes are not split. Defaults to 100.
+        max_chunk_size (int, optional): Size limit of chunks in characters.
+            Defaults to 24000.
+        chunk_overlap_lines (int, optional): Overlap of chunk parts. Defaults to 2.
 
     Returns:
-        List[Dict[str, str]]: New list with joined 'code_piece' entries.
+        str: The chunking key.
+    """
+    formatter = black.__version__ if normalize != NORMALIZE_NONE else None
+    return (
+        f"{CHUNK_FORMAT_VERSION}:{normalize}:{formatter}:{max_file_size}:"
+        f"{max_chunk_depth}:{split_min_lines}:{max_chunk_size}:{chunk_overlap_lines}"
+    )
+
+
+def split_source_lines(source: str) -> list[str]:
+    """
+    Splits source into lines with their line endings at the line breaks of the
+    tokenizer, so the lines match the line numbers of the AST. str.splitlines
+    would also split at form feeds and other unicode line boundaries.
+
+    Args:
+        source (str): The source.
+
+    Returns:
+        list[str]: The lines, split at '\\r\\n', '\\r' and '\\n'.
+    """
+    return io.StringIO(source, newline="").readlines()
+
+
+def join_code_pieces(
+    node_array: list[dict],
+    source_lines: list[str],
+    max_chunk_size: int | None = None,
+) -> list[dict]:
+    """
+    Joins consecutive 'code_piece' entries into a single entry spanning their lines.
+
+    The joined code is sliced from the source again, so comments and blank lines
+    between the pieces are kept.
+
+    Args:
+        node_array (list[dict]): List of chunks with 'type', 'code', 'start_line'
+            and 'end_line'.
+        source_lines (list[str]): Lines of the source file, with line endings.
+        max_chunk_size (int, optional): A joined entry grows up to this many
+            characters, further pieces start the next entry. Defaults to None.
+
+    Returns:
+        list[dict]: New list with joined 'code_piece' entries.
     """
     joined_nodes = []
+    # character offset of the start of every line
+    line_offsets = list(accumulate(map(len, source_lines), initial=0))
 
     for node_type, group in groupby(node_array, key=lambda x: x["type"]):
         if node_type == "code_piece":
-            combined_code = os.linesep.join(item["code"] for item in group)
-            joined_nodes.append({"type": "code_piece", "code": combined_code})
+            items = list(group)
+            first = 0
+
+            for index in range(1, len(items) + 1):
+                if index < len(items) and (
+                    max_chunk_size is None
+                    or line_offsets[items[index]["end_line"]]
+                    - line_offsets[items[first]["start_line"] - 1]
+                    <= max_chunk_size
+                ):
+                    continue
+
+                start_line = items[first]["start_line"]
+                end_line = items[index - 1]["end_line"]
+
+                joined_nodes.append(
+                    {
+                        "type": "code_piece",
+                        "code": "".join(source_lines[start_line - 1 : end_line]),
+                        "start_line": start_line,
+                        "end_line": end_line,
+                    }
+                )
+                first = index
         else:
             for item in group:
                 joined_nodes.append(item)
@@ -36,50 +168,684 @@ def join_code_pieces(node_array: list[dict[str, str]]) -> list[dict[str, str]]:
     return joined_nodes
 
 
-def format_code_pieces(node_array: list[dict[str, str]]) -> list[dict[str, str]]:
+def format_code(
+    code: str, normalize: str = NORMALIZE_NONE, cache: FormatCache | None = None
+) -> str:
+    """
+    Normalizes a chunk of code with black.
+
+    Args:
+        code (str): The code to format.
+        normalize (str, optional): 'none' keeps the code as is, 'fast' skips black's
+            AST equivalence check and 'full' runs it. Defaults to 'none'.
+        cache (FormatCache, optional): Cache of already formatted code. Defaults to None.
+
+    Returns:
+        str: The formatted code, or the code as is if black fails on it.
+    """
+    if normalize == NORMALIZE_NONE:
+        return code
+
+    if cache is not None:
+        cached_code = cache.get(code, normalize)
+        if cached_code is not None:
+            return cached_code
+
+    try:
+        formatted_code = black.format_file_contents(
+            code, fast=normalize == NORMALIZE_FAST, mode=black.Mode()
+        )
+    except black.NothingChanged:
+        formatted_code = code
+    except BLACK_ERRORS as e:
+        logger.debug(f"Keeping a chunk unformatted, black failed on it: {e!r}")
+        formatted_code = code
+
+    if cache is not None:
+        cache.put(code, normalize, formatted_code)
+
+    return formatted_code
+
+
+def format_code_pieces(
+    node_array: list[dict],
+    normalize: str = NORMALIZE_NONE,
+    cache: FormatCache | None = None,
+) -> list[dict]:
+    if normalize == NORMALIZE_NONE:
+        return node_array
+
     output = []
 
     for node in node_array:
-        output.append(
-            {
-                "type": node["type"],
-                "code": black.format_file_contents(
-                    node["code"], fast=False, mode=black.Mode()
-                ),
-            }
-        )
+        formatted_node = {**node}
+
+        # parts of split chunks are fragments, and a multi-line string at a lower
+        # indentation keeps a nested chunk from being dedented, black cannot
+        # parse them and they stay as they are
+        if "part" not in node and not node["code"][:1].isspace():
+            formatted_node["code"] = format_code(
+                node["code"], normalize=normalize, cache=cache
+            )
+
+        if "children" in node:
+            formatted_node["children"] = format_code_pieces(
+                node["children"], normalize=normalize, cache=cache
+            )
+
+        output.append(formatted_node)
+
+    return output
+
+
+def get_chunk_start_line(
+    node: ast.stmt, source_lines: list[str], previous_end_line: int
+) -> int:
+    """
+    Returns the first line of a statement, including its decorators and the
+    comment lines directly above it.
+
+    Args:
+        node (ast.stmt): The statement.
+        source_lines (list[str]): Lines of the source file.
+        previous_end_line (int): Last line of the previous statement, 0 if none.
+
+    Returns:
+        int: The 1-based first line of the chunk.
+    """
+    start_line = node.lineno
+
+    for decorator in getattr(node, "decorator_list", []):
+        start_line = min(start_line, decorator.lineno)
+
+    while (
+        start_line - 1 > previous_end_line
+        and source_lines[start_line - 2].lstrip().startswith("#")
+    ):
+        start_line -= 1
+
+    return start_line
+
+
+def get_definition_metadata(
+    node: ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef,
+    parent_name: str | None = None,
+) -> dict:
+    """
+    Returns the metadata of a function or class chunk, taken from its AST node.
+
+    Args:
+        node (ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef): The definition.
+        parent_name (str, optional): Qualified name of the enclosing definition,
+            None at module level. Defaults to None.
+
+    Returns:
+        dict: The 'name', 'qualified_name', 'signature' as written in the header
+            of the definition without its body, the source of the 'decorators'
+            and the 'docstring' or None.
+    """
+    type_params = getattr(node, "type_params", None)
+    name = node.name
+    if type_params:
+        name += f"[{', '.join(ast.unparse(param) for param in type_params)}]"
+
+    if isinstance(node, ast.ClassDef):
+        bases = [ast.unparse(base) for base in node.bases + node.keywords]
+        signature = f"class {name}({', '.join(bases)})" if bases else f"class {name}"
+    else:
+        keyword = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+        signature = f"{keyword} {name}({ast.unparse(node.args)})"
+        if node.returns is not None:
+            signature += f" -> {ast.unparse(node.returns)}"
+
+    return {
+        "name": node.name,
+        "qualified_name": f"{parent_name}.{node.name}" if parent_name else node.name,
+        "signature": signature,
+        "decorators": [ast.unparse(decorator) for decorator in node.decorator_list],
+        "docstring": ast.get_docstring(node),
+    }
+
+
+def get_definition_chunk(
+    node: ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef,
+    source_lines: list[str],
+    start_line: int,
+    depth: int = 0,
+    parent_name: str | None = None,
+    max_chunk_depth: int = DEFAULT_MAX_CHUNK_DEPTH,
+    split_min_lines: int = DEFAULT_SPLIT_MIN_LINES,
+) -> dict:
+    """
+    Returns the chunk of a function or class definition.
+
+    A class spanning more than split_min_lines lines is split while its depth is
+    below max_chunk_depth. Its methods and nested classes become its 'children'
+    chunks, and its own code keeps only a stub of their headers. The code of
+    nested chunks is dedented.
+
+    Args:
+        node (ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef): The definition.
+        source_lines (list[str]): Lines of the source file, with line endings.
+        start_line (int): First line of the chunk, see get_chunk_start_line.
+        depth (int, optional): Nesting depth of the chunk, 0 at module level.
+        parent_name (str, optional): Qualified name of the enclosing class.
+        max_chunk_depth (int, optional): Nesting depth of chunks. Defaults to 2.
+        split_min_lines (int, optional): Smaller classes are not split. Defaults to 100.
+
+    Returns:
+        dict: The chunk, see get_function_and_class_bounds.
+    """
+    end_line = node.end_lineno
+    chunk = {
+        "type": "class" if isinstance(node, ast.ClassDef) else "function",
+        "code": "".join(source_lines[start_line - 1 : end_line]),
+        "start_line": start_line,
+        "end_line": end_line,
+        **get_definition_metadata(node, parent_name),
+    }
+
+    if (
+        isinstance(node, ast.ClassDef)
+        and depth < max_chunk_depth
+        and end_line - start_line + 1 > split_min_lines
+    ):
+        children = []
+        stubs = []
+        previous_end_line = node.lineno
+
+        for child in node.body:
+            if isinstance(child, DEFINITION_TYPES):
+                child_chunk = get_definition_chunk(
+                    child,
+                    source_lines,
+                    get_chunk_start_line(child, source_lines, previous_end_line),
+                    depth=depth + 1,
+                    parent_name=chunk["qualified_name"],
+                    max_chunk_depth=max_chunk_depth,
+                    split_min_lines=split_min_lines,
+                )
+                children.append(child_chunk)
+                stubs.append(get_definition_stub(child, child_chunk, source_lines))
+
+            previous_end_line = child.end_lineno
+
+        if children:
+            chunk["code"] = get_class_outline(
+                source_lines, start_line, end_line, children, stubs
+            )
+            chunk["children"] = children
+
+    if depth > 0:
+        chunk["code"] = textwrap.dedent(chunk["code"])
+
+    return chunk
+
+
+def get_definition_stub(
+    node: ast.FunctionDef | ast.AsyncFunctionDef | ast.ClassDef,
+    chunk: dict,
+    source_lines: list[str],
+) -> str:
+    """
+    Returns the decorators and the signature of a split off definition with an
+    ellipsis body, at the indentation of the definition.
+    """
+    indent = source_lines[node.lineno - 1][: node.col_offset]
+    decorators = "".join(
+        f"{indent}@{decorator}\n" for decorator in chunk["decorators"]
+    )
+
+    return f"{decorators}{indent}{chunk['signature']}: ...\n"
+
+
+def get_class_outline(
+    source_lines: list[str],
+    start_line: int,
+    end_line: int,
+    children: list[dict],
+    stubs: list[str],
+) -> str:
+    """
+    Returns the code of a split class, the lines of its children are replaced by
+    their stubs.
+    """
+    parts = []
+    line = start_line
+
+    for child, stub in zip(children, stubs):
+        parts.append("".join(source_lines[line - 1 : child["start_line"] - 1]))
+        parts.append(stub)
+        line = child["end_line"] + 1
+
+    parts.append("".join(source_lines[line - 1 : end_line]))
+
+    return "".join(parts)
+
+
+def get_statement_lines(tree: ast.Module) -> list[int]:
+    """
+    Returns the sorted first lines of all statements of a module, nested ones
+    included, the boundaries at which oversized chunks are split.
+    """
+    return sorted(
+        {node.lineno for node in ast.walk(tree) if isinstance(node, ast.stmt)}
+    )
+
+
+def has_oversized_chunk(chunks: list[dict], max_chunk_size: int) -> bool:
+    return any(
+        has_oversized_chunk(chunk["children"], max_chunk_size)
+        if "children" in chunk
+        else len(chunk["code"]) > max_chunk_size
+        for chunk in chunks
+    )
+
+
+def split_oversized_chunks(
+    chunks: list[dict],
+    statement_lines: list[int],
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    chunk_overlap_lines: int = DEFAULT_CHUNK_OVERLAP_LINES,
+) -> list[dict]:
+    """
+    Replaces the chunks larger than max_chunk_size characters by their parts, see
+    split_oversized_chunk. The code of a split class only holds stubs of its
+    children, its children are split instead.
+    """
+    output = []
+
+    for chunk in chunks:
+        if "children" in chunk:
+            output.append(
+                {
+                    **chunk,
+                    "children": split_oversized_chunks(
+                        chunk["children"],
+                        statement_lines,
+                        max_chunk_size=max_chunk_size,
+                        chunk_overlap_lines=chunk_overlap_lines,
+                    ),
+                }
+            )
+        else:
+            output.extend(
+                split_oversized_chunk(
+                    chunk,
+                    statement_lines,
+                    max_chunk_size=max_chunk_size,
+                    chunk_overlap_lines=chunk_overlap_lines,
+                )
+            )
 
     return output
 
 
+def split_oversized_chunk(
+    chunk: dict,
+    statement_lines: list[int],
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    chunk_overlap_lines: int = DEFAULT_CHUNK_OVERLAP_LINES,
+) -> list[dict]:
+    """
+    Splits a chunk larger than max_chunk_size characters into ordered parts.
+
+    Parts end at statement boundaries. A statement that does not fit into a part
+    on its own is broken at line ends, and a line that does not fit is cut. Every
+    part after the first starts with up to chunk_overlap_lines whole lines of the
+    previous part as context, as long as it stays within the size limit.
+
+    Args:
+        chunk (dict): The chunk, without children.
+        statement_lines (list[int]): See get_statement_lines.
+        max_chunk_size (int, optional): Size limit of a part in characters.
+            Defaults to 24000.
+        chunk_overlap_lines (int, optional): Lines repeated from the previous
+            part. Defaults to 2.
+
+    Returns:
+        list[dict]: The chunk if it fits, otherwise its parts. Every part keeps the
+            metadata of the chunk, its lines span the overlap too, and it has the
+            1-based 'part', the 'part_count' and the number of 'overlap_lines'.
+    """
+    if len(chunk["code"]) <= max_chunk_size:
+        return [chunk]
+
+    lines = split_source_lines(chunk["code"])
+    first_line = chunk["start_line"]
+
+    # statement boundaries inside the chunk, as indexes of its lines
+    boundaries = statement_lines[
+        bisect_right(statement_lines, first_line) : bisect_left(
+            statement_lines, first_line + len(lines)
+        )
+    ]
+    breaks = [0, *(line - first_line for line in boundaries), len(lines)]
+
+    # (text, index of its last line), statements that fit stay in one piece
+    pieces = []
+    for start, end in pairwise(breaks):
+        statement = "".join(lines[start:end])
+
+        if len(statement) <= max_chunk_size:
+            pieces.append((statement, end - 1))
+            continue
+
+        for index in range(start, end):
+            for offset in range(0, len(lines[index]), max_chunk_size):
+                pieces.append((lines[index][offset : offset + max_chunk_size], index))
+
+    # [code, first line index, last line index, overlap lines]
+    parts = []
+    first_index = 0
+
+    for text, last_index in pieces:
+        if parts and len(parts[-1][0]) + len(text) <= max_chunk_size:
+            parts[-1][0] += text
+            parts[-1][2] = last_index
+        else:
+            overlap = get_part_overlap(
+                parts[-1][0] if parts else "", text, max_chunk_size, chunk_overlap_lines
+            )
+            overlap_lines = len(split_source_lines(overlap))
+            parts.append([overlap + text, first_index, last_index, overlap_lines])
+
+        # a cut line continues in the next piece
+        first_index = last_index + 1 if text.endswith(("\n", "\r")) else last_index
+
+    return [
+        {
+            **chunk,
+            "code": code,
+            "start_line": first_line + first - overlap_lines,
+            "end_line": first_line + last,
+            "part": part,
+            "part_count": len(parts),
+            "overlap_lines": overlap_lines,
+        }
+        for part, (code, first, last, overlap_lines) in enumerate(parts, start=1)
+    ]
+
+
+def get_part_overlap(
+    previous_code: str, text: str, max_chunk_size: int, chunk_overlap_lines: int
+) -> str:
+    """
+    Returns the last whole lines of the previous part that fit in front of the
+    first piece of the next part, nothing if the next part continues a cut line.
+    """
+    if not previous_code.endswith(("\n", "\r")):
+        return ""
+
+    # the first line of the previous part may be the end of a cut line
+    previous_lines = split_source_lines(previous_code)[1:]
+    overlap_lines = min(chunk_overlap_lines, len(previous_lines))
+
+    while overlap_lines > 0:
+        overlap = "".join(previous_lines[-overlap_lines:])
+        if len(overlap) + len(text) <= max_chunk_size:
+            return overlap
+
+        overlap_lines -= 1
+
+    return ""
+
+
 def get_function_and_class_bounds(
     tree: ast.Module,
-) -> list[dict[str, str]]:
-    """Recursively process AST nodes, inserting markers around classes and functions."""
+    source: str,
+    normalize: str = NORMALIZE_NONE,
+    cache: FormatCache | None = None,
+    max_chunk_depth: int = DEFAULT_MAX_CHUNK_DEPTH,
+    split_min_lines: int = DEFAULT_SPLIT_MIN_LINES,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    chunk_overlap_lines: int = DEFAULT_CHUNK_OVERLAP_LINES,
+) -> list[dict]:
+    """
+    Splits a module into function, class and code piece chunks by slicing the
+    original source along the line spans of the top level statements. Large
+    classes are split further, see get_definition_chunk, and chunks above the
+    size limit into parts, see split_oversized_chunk.
+
+    Args:
+        tree (ast.Module): The parsed module.
+        source (str): The source the module was parsed from.
+        normalize (str, optional): Chunk normalization mode. Defaults to 'none'.
+        cache (FormatCache, optional): Cache of formatted chunks. Defaults to None.
+        max_chunk_depth (int, optional): Nesting depth of chunks, 0 keeps every
+            class a single chunk. Defaults to 2.
+        split_min_lines (int, optional): Classes spanning at most this many lines
+            are not split. Defaults to 100.
+        max_chunk_size (int, optional): Size limit of chunks in characters, small
+            code pieces are joined up to it. Defaults to 24000.
+        chunk_overlap_lines (int, optional): Lines of the previous part repeated
+            in the next part of a split chunk. Defaults to 2.
+
+    Returns:
+        list[dict]: Chunks with 'type', 'code', 'start_line' and 'end_line', function
+            and class chunks also have the metadata of get_definition_metadata,
+            split classes their 'children' chunks and parts of split chunks
+            their 'part', 'part_count' and 'overlap_lines'.
+    """
+    source_lines = split_source_lines(source)
     output = []
+    previous_end_line = 0
 
     for node in tree.body:
+        start_line = get_chunk_start_line(node, source_lines, previous_end_line)
+        end_line = node.end_lineno
 
-        if isinstance(node, ast.FunctionDef | ast.AsyncFunctionDef):
-            output.append({"type": "function", "code": ast.unparse(node)})
-        elif isinstance(node, ast.ClassDef):
-            output.append({"type": "class", "code": ast.unparse(node)})
+        if isinstance(node, DEFINITION_TYPES):
+            chunk = get_definition_chunk(
+                node,
+                source_lines,
+                start_line,
+                max_chunk_depth=max_chunk_depth,
+                split_min_lines=split_min_lines,
+            )
         else:
-            output.append({"type": "code_piece", "code": ast.unparse(node)})
+            chunk = {
+                "type": "code_piece",
+                "code": "".join(source_lines[start_line - 1 : end_line]),
+                "start_line": start_line,
+                "end_line": end_line,
+            }
 
-    joined_pieces = join_code_pieces(output)
+        output.append(chunk)
+        previous_end_line = end_line
 
-    return format_code_pieces(joined_pieces)
+    joined_pieces = join_code_pieces(output, source_lines, max_chunk_size)
 
+    # walking the whole tree for statement lines is only worth it for files
+    # with oversized chunks
+    if has_oversized_chunk(joined_pieces, max_chunk_size):
+        joined_pieces = split_oversized_chunks(
+            joined_pieces,
+            get_statement_lines(tree),
+            max_chunk_size=max_chunk_size,
+            chunk_overlap_lines=chunk_overlap_lines,
+        )
 
-def split_code_file_into_chunks(file_path: Path) -> list[tuple]:
-    content = None
+    return format_code_pieces(joined_pieces, normalize=normalize, cache=cache)
 
-    with open(file_path, encoding="utf-8") as f:
-        content = f.read()
 
+def split_code_source(
+    content: str,
+    normalize: str = NORMALIZE_NONE,
+    cache: FormatCache | None = None,
+    timings: dict[str, float] | None = None,
+    max_chunk_depth: int = DEFAULT_MAX_CHUNK_DEPTH,
+    split_min_lines: int = DEFAULT_SPLIT_MIN_LINES,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    chunk_overlap_lines: int = DEFAULT_CHUNK_OVERLAP_LINES,
+) -> list[dict]:
+    """
+    Parses Python source and splits it into formatted chunks.
+
+    Args:
+        content (str): The source.
+        normalize (str, optional): Chunk normalization mode. Defaults to 'none'.
+        cache (FormatCache, optional): Cache of formatted chunks. Defaults to None.
+        timings (dict[str, float], optional): Receives the seconds spent in
+            'parse', 'split' and 'format'. Defaults to None.
+        max_chunk_depth (int, optional): Nesting depth of chunks. Defaults to 2.
+        split_min_lines (int, optional): Smaller classes are not split. Defaults to 100.
+        max_chunk_size (int, optional): Size limit of chunks in characters.
+            Defaults to 24000.
+        chunk_overlap_lines (int, optional): Overlap of chunk parts. Defaults to 2.
+
+    Returns:
+        list[dict]: The chunks, see get_function_and_class_bounds.
+    """
+    start = time.perf_counter()
     ast_tree = ast.parse(source=content, type_comments=True)
+    parsed = time.perf_counter()
 
-    output = get_function_and_class_bounds(ast_tree)
+    chunks = get_function_and_class_bounds(
+        ast_tree,
+        content,
+        max_chunk_depth=max_chunk_depth,
+        split_min_lines=split_min_lines,
+        max_chunk_size=max_chunk_size,
+        chunk_overlap_lines=chunk_overlap_lines,
+    )
+    split = time.perf_counter()
+
+    output = format_code_pieces(chunks, normalize=normalize, cache=cache)
+
+    if timings is not None:
+        timings["parse"] = parsed - start
+        timings["split"] = split - parsed
+        timings["format"] = time.perf_counter() - split
 
     return output
+
+
+def split_code_file_into_chunks(
+    file_path: Path,
+    normalize: str = NORMALIZE_NONE,
+    cache: FormatCache | None = None,
+) -> list[dict]:
+    with open_file_buffer(file_path) as buffer:
+        content = decode_python_source(buffer)
+
+    return split_code_source(content, normalize=normalize, cache=cache)
+
+
+def read_and_split_code_file(
+    file_path: Path,
+    known_hash: str | None = None,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    normalize: str = NORMALIZE_NONE,
+    cache: FormatCache | None = None,
+    parse_cache: ParseCache | None = None,
+    max_chunk_depth: int = DEFAULT_MAX_CHUNK_DEPTH,
+    split_min_lines: int = DEFAULT_SPLIT_MIN_LINES,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    chunk_overlap_lines: int = DEFAULT_CHUNK_OVERLAP_LINES,
+) -> dict:
+    """
+    Reads a Python file exactly once and uses the same buffer for hashing,
+    decoding and parsing.
+
+    Files larger than max_file_size and binary files are recognized from their
+    size and their first bytes, they are neither read completely nor hashed.
+    Files whose hash equals the known hash are hashed only and not split. Files
+    whose content is found in the parse cache are hashed only, their chunks are
+    taken from the cache.
+
+    Args:
+        file_path (Path): The Python file.
+        known_hash (str, optional): Hash of the already ingested version of the file.
+        max_file_size (int, optional): Files above this size in bytes are not split.
+        normalize (str, optional): Chunk normalization mode. Defaults to 'none'.
+        cache (FormatCache, optional): Cache of formatted chunks. Defaults to None.
+        parse_cache (ParseCache, optional): Cache of split files. Defaults to None.
+        max_chunk_depth (int, optional): Nesting depth of chunks. Defaults to 2.
+        split_min_lines (int, optional): Smaller classes are not split. Defaults to 100.
+        max_chunk_size (int, optional): Size limit of chunks in characters.
+            Defaults to 24000.
+        chunk_overlap_lines (int, optional): Overlap of chunk parts. Defaults to 2.
+
+    Returns:
+        dict: 'content_hash' of the file or None if it was skipped, 'chunks' or
+            None if the file was not split,
+            an 'error' message if the file could not be parsed, 'cached' if the
+            result was taken from the parse cache, and the 'bytes_read' and the
+            'timings' of the stages for the build metrics.
+    """
+    result = {
+        "content_hash": None,
+        "chunks": None,
+        "error": None,
+        "cached": False,
+        "bytes_read": 0,
+        "timings": {},
+    }
+
+    start = time.perf_counter()
+
+    try:
+        with open(file_path, "rb") as f:
+            file_size = os.fstat(f.fileno()).st_size
+
+            if file_size > max_file_size:
+                result["error"] = f"skipped, larger than {max_file_size} bytes"
+                return result
+
+            header = f.read(BINARY_CHECK_SIZE)
+            result["bytes_read"] = len(header)
+
+            if is_binary(header):
+                result["error"] = "skipped, binary content"
+                return result
+
+            with read_file_buffer(f, file_size, header) as buffer:
+                result["content_hash"] = hash_buffer(buffer)
+                result["bytes_read"] = len(buffer)
+
+                if result["content_hash"] == known_hash:
+                    return result
+
+                if parse_cache is not None:
+                    cached_result = parse_cache.get_result(
+                        result["content_hash"],
+                        get_chunking_key(
+                            normalize,
+                            max_file_size,
+                            max_chunk_depth,
+                            split_min_lines,
+                            max_chunk_size,
+                            chunk_overlap_lines,
+                        ),
+                    )
+                    if cached_result is not None:
+                        cached_result["bytes_read"] = result["bytes_read"]
+                        return cached_result
+
+                content = decode_python_source(buffer)
+
+    except OSError as e:
+        result["error"] = f"could not be read: {e}"
+        return result
+    except (SyntaxError, UnicodeDecodeError) as e:
+        result["error"] = f"could not be decoded: {e}"
+        return result
+    finally:
+        result["timings"]["read"] = time.perf_counter() - start
+
+    try:
+        result["chunks"] = split_code_source(
+            content,
+            normalize=normalize,
+            cache=cache,
+            timings=result["timings"],
+            max_chunk_depth=max_chunk_depth,
+            split_min_lines=split_min_lines,
+            max_chunk_size=max_chunk_size,
+            chunk_overlap_lines=chunk_overlap_lines,
+        )
+    except (SyntaxError, ValueError) as e:
+        result["error"] = f"could not be parsed: {e}"
+
+    return result
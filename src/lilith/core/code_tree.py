@@ -1,48 +1,220 @@
 """
 {
-    "id": globally unique,
+    "id": globally unique, derived from the repository, path and kind of the node,
+        see get_node_id
+    "repository": namespace of the project the node belongs to, many projects can
+        share one database
     "type": folder | file | function | class | code_piece,
     "name": name of the file, folder, function or class, or None for a code piece
     "path": path of the file folder or the file path where the function/class/code piece is in,
-    "parent": id of the parent file or folder,
+    "parent": id of the parent folder, file or class, methods and nested classes of
+        large classes are children of their class,
     "code_content": full code of function/class or code piece, for file or folder null
     "embedding": embedding of the content, for folder or file is null
-    "description": LLM generated description or comments for functions or classes
+    "description": LLM generated description or comments for functions or classes,
+        filled in by lilith describe after the build
+    "description_hash": content_hash the description was generated for, only set
+        in the database
+    "content_hash": md5 of the file content for files or of the code content for
+        functions/classes/code pieces, null for folders
+    "start_line": first line of a function/class/code piece in its file, otherwise null
+    "end_line": last line of a function/class/code piece in its file, otherwise null
+    "qualified_name": dotted name of a function or class within its file, otherwise null
+    "signature": header of a function or class without its body, e.g.
+        'async def fetch(url: str) -> bytes', otherwise null
+    "decorators": source of the decorators of a function or class, otherwise null
+    "docstring": docstring of a function or class, otherwise null
+    "part": 1-based position of the part of a chunk split for its size, its parts
+        are ordered siblings, otherwise null
+    "part_count": number of parts of a split chunk, otherwise null
+    "overlap_lines": leading lines of a part repeated from the previous part,
+        otherwise null
 }
 """
 
 from __future__ import annotations
 
-import hashlib
 import logging
-import mimetypes
 import os
 import uuid
 
+from collections import Counter
+from collections import deque
+from concurrent.futures import Future
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from pathlib import Path
 from typing import TYPE_CHECKING
 
-from anytree import NodeMixin
 from anytree import PreOrderIter
 from anytree import RenderTree
 from tqdm import tqdm
 
-from lilith.core.code_file_splitting import split_code_file_into_chunks
+from lilith.core.code_file_splitting import DEFAULT_CHUNK_OVERLAP_LINES
+from lilith.core.code_file_splitting import DEFAULT_MAX_CHUNK_DEPTH
+from lilith.core.code_file_splitting import DEFAULT_MAX_CHUNK_SIZE
+from lilith.core.code_file_splitting import DEFAULT_SPLIT_MIN_LINES
+from lilith.core.code_file_splitting import NORMALIZE_NONE
+from lilith.core.code_file_splitting import get_chunking_key
+from lilith.core.code_file_splitting import read_and_split_code_file
+from lilith.core.file_reading import DEFAULT_MAX_FILE_SIZE
+from lilith.core.file_reading import hash_buffer
+from lilith.core.file_reading import open_file_buffer
+from lilith.core.ignore_rules import DEFAULT_EXCLUDE_PATTERNS
+from lilith.core.ignore_rules import GITIGNORE_FILE_NAME
+from lilith.core.ignore_rules import IgnoreRules
+from lilith.core.metrics import build_metrics
 from lilith.core.utils import CoreError
-from lilith.core.utils import get_class_definition
-from lilith.core.utils import get_function_definition
 
 
 if TYPE_CHECKING:
-    from pathlib import Path
+    from collections.abc import Iterable
+    from collections.abc import Iterator
+
+    from lilith.core.format_cache import FormatCache
+    from lilith.core.parse_cache import ParseCache
 
 
 logger = logging.getLogger(__name__)
 
+# files submitted to the process pool ahead of the consumer, per worker
+PROCESSING_WINDOW_PER_JOB = 4
+
+# metadata of function and class chunks, see get_definition_metadata
+CHUNK_METADATA_KEYS = ("name", "qualified_name", "signature", "decorators", "docstring")
+# position of the parts of chunks split for their size, see split_oversized_chunk
+CHUNK_PART_KEYS = ("part", "part_count", "overlap_lines")
+
+NODE_ID_NAMESPACE = uuid.UUID("6f0f5c3e-61b4-4a4e-9a8e-4c1f0f2b7d31")
+
+
+def get_node_id(*key_parts: object) -> str:
+    """
+    Returns a deterministic, UUID formatted node id for the given key.
+
+    Two builds of an unchanged project produce the same ids, which makes MERGE
+    based upserts and diffing against the database possible.
+
+    Args:
+        *key_parts (object): Parts identifying the node, e.g. kind and path.
+
+    Returns:
+        str: The node id.
+    """
+    return str(uuid.uuid5(NODE_ID_NAMESPACE, "\0".join(map(str, key_parts))))
+
+
+def get_path_node_id(repository: str | None, kind: str, path: str) -> str:
+    """
+    Returns the id of a folder or file node, the same path in two repositories
+    gets two different ids.
+
+    Args:
+        repository (str, optional): Namespace of the project.
+        kind (str): 'folder' or 'file'.
+        path (str): Path of the folder or file.
+
+    Returns:
+        str: The node id.
+    """
+    if repository is None:
+        return get_node_id(kind, path)
+
+    return get_node_id(repository, kind, path)
+
+
+class CodeTreeNode:
+    """
+    Slotted base class of the code tree nodes.
+
+    Provides the parent/children interface of anytree's NodeMixin that the
+    anytree iterators and RenderTree rely on, without a per-instance __dict__.
+    Children are kept in a list that is only created for nodes that have
+    children, attaching a child is O(1), and the id is only derived once it
+    is first needed.
+    """
+
+    __slots__ = ("_children", "_node_id", "_parent")
+
+    def __init__(self, parent: CodeTreeNode | None = None) -> None:
+        self._parent = None
+        self._children = None
+        self._node_id = None
+        self.parent = parent
+
+    @property
+    def node_id(self) -> str:
+        if self._node_id is None:
+            self._node_id = self.get_default_node_id()
+        return self._node_id
+
+    @node_id.setter
+    def node_id(self, value: str) -> None:
+        self._node_id = value
+
+    @property
+    def parent(self) -> CodeTreeNode | None:
+        return self._parent
+
+    @parent.setter
+    def parent(self, value: CodeTreeNode | None) -> None:
+        if value is self._parent:
+            return
+
+        if self._parent is not None:
+            self._parent._children.remove(self)
+
+        if value is not None:
+            if value._children is None:
+                value._children = []
+            value._children.append(self)
+
+        self._parent = value
+
+    @property
+    def children(self) -> tuple[CodeTreeNode, ...]:
+        return tuple(self._children) if self._children else ()
+
+    @children.setter
+    def children(self, children: Iterable[CodeTreeNode]) -> None:
+        for child in self.children:
+            child._parent = None
+
+        self._children = None
+
+        for child in children:
+            child.parent = self
+
+    def get_default_node_id(self) -> str:
+        return str(uuid.uuid4())
+
+    @property
+    def is_leaf(self) -> bool:
+        return not self._children
+
+    @property
+    def is_root(self) -> bool:
+        return self._parent is None
+
+
+def get_repository(
+    repository: str | None, parent: CodeFolderNode | None
+) -> str | None:
+    if repository is None and parent is not None:
+        return parent.repository
+
+    return repository
+
 
-class CodeFolderNode(NodeMixin):
+class CodeFolderNode(CodeTreeNode):
+    __slots__ = ("folder_path", "name", "repository")
 
     def __init__(
-        self, name: str, folder_path: str, parent: CodeFolderNode | None
+        self,
+        name: str,
+        folder_path: str,
+        parent: CodeFolderNode | None,
+        repository: str | None = None,
     ) -> None:
         """_summary_
 
@@ -50,12 +222,16 @@ class CodeFolderNode(NodeMixin):
             name (str): _description_
             folder_path (str): _description_
             parent (CodeFolderNode, optional): _description_. Defaults to None.
+            repository (str, optional): Namespace of the project, inherited from
+                the parent if not given. Defaults to None.
         """
-        super().__init__()
-        self.node_id = str(uuid.uuid4())
+        super().__init__(parent=parent)
         self.name = name
-        self.folder_path = folder_path
-        self.parent = parent
+        self.folder_path = os.fspath(folder_path)
+        self.repository = get_repository(repository, parent)
+
+    def get_default_node_id(self) -> str:
+        return get_path_node_id(self.repository, "folder", self.folder_path)
 
     def __repr__(self):
         return f"{self.__class__.__name__}(name={self.name}, path={self.folder_path},parent={self.parent})"
@@ -72,21 +248,35 @@ class CodeFolderNode(NodeMixin):
         return {
             "id": self.node_id,
             "type": "folder",
+            "repository": self.repository,
             "name": self.name,
             "path": str(self.folder_path),
             "parent": self.parent.node_id if self.parent else None,
             "code_content": None,
             "embedding": None,
             "description": None,
+            "content_hash": None,
+            "start_line": None,
+            "end_line": None,
+            "qualified_name": None,
+            "signature": None,
+            "decorators": None,
+            "docstring": None,
+            "part": None,
+            "part_count": None,
+            "overlap_lines": None,
         }
 
 
-class CodeFileNode(NodeMixin):
+class CodeFileNode(CodeTreeNode):
+    __slots__ = ("content_hash", "file_path", "is_unchanged", "name", "repository")
+
     def __init__(
         self,
         name: str,
         file_path: str,
         parent: CodeFolderNode,
+        repository: str | None = None,
     ) -> None:
         """_summary_
 
@@ -94,54 +284,26 @@ class CodeFileNode(NodeMixin):
             name (str): _description_
             file_path (str): _description_
             parent (CodeFolderNode, optional): _description_. Defaults to None.
+            repository (str, optional): Namespace of the project, inherited from
+                the parent if not given. Defaults to None.
         """
-        super().__init__()
+        super().__init__(parent=parent)
 
-        self.node_id = str(uuid.uuid4())
         self.name = name
-        self.file_path = file_path
-        self.parent = parent
+        self.file_path = os.fspath(file_path)
         self.content_hash = None
+        self.is_unchanged = False
+        self.repository = get_repository(repository, parent)
 
-    def get_file_data(self) -> dict:
-        """_summary_
-
-        Returns:
-            dict: _description_
-        """
-        try:
-            stat_info = os.stat(self.file_path)
-            creation_time = stat_info.st_birthtime
-            modification_time = stat_info.st_mtime
-
-            file_extension = os.path.splitext(self.file_path)[1]
-            mime_type, _ = mimetypes.guess_type(self.file_path)
-
-            with open(self.file_path, encoding="utf-8") as file:
-                content = file.read()
-
-            return {
-                "content": content,
-                "file_name": os.path.basename(self.file_path),
-                "file_extension": file_extension,
-                "mime_type": mime_type,
-                "creation_time": creation_time,
-                "modification_time": modification_time,
-                "file_size": stat_info.st_size,
-            }
-
-        except FileNotFoundError:
-            logger.error(f"Error: The file '{self.file_path}' does not exist.")
-        except PermissionError:
-            logger.error(
-                f"Error: You do not have permission to read the file '{self.file_path}'."
-            )
-        except Exception as e:
-            logger.error(f"An unexpected error occurred: {e}")
+    def get_default_node_id(self) -> str:
+        return get_path_node_id(self.repository, "file", self.file_path)
 
     def refresh_content_hash(self):
-        content = self.get_file_data()["content"]
-        self.content_hash = hashlib.md5(content.encode("utf-8")).hexdigest()
+        try:
+            with open_file_buffer(self.file_path) as buffer:
+                self.content_hash = hash_buffer(buffer)
+        except OSError as e:
+            logger.error(f"Could not hash the file '{self.file_path}': {e}")
 
     def __repr__(self):
         return f"{self.__class__.__name__}(name={self.name}, path={self.file_path})"
@@ -158,31 +320,89 @@ class CodeFileNode(NodeMixin):
         return {
             "id": self.node_id,
             "type": "file",
+            "repository": self.repository,
             "name": self.name,
             "path": str(self.file_path),
             "parent": self.parent.node_id if self.parent else None,
             "code_content": None,
             "embedding": None,
             "description": None,
+            "content_hash": self.content_hash,
+            "start_line": None,
+            "end_line": None,
+            "qualified_name": None,
+            "signature": None,
+            "decorators": None,
+            "docstring": None,
+            "part": None,
+            "part_count": None,
+            "overlap_lines": None,
         }
 
 
-class CodeFunctionNode(NodeMixin):
-    def __init__(self, file_path: str, parent: CodeFileNode, code_content: str) -> None:
+class CodeFunctionNode(CodeTreeNode):
+    __slots__ = (
+        "code_content",
+        "decorators",
+        "docstring",
+        "end_line",
+        "file_path",
+        "name",
+        "overlap_lines",
+        "part",
+        "part_count",
+        "qualified_name",
+        "signature",
+        "start_line",
+    )
+
+    def __init__(
+        self,
+        file_path: str,
+        parent: CodeFileNode | CodeClassNode,
+        code_content: str,
+        start_line: int | None = None,
+        end_line: int | None = None,
+        name: str | None = None,
+        qualified_name: str | None = None,
+        signature: str | None = None,
+        decorators: list[str] | None = None,
+        docstring: str | None = None,
+        part: int | None = None,
+        part_count: int | None = None,
+        overlap_lines: int | None = None,
+    ) -> None:
         """_summary_
 
         Args:
-            name (str): _description_
             file_path (str): _description_
             parent (CodeFolderNode, optional): _description_. Defaults to None.
+            start_line (int, optional): First line of the chunk in its file.
+            end_line (int, optional): Last line of the chunk in its file.
+            name (str, optional): Name of the function.
+            qualified_name (str, optional): Dotted name of the function in its file.
+            signature (str, optional): Header of the function without its body.
+            decorators (list[str], optional): Source of the decorators.
+            docstring (str, optional): Docstring of the function.
+            part (int, optional): Position of the part of a split function.
+            part_count (int, optional): Number of parts of a split function.
+            overlap_lines (int, optional): Leading lines repeated from the
+                previous part.
         """
-        super().__init__()
+        super().__init__(parent=parent)
 
-        self.node_id = str(uuid.uuid4())
-        self.name = get_function_definition(code_content)
+        self.name = name
+        self.qualified_name = qualified_name
+        self.signature = signature
+        self.decorators = decorators
+        self.docstring = docstring
+        self.part = part
+        self.part_count = part_count
+        self.overlap_lines = overlap_lines
         self.file_path = file_path
-        self.parent = parent
         self.code_content = code_content
+        self.start_line = start_line
+        self.end_line = end_line
 
     def __repr__(self):
         return f"{self.__class__.__name__}(name={self.name}, path={self.file_path})"
@@ -199,31 +419,93 @@ class CodeFunctionNode(NodeMixin):
         return {
             "id": self.node_id,
             "type": "function",
+            "repository": self.parent.repository,
             "name": self.name,
             "path": str(self.file_path),
             "parent": self.parent.node_id,
             "code_content": self.code_content,
             "embedding": None,
             "description": None,
+            "content_hash": hash_buffer(self.code_content.encode("utf-8")),
+            "start_line": self.start_line,
+            "end_line": self.end_line,
+            "qualified_name": self.qualified_name,
+            "signature": self.signature,
+            "decorators": self.decorators,
+            "docstring": self.docstring,
+            "part": self.part,
+            "part_count": self.part_count,
+            "overlap_lines": self.overlap_lines,
         }
 
 
-class CodeClassNode(NodeMixin):
-    def __init__(self, file_path: str, parent: CodeFileNode, code_content: str) -> None:
+class CodeClassNode(CodeTreeNode):
+    __slots__ = (
+        "code_content",
+        "decorators",
+        "docstring",
+        "end_line",
+        "file_path",
+        "name",
+        "overlap_lines",
+        "part",
+        "part_count",
+        "qualified_name",
+        "signature",
+        "start_line",
+    )
+
+    def __init__(
+        self,
+        file_path: str,
+        parent: CodeFileNode | CodeClassNode,
+        code_content: str,
+        start_line: int | None = None,
+        end_line: int | None = None,
+        name: str | None = None,
+        qualified_name: str | None = None,
+        signature: str | None = None,
+        decorators: list[str] | None = None,
+        docstring: str | None = None,
+        part: int | None = None,
+        part_count: int | None = None,
+        overlap_lines: int | None = None,
+    ) -> None:
         """_summary_
 
         Args:
-            name (str): _description_
             file_path (str): _description_
             parent (CodeFolderNode, optional): _description_. Defaults to None.
+            start_line (int, optional): First line of the chunk in its file.
+            end_line (int, optional): Last line of the chunk in its file.
+            name (str, optional): Name of the class.
+            qualified_name (str, optional): Dotted name of the class in its file.
+            signature (str, optional): Header of the class without its body.
+            decorators (list[str], optional): Source of the decorators.
+            docstring (str, optional): Docstring of the class.
+            part (int, optional): Position of the part of a split class.
+            part_count (int, optional): Number of parts of a split class.
+            overlap_lines (int, optional): Leading lines repeated from the
+                previous part.
         """
-        super().__init__()
+        super().__init__(parent=parent)
 
-        self.node_id = str(uuid.uuid4())
-        self.name = get_class_definition(code_content)
+        self.name = name
+        self.qualified_name = qualified_name
+        self.signature = signature
+        self.decorators = decorators
+        self.docstring = docstring
+        self.part = part
+        self.part_count = part_count
+        self.overlap_lines = overlap_lines
         self.file_path = file_path
-        self.parent = parent
         self.code_content = code_content
+        self.start_line = start_line
+        self.end_line = end_line
+
+    @property
+    def repository(self) -> str | None:
+        return self.parent.repository
 
     def __repr__(self):
         return f"{self.__class__.__name__}(name={self.name}, path={self.file_path})"
@@ -240,30 +522,72 @@ class CodeClassNode(NodeMixin):
         return {
             "id": self.node_id,
             "type": "class",
+            "repository": self.parent.repository,
             "name": self.name,
             "path": str(self.file_path),
             "parent": self.parent.node_id,
             "code_content": self.code_content,
             "embedding": None,
             "description": None,
+            "content_hash": hash_buffer(self.code_content.encode("utf-8")),
+            "start_line": self.start_line,
+            "end_line": self.end_line,
+            "qualified_name": self.qualified_name,
+            "signature": self.signature,
+            "decorators": self.decorators,
+            "docstring": self.docstring,
+            "part": self.part,
+            "part_count": self.part_count,
+            "overlap_lines": self.overlap_lines,
         }
 
 
-class CodePieceNode(NodeMixin):
-    def __init__(self, file_path: str, parent: CodeFileNode, code_content: str) -> None:
+class CodePieceNode(CodeTreeNode):
+    __slots__ = (
+        "code_content",
+        "end_line",
+        "file_path",
+        "name",
+        "overlap_lines",
+        "part",
+        "part_count",
+        "start_line",
+    )
+
+    def __init__(
+        self,
+        file_path: str,
+        parent: CodeFileNode | CodeClassNode,
+        code_content: str,
+        start_line: int | None = None,
+        end_line: int | None = None,
+        part: int | None = None,
+        part_count: int | None = None,
+        overlap_lines: int | None = None,
+    ) -> None:
         """_summary_
 
         Args:
             name (str): _description_
             file_path (str): _description_
             parent (CodeFolderNode, optional): _description_. Defaults to None.
+            start_line (int, optional): First line of the chunk in its file.
+            end_line (int, optional): Last line of the chunk in its file.
+            part (int, optional): Position of the part of a split chunk.
+            part_count (int, optional): Number of parts of a split chunk.
+            overlap_lines (int, optional): Leading lines repeated from the
+                previous part.
         """
-        super().__init__()
+        super().__init__(parent=parent)
 
-        self.node_id = str(uuid.uuid4())
+        self.name = None
         self.file_path = file_path
-        self.parent = parent
         self.code_content = code_content
+        self.start_line = start_line
+        self.end_line = end_line
+        self.part = part
+        self.part_count = part_count
+        self.overlap_lines = overlap_lines
 
     def __repr__(self):
         return f"{self.__class__.__name__}(name={self.name}, path={self.file_path})"
@@ -280,44 +604,469 @@ class CodePieceNode(NodeMixin):
         return {
             "id": self.node_id,
             "type": "code_piece",
+            "repository": self.parent.repository,
             "name": None,
             "path": str(self.file_path),
             "parent": self.parent.node_id,
             "code_content": self.code_content,
             "embedding": None,
             "description": None,
+            "content_hash": hash_buffer(self.code_content.encode("utf-8")),
+            "start_line": self.start_line,
+            "end_line": self.end_line,
+            "qualified_name": None,
+            "signature": None,
+            "decorators": None,
+            "docstring": None,
+            "part": self.part,
+            "part_count": self.part_count,
+            "overlap_lines": self.overlap_lines,
         }
 
 
-def build_tree_recursive(file_path: Path) -> CodeFolderNode:
+CodeChunkNode = CodeFunctionNode | CodeClassNode | CodePieceNode
+
+
+def build_tree_recursive(
+    file_path: Path,
+    known_file_hashes: dict[str, str] | None = None,
+    jobs: int = 1,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    normalize: str = NORMALIZE_NONE,
+    format_cache: FormatCache | None = None,
+    exclude_patterns: Iterable[str] = (),
+    use_default_excludes: bool = True,
+    use_gitignore: bool = True,
+    repository: str | None = None,
+    parse_cache: ParseCache | None = None,
+    max_chunk_depth: int = DEFAULT_MAX_CHUNK_DEPTH,
+    split_min_lines: int = DEFAULT_SPLIT_MIN_LINES,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    chunk_overlap_lines: int = DEFAULT_CHUNK_OVERLAP_LINES,
+) -> CodeFolderNode:
     """
-    Parent function to build the file tree with progress tracking using os.walk and tqdm.
+    Parent function to build the whole code tree in memory, see walk_code_tree and
+    chunk_code_files.
 
     Args:
         file_path (Path): The root path of the file system to build the tree from.
+        known_file_hashes (dict[str, str], optional): Content hashes of already
+            ingested files keyed by path. Files whose hash did not change are not
+            split into chunks. Defaults to None.
+        jobs (int, optional): Number of worker processes used for chunking.
+            Defaults to 1.
+        max_file_size (int, optional): Python files larger than this many bytes are
+            not split into chunks. Defaults to 5 MiB.
+        normalize (str, optional): Chunk normalization mode, see format_code.
+            Defaults to 'none'.
+        format_cache (FormatCache, optional): Cache of formatted chunks. Defaults to None.
+        exclude_patterns (Iterable[str], optional): Additional gitignore style
+            patterns relative to the root that are not added to the tree.
+        use_default_excludes (bool, optional): Exclude VCS, virtualenv, cache and
+            build directories, see DEFAULT_EXCLUDE_PATTERNS. Defaults to True.
+        use_gitignore (bool, optional): Respect .gitignore files found during the
+            walk. Defaults to True.
+        repository (str, optional): Namespace of the project, part of every node
+            and node id. Defaults to None.
+        parse_cache (ParseCache, optional): Cache of split files, unchanged files
+            are only stat'ed. Defaults to None.
+        max_chunk_depth (int, optional): Nesting depth of chunks, methods of large
+            classes become children of their class. Defaults to 2.
+        split_min_lines (int, optional): Classes spanning at most this many lines
+            are not split. Defaults to 100.
+        max_chunk_size (int, optional): Larger chunks are split into parts of at
+            most this many characters. Defaults to 24000.
+        chunk_overlap_lines (int, optional): Lines of the previous part repeated
+            in the next part of a split chunk. Defaults to 2.
 
     Returns:
         Union[CodeFileNode, CodeFolderNode]: The root node of the constructed tree.
     """
+    root, pending_files = walk_code_tree(
+        file_path,
+        known_file_hashes=known_file_hashes,
+        exclude_patterns=exclude_patterns,
+        use_default_excludes=use_default_excludes,
+        use_gitignore=use_gitignore,
+        repository=repository,
+    )
+
+    chunk_code_files(
+        pending_files,
+        known_file_hashes=known_file_hashes,
+        jobs=jobs,
+        max_file_size=max_file_size,
+        normalize=normalize,
+        format_cache=format_cache,
+        parse_cache=parse_cache,
+        max_chunk_depth=max_chunk_depth,
+        split_min_lines=split_min_lines,
+        max_chunk_size=max_chunk_size,
+        chunk_overlap_lines=chunk_overlap_lines,
+    )
+
+    return root
+
+
+def walk_code_tree(
+    file_path: Path,
+    known_file_hashes: dict[str, str] | None = None,
+    exclude_patterns: Iterable[str] = (),
+    use_default_excludes: bool = True,
+    use_gitignore: bool = True,
+    repository: str | None = None,
+) -> tuple[CodeFolderNode, list[CodeFileNode]]:
+    """
+    Walks the directory once with os.scandir and builds the folder and file nodes,
+    skipping excluded and ignored paths. Python files are not read yet.
+
+    Args:
+        file_path (Path): The root path of the file system to build the tree from.
+        known_file_hashes (dict[str, str], optional): Content hashes of already
+            ingested files keyed by path. Defaults to None.
+        exclude_patterns (Iterable[str], optional): Additional gitignore style
+            patterns relative to the root that are not added to the tree.
+        use_default_excludes (bool, optional): Exclude VCS, virtualenv, cache and
+            build directories, see DEFAULT_EXCLUDE_PATTERNS. Defaults to True.
+        use_gitignore (bool, optional): Respect .gitignore files found during the
+            walk. Defaults to True.
+        repository (str, optional): Namespace of the project, inherited by every
+            node of the tree. Defaults to None.
+
+    Returns:
+        tuple[CodeFolderNode, list[CodeFileNode]]: The root node of the tree and the
+            Python files that still have to be hashed and split, in pre-order.
+    """
 
-    total_items = (
-        sum(len(files) + len(dirs) for _, dirs, files in os.walk(file_path)) + 1
-    )  # plus one for base dir
+    known_file_hashes = known_file_hashes or {}
 
-    with tqdm(
-        total=total_items,
+    patterns = list(DEFAULT_EXCLUDE_PATTERNS) if use_default_excludes else []
+    patterns.extend(exclude_patterns)
+    ignore_rules = IgnoreRules.from_patterns(patterns)
+
+    with build_metrics.timer("walk"), tqdm(
         desc="Building code tree",
         unit="item",
-        bar_format="Lilith - INFO - {l_bar}{bar}{r_bar}",
+        bar_format="Lilith - INFO - {desc}: {n_fmt} {unit} [{elapsed}, {rate_fmt}]",
     ) as pbar:
-        root = __build_tree_recursive(file_path, parent=None, pbar=pbar)
+        pending_files = []
+        root = __build_tree_recursive(
+            file_path,
+            parent=None,
+            pbar=pbar,
+            known_file_hashes=known_file_hashes,
+            pending_files=pending_files,
+            ignore_rules=ignore_rules,
+            use_gitignore=use_gitignore,
+            repository=repository,
+        )
+
+    build_metrics.add("items_walked", pbar.n)
+    build_metrics.add("python_files", len(pending_files))
+
+    return root, pending_files
+
+
+def chunk_code_files(
+    file_nodes: list[CodeFileNode],
+    known_file_hashes: dict[str, str] | None = None,
+    jobs: int = 1,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    normalize: str = NORMALIZE_NONE,
+    format_cache: FormatCache | None = None,
+    parse_cache: ParseCache | None = None,
+    max_chunk_depth: int = DEFAULT_MAX_CHUNK_DEPTH,
+    split_min_lines: int = DEFAULT_SPLIT_MIN_LINES,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    chunk_overlap_lines: int = DEFAULT_CHUNK_OVERLAP_LINES,
+) -> None:
+    """
+    Hashes the given Python files, splits the new or changed ones into chunks and
+    attaches the chunk nodes to them, see iterate_processed_files.
 
-    return root
+    Args:
+        file_nodes (list[CodeFileNode]): File nodes of the Python files to split.
+        known_file_hashes (dict[str, str], optional): Hashes of already ingested
+            files keyed by path. Defaults to None.
+        jobs (int, optional): Number of worker processes. Defaults to 1.
+        max_file_size (int, optional): Larger files are not split. Defaults to 5 MiB.
+        normalize (str, optional): Chunk normalization mode. Defaults to 'none'.
+        format_cache (FormatCache, optional): Cache of formatted chunks. Defaults to None.
+        parse_cache (ParseCache, optional): Cache of split files. Defaults to None.
+        max_chunk_depth (int, optional): Nesting depth of chunks. Defaults to 2.
+        split_min_lines (int, optional): Smaller classes are not split. Defaults to 100.
+        max_chunk_size (int, optional): Size limit of chunks in characters.
+            Defaults to 24000.
+        chunk_overlap_lines (int, optional): Overlap of chunk parts. Defaults to 2.
+    """
+    processed_files = iterate_processed_files(
+        file_nodes,
+        known_file_hashes=known_file_hashes,
+        jobs=jobs,
+        max_file_size=max_file_size,
+        normalize=normalize,
+        format_cache=format_cache,
+        parse_cache=parse_cache,
+        max_chunk_depth=max_chunk_depth,
+        split_min_lines=split_min_lines,
+        max_chunk_size=max_chunk_size,
+        chunk_overlap_lines=chunk_overlap_lines,
+    )
+
+    for _ in tqdm(
+        processed_files,
+        total=len(file_nodes),
+        desc="Splitting code files",
+        unit="file",
+        bar_format="Lilith - INFO - {l_bar}{bar}{r_bar}",
+    ):
+        pass
+
+
+def iterate_processed_files(
+    file_nodes: list[CodeFileNode],
+    known_file_hashes: dict[str, str] | None = None,
+    jobs: int = 1,
+    max_file_size: int = DEFAULT_MAX_FILE_SIZE,
+    normalize: str = NORMALIZE_NONE,
+    format_cache: FormatCache | None = None,
+    parse_cache: ParseCache | None = None,
+    max_chunk_depth: int = DEFAULT_MAX_CHUNK_DEPTH,
+    split_min_lines: int = DEFAULT_SPLIT_MIN_LINES,
+    max_chunk_size: int = DEFAULT_MAX_CHUNK_SIZE,
+    chunk_overlap_lines: int = DEFAULT_CHUNK_OVERLAP_LINES,
+) -> Iterator[CodeFileNode]:
+    """
+    Hashes the given Python files, splits the new or changed ones into chunks and
+    yields each file node, in order, once its chunk nodes are attached.
+
+    Every file is read once, the same buffer is hashed, decoded and parsed. Parsing
+    and formatting is CPU-bound, so with more than one job the files are processed
+    in a process pool, while the nodes are always created in this process. At most
+    PROCESSING_WINDOW_PER_JOB files per job are in flight, so results never pile up
+    faster than they are consumed.
+
+    With a parse cache, files whose size and mtime did not change since they were
+    cached are not read at all, their chunks are loaded in this process.
+
+    Args:
+        file_nodes (list[CodeFileNode]): File nodes of the Python files to split.
+        known_file_hashes (dict[str, str], optional): Hashes of already ingested
+            files keyed by path. Defaults to None.
+        jobs (int, optional): Number of worker processes. Defaults to 1.
+        max_file_size (int, optional): Larger files are not split. Defaults to 5 MiB.
+        normalize (str, optional): Chunk normalization mode. Defaults to 'none'.
+        format_cache (FormatCache, optional): Cache of formatted chunks. Defaults to None.
+        parse_cache (ParseCache, optional): Cache of split files. Defaults to None.
+        max_chunk_depth (int, optional): Nesting depth of chunks. Defaults to 2.
+        split_min_lines (int, optional): Smaller classes are not split. Defaults to 100.
+        max_chunk_size (int, optional): Size limit of chunks in characters.
+            Defaults to 24000.
+        chunk_overlap_lines (int, optional): Overlap of chunk parts. Defaults to 2.
+
+    Returns:
+        Iterator[CodeFileNode]: The processed file nodes.
+    """
+    known_file_hashes = known_file_hashes or {}
+    chunking_key = get_chunking_key(
+        normalize,
+        max_file_size,
+        max_chunk_depth,
+        split_min_lines,
+        max_chunk_size,
+        chunk_overlap_lines,
+    )
+
+    process_file = partial(
+        read_and_split_code_file,
+        max_file_size=max_file_size,
+        normalize=normalize,
+        cache=format_cache,
+        parse_cache=parse_cache,
+        max_chunk_depth=max_chunk_depth,
+        split_min_lines=split_min_lines,
+        max_chunk_size=max_chunk_size,
+        chunk_overlap_lines=chunk_overlap_lines,
+    )
+
+    def get_cached_result(file_node: CodeFileNode, known_hash: str | None):
+        if parse_cache is None:
+            return None, None
+
+        file_stat, result = parse_cache.get_file_result(
+            file_node.file_path, chunking_key
+        )
+
+        # unchanged files of incremental builds are not split again
+        if result is not None and result["content_hash"] == known_hash:
+            result = {**result, "chunks": None, "error": None}
+
+        return file_stat, result
+
+    def finish_file(file_node, known_hash, file_stat, result) -> None:
+        if parse_cache is not None:
+            parse_cache.put(file_node.file_path, file_stat, chunking_key, result)
+
+        add_file_result(file_node, known_hash, result)
+
+    if jobs <= 1 or len(file_nodes) <= 1:
+        for file_node in file_nodes:
+            known_hash = known_file_hashes.get(str(file_node.file_path))
+            file_stat, result = get_cached_result(file_node, known_hash)
+
+            if result is None:
+                result = process_file(file_node.file_path, known_hash)
+
+            finish_file(file_node, known_hash, file_stat, result)
+            yield file_node
+        return
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        remaining_files = iter(file_nodes)
+        in_flight = deque()
+
+        def submit_next() -> None:
+            file_node = next(remaining_files, None)
+            if file_node is None:
+                return
+
+            known_hash = known_file_hashes.get(str(file_node.file_path))
+            file_stat, result = get_cached_result(file_node, known_hash)
+
+            # cache hits wait in line as finished results, so the output order
+            # stays the same
+            if result is None:
+                result = executor.submit(process_file, file_node.file_path, known_hash)
+
+            in_flight.append((file_node, known_hash, file_stat, result))
+
+        for _ in range(jobs * PROCESSING_WINDOW_PER_JOB):
+            submit_next()
+
+        while in_flight:
+            file_node, known_hash, file_stat, result = in_flight.popleft()
+            submit_next()
+
+            if isinstance(result, Future):
+                # time the consumer waits for the workers
+                with build_metrics.timer("processing_wait"):
+                    result = result.result()
+
+            finish_file(file_node, known_hash, file_stat, result)
+            yield file_node
+
+
+def add_file_result(
+    file_node: CodeFileNode, known_hash: str | None, result: dict
+) -> None:
+    """
+    Applies the result of read_and_split_code_file to a file node.
+
+    Args:
+        file_node (CodeFileNode): The processed file.
+        known_hash (str | None): Hash of the already ingested version of the file.
+        result (dict): The result of read_and_split_code_file.
+    """
+    file_node.content_hash = result["content_hash"]
+    file_node.is_unchanged = (
+        known_hash is not None and result["content_hash"] == known_hash
+    )
+
+    build_metrics.add("files_processed")
+    build_metrics.add("bytes_read", result.get("bytes_read", 0))
+
+    if result.get("cached"):
+        build_metrics.add("files_cached")
+
+    for name, seconds in result.get("timings", {}).items():
+        build_metrics.add_time(f"file_{name}", seconds)
+
+    if result["error"] is not None:
+        build_metrics.add("files_failed")
+        logger.warning(f"{file_node.file_path}: {result['error']}")
+
+    if result["chunks"] is not None:
+        add_chunk_nodes(file_node, result["chunks"])
+
+
+def get_chunk_metadata(
+    chunk: dict, keys: tuple[str, ...] = CHUNK_METADATA_KEYS
+) -> dict:
+    return {key: chunk.get(key) for key in keys}
+
+
+def get_part_key(chunk: dict) -> tuple:
+    # chunks that were not split keep the node id they had before parts existed
+    return ("part", chunk["part"]) if chunk.get("part") else ()
+
+
+def add_chunk_nodes(
+    file_node: CodeFileNode | CodeClassNode, chunks: list[dict[str, str]]
+) -> None:
+    """
+    Creates the function, class and code piece nodes of a file, and of the
+    chunks nested in them.
+
+    Args:
+        file_node (CodeFileNode | CodeClassNode): The file, or the split class,
+            the chunks belong to.
+        chunks (list[dict[str, str]]): Chunks as returned by split_code_file_into_chunks.
+    """
+    file_path = file_node.file_path
+    occurrences = Counter()
+
+    build_metrics.add("chunks_produced", len(chunks))
+
+    for chunk in chunks:
+        chunk_node = None
+
+        if chunk["type"] == "function":
+            chunk_node = CodeFunctionNode(
+                file_path=file_path,
+                parent=file_node,
+                code_content=chunk["code"],
+                start_line=chunk["start_line"],
+                end_line=chunk["end_line"],
+                **get_chunk_metadata(chunk),
+                **get_chunk_metadata(chunk, CHUNK_PART_KEYS),
+            )
+        if chunk["type"] == "class":
+            chunk_node = CodeClassNode(
+                file_path=file_path,
+                parent=file_node,
+                code_content=chunk["code"],
+                start_line=chunk["start_line"],
+                end_line=chunk["end_line"],
+                **get_chunk_metadata(chunk),
+                **get_chunk_metadata(chunk, CHUNK_PART_KEYS),
+            )
+        if chunk["type"] == "code_piece":
+            chunk_node = CodePieceNode(
+                file_path=file_path,
+                parent=file_node,
+                code_content=chunk["code"],
+                start_line=chunk["start_line"],
+                end_line=chunk["end_line"],
+                **get_chunk_metadata(chunk, CHUNK_PART_KEYS),
+            )
+
+        if chunk_node is not None:
+            # same named chunks, e.g. redefinitions or code pieces, are told
+            # apart by their position among each other, and parts of a split
+            # chunk by their part
+            key = (chunk["type"], chunk_node.name, *get_part_key(chunk))
+            chunk_node.node_id = get_node_id(
+                file_node.node_id, *key, occurrences[key]
+            )
+            occurrences[key] += 1
+
+            if chunk.get("children"):
+                add_chunk_nodes(chunk_node, chunk["children"])
 
 
 def is_python_file(current_path: Path) -> bool:
     """
-    Check if the given Path points to a Python file based on its extension.
+    Check if the given file Path is a Python file based on its extension.
 
     Args:
         current_path (Path): The path to check.
@@ -326,7 +1075,7 @@ def is_python_file(current_path: Path) -> bool:
         bool: True if it's a Python file, False otherwise.
     """
 
-    result = current_path.is_file() and current_path.suffix.lower() == ".py"
+    result = current_path.suffix.lower() == ".py"
     return result
 
 
@@ -334,6 +1083,12 @@ def __build_tree_recursive(
     current_path: Path,
     parent: CodeFileNode | CodeFolderNode = None,
     pbar: tqdm = None,
+    known_file_hashes: dict[str, str] | None = None,
+    pending_files: list[CodeFileNode] | None = None,
+    ignore_rules: IgnoreRules | None = None,
+    use_gitignore: bool = True,
+    relative_path: str = "",
+    repository: str | None = None,
 ) -> CodeFolderNode:
     """_summary_
 
@@ -341,49 +1096,118 @@ def __build_tree_recursive(
         current_path (Path): _description_
         parent (CodeFileNode | CodeFolderNode, optional): _description_. Defaults to None.
         pbar (tqdm, optional): _description_. Defaults to None.
+        known_file_hashes (dict[str, str], optional): _description_. Defaults to None.
+        pending_files (list[CodeFileNode], optional): Collects the Python files
+            that still have to be hashed and split into chunks. Defaults to None.
+        ignore_rules (IgnoreRules, optional): Rules of the paths to skip, extended
+            by the .gitignore files on the way down. Defaults to None.
+        use_gitignore (bool, optional): Read .gitignore files. Defaults to True.
+        relative_path (str, optional): Posix path of current_path relative to the
+            walk root, empty for the root. Defaults to "".
+        repository (str, optional): Namespace of the project, only passed for the
+            root, the other nodes inherit it. Defaults to None.
 
     Returns:
         CodeFolderNode: _description_
     """
 
-    name = current_path.name
+    if not current_path.is_dir():
+        return __add_file_node(
+            current_path,
+            parent=parent,
+            pbar=pbar,
+            known_file_hashes=known_file_hashes,
+            pending_files=pending_files,
+            repository=repository,
+        )
+
+    node = CodeFolderNode(
+        name=current_path.name,
+        folder_path=current_path,
+        parent=parent,
+        repository=repository,
+    )
+    pbar.update(1)
+
+    try:
+        with os.scandir(current_path) as scanner:
+            entries = sorted(scanner, key=lambda entry: entry.name)
+
+    except PermissionError as e:
+        logger.error(f"Permission denied: {current_path}")
+        raise CoreError(f"Building code tree failed with error: {e}")
+
+    ignore_rules = ignore_rules or IgnoreRules()
+
+    if use_gitignore and any(
+        entry.name == GITIGNORE_FILE_NAME and entry.is_file() for entry in entries
+    ):
+        ignore_rules = ignore_rules.extended_with_gitignore(
+            current_path / GITIGNORE_FILE_NAME, base=relative_path
+        )
+
+    for entry in entries:
+        entry_relative_path = (
+            f"{relative_path}/{entry.name}" if relative_path else entry.name
+        )
+        is_dir = entry.is_dir(follow_symlinks=False)
+
+        if ignore_rules.is_ignored(entry_relative_path, is_dir):
+            continue
+
+        if is_dir:
+            __build_tree_recursive(
+                Path(entry.path),
+                parent=node,
+                pbar=pbar,
+                known_file_hashes=known_file_hashes,
+                pending_files=pending_files,
+                ignore_rules=ignore_rules,
+                use_gitignore=use_gitignore,
+                relative_path=entry_relative_path,
+            )
 
-    if current_path.is_dir():
-        node = CodeFolderNode(name=name, folder_path=current_path, parent=parent)
+        elif entry.is_symlink() and entry.is_dir():
+            # symlinked directories are not followed, this rules out cycles
+            logger.debug(f"Skipping symlinked directory: {entry.path}")
+
+        elif entry.is_file():
+            __add_file_node(
+                Path(entry.path),
+                parent=node,
+                pbar=pbar,
+                known_file_hashes=known_file_hashes,
+                pending_files=pending_files,
+            )
 
-        pbar.update(1)
-        try:
-            for item in current_path.iterdir():
-                __build_tree_recursive(item, parent=node, pbar=pbar)
+    return node
 
-        except PermissionError as e:
-            logger.error(f"Permission denied: {current_path}")
-            raise CoreError(f"Building code tree failed with error: {e}")
 
+def __add_file_node(
+    file_path: Path,
+    parent: CodeFolderNode | None,
+    pbar: tqdm,
+    known_file_hashes: dict[str, str],
+    pending_files: list[CodeFileNode],
+    repository: str | None = None,
+) -> CodeFileNode:
+    node = CodeFileNode(
+        name=file_path.name,
+        file_path=file_path,
+        parent=parent,
+        repository=repository,
+    )
+
+    # Python files are hashed while they are split, so they are read only once
+    if is_python_file(file_path):
+        pending_files.append(node)
     else:
-        node = CodeFileNode(name=name, file_path=current_path, parent=parent)
         node.refresh_content_hash()
 
-        # current_path
+        known_hash = known_file_hashes.get(str(file_path))
+        node.is_unchanged = known_hash is not None and known_hash == node.content_hash
 
-        if is_python_file(current_path):
-            chunks = split_code_file_into_chunks(current_path)
-
-            for chunk in chunks:
-                if chunk["type"] == "function":
-                    CodeFunctionNode(
-                        file_path=current_path, parent=node, code_content=chunk["code"]
-                    )
-                if chunk["type"] == "class":
-                    CodeClassNode(
-                        file_path=current_path, parent=node, code_content=chunk["code"]
-                    )
-                if chunk["type"] == "code_piece":
-                    CodePieceNode(
-                        file_path=current_path, parent=node, code_content=chunk["code"]
-                    )
-
-        pbar.update(1)
+    pbar.update(1)
 
     return node
 
@@ -418,8 +1242,168 @@ def export_code_tree(tree_root: CodeFileNode | CodeFolderNode) -> dict:
     return result
 
 
+def iterate_code_tree_streaming(
+    tree_root: CodeFileNode | CodeFolderNode,
+    processed_files: Iterator[CodeFileNode],
+) -> Iterator[CodeFolderNode | CodeFileNode | CodeChunkNode]:
+    """
+    Iterates a walked tree in pre-order while its Python files are processed.
+
+    processed_files has to yield the pending files of walk_code_tree in their
+    pre-order, as iterate_processed_files does. The chunk nodes of a file are
+    detached again once the iteration moves past them, so only the chunks of the
+    files currently being iterated are held in memory.
+
+    Args:
+        tree_root (CodeFileNode | CodeFolderNode): Root returned by walk_code_tree.
+        processed_files (Iterator[CodeFileNode]): The processed pending files.
+
+    Returns:
+        Iterator[CodeFolderNode | CodeFileNode | CodeChunkNode]: All nodes in pre-order.
+    """
+    next_file = next(processed_files, None)
+    stack = [tree_root]
+
+    while stack:
+        node = stack.pop()
+        yield node
+
+        if isinstance(node, CodeFolderNode):
+            stack.extend(reversed(node.children))
+            continue
+
+        if node is not next_file:
+            continue
+
+        for chunk_node in node.children:
+            yield from iterate_code_tree(chunk_node)
+        node.children = ()
+
+        next_file = next(processed_files, None)
+
+
+def stream_code_tree_export(
+    tree_root: CodeFileNode | CodeFolderNode,
+    processed_files: Iterator[CodeFileNode],
+) -> Iterator[dict]:
+    """
+    Streaming variant of export_code_tree, see iterate_code_tree_streaming.
+
+    Args:
+        tree_root (CodeFileNode | CodeFolderNode): Root returned by walk_code_tree.
+        processed_files (Iterator[CodeFileNode]): The processed pending files.
+
+    Returns:
+        Iterator[dict]: The exported nodes in pre-order.
+    """
+    for item in iterate_code_tree_streaming(tree_root, processed_files):
+        yield item.dictify_for_neo4j()
+
+
+def export_code_tree_changes(
+    tree_root: CodeFileNode | CodeFolderNode, indexed_nodes: list[dict]
+) -> tuple[list[dict], list[str], dict[str, list[str]]]:
+    """
+    Compares the code tree against the folder and file nodes already stored in
+    the database and exports only what has to be written for an incremental build,
+    see iterate_code_tree_changes.
+
+    Args:
+        tree_root (CodeFileNode | CodeFolderNode): Root of the freshly built tree.
+        indexed_nodes (list[dict]): Stored folder and file nodes with
+            'id', 'type', 'path', 'parent' and 'content_hash' keys.
+
+    Returns:
+        tuple[list[dict], list[str], dict[str, list[str]]]: Nodes to upsert, ids of
+            the stored subtrees to delete and the descendants to keep per changed file.
+    """
+    stale_ids = []
+    kept_descendants = {}
+    to_upsert = list(
+        iterate_code_tree_changes(
+            iterate_code_tree(tree_root), indexed_nodes, stale_ids, kept_descendants
+        )
+    )
+
+    return to_upsert, stale_ids, kept_descendants
+
+
+def iterate_code_tree_changes(
+    nodes: Iterable[CodeFolderNode | CodeFileNode | CodeChunkNode],
+    indexed_nodes: list[dict],
+    stale_ids: list[str],
+    kept_descendants: dict[str, list[str]],
+) -> Iterator[dict]:
+    """
+    Yields the exported nodes that have to be upserted for an incremental build.
+
+    Folders and unchanged files that already exist are skipped. They take over
+    their stored id, which only differs from the derived one for graphs written
+    before ids were deterministic. Changed files are exported again with their
+    chunks. If the stored file has the same id, it is upserted and its outdated
+    descendants are pruned afterwards, otherwise its old subtree is deleted.
+
+    Args:
+        nodes (Iterable): Nodes of the freshly built tree in pre-order.
+        indexed_nodes (list[dict]): Stored folder and file nodes with
+            'id', 'type', 'path', 'parent' and 'content_hash' keys.
+        stale_ids (list[str]): Receives the ids of the stored subtrees to delete.
+        kept_descendants (dict[str, list[str]]): Receives, per changed file id, the
+            ids of its current descendants, every other descendant is outdated.
+            Both are complete once the iterator is exhausted.
+
+    Returns:
+        Iterator[dict]: Nodes to upsert.
+    """
+    indexed_by_path = {(item["type"], item["path"]): item for item in indexed_nodes}
+    kept_ids = set()
+    changed_file_descendants = None
+
+    for item in nodes:
+        if isinstance(item, CodeFolderNode):
+            changed_file_descendants = None
+            indexed = indexed_by_path.get(("folder", str(item.folder_path)))
+
+            if indexed is not None:
+                item.node_id = indexed["id"]
+                kept_ids.add(indexed["id"])
+                continue
+
+        elif isinstance(item, CodeFileNode):
+            changed_file_descendants = None
+            indexed = indexed_by_path.get(("file", str(item.file_path)))
+
+            if indexed is not None:
+                kept_ids.add(indexed["id"])
+
+                if item.is_unchanged:
+                    item.node_id = indexed["id"]
+                    continue
+
+                if indexed["id"] == item.node_id:
+                    changed_file_descendants = kept_descendants.setdefault(
+                        item.node_id, []
+                    )
+                else:
+                    stale_ids.append(indexed["id"])
+
+        elif changed_file_descendants is not None:
+            changed_file_descendants.append(item.node_id)
+
+        yield item.dictify_for_neo4j()
+
+    removed_ids = {item["id"] for item in indexed_nodes} - kept_ids
+
+    # descendants of a removed folder are deleted together with the folder
+    stale_ids.extend(
+        item["id"]
+        for item in indexed_nodes
+        if item["id"] in removed_ids and item["parent"] not in removed_ids
+    )
+
+
 def iterate_code_tree(
-    tree_root: CodeFileNode | CodeFolderNode, max_level: int = 10
+    tree_root: CodeFileNode | CodeFolderNode, max_level: int | None = None
 ) -> PreOrderIter:
     """_summary_
 
@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import mmap
+import os
+import tokenize
+
+from contextlib import contextmanager
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+    from pathlib import Path
+    from typing import BinaryIO
+
+
+# files above this size are memory mapped instead of read into a bytes object
+MMAP_THRESHOLD = 1024 * 1024
+
+# Python files above this size are hashed but not parsed into chunks
+DEFAULT_MAX_FILE_SIZE = 5 * 1024 * 1024
+
+BINARY_CHECK_SIZE = 8192
+
+
+@contextmanager
+def open_file_buffer(file_path: Path, file_size: int | None = None) -> Iterator:
+    """
+    Reads a file once and yields its content as a bytes-like buffer.
+
+    Small files are read into bytes, large files are memory mapped so hashing and
+    decoding work on the page cache without an extra copy.
+
+    Args:
+        file_path (Path): The file to read.
+        file_size (int, optional): Size of the file if already known from a stat.
+
+    Returns:
+        Iterator[bytes | mmap.mmap]: The content of the file.
+    """
+    with open(file_path, "rb") as f, read_file_buffer(f, file_size) as buffer:
+        yield buffer
+
+
+@contextmanager
+def read_file_buffer(
+    f: BinaryIO, file_size: int | None = None, head: bytes = b""
+) -> Iterator:
+    """
+    Yields the whole content of an open binary file, see open_file_buffer.
+
+    Args:
+        f (BinaryIO): The file, opened for reading in binary mode.
+        file_size (int, optional): Size of the file if already known from a stat.
+        head (bytes, optional): Content already read from the start of the file,
+            the file is positioned right after it. Defaults to b"".
+
+    Returns:
+        Iterator[bytes | mmap.mmap]: The content of the file.
+    """
+    if file_size is None:
+        file_size = os.fstat(f.fileno()).st_size
+
+    if file_size < MMAP_THRESHOLD:
+        yield head + f.read()
+        return
+
+    with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+        yield buffer
+
+
+def hash_buffer(buffer: bytes | mmap.mmap) -> str:
+    return hashlib.md5(buffer).hexdigest()
+
+
+def is_binary(buffer: bytes | mmap.mmap) -> bool:
+    """
+    Cheap binary check, text files practically never contain NUL bytes.
+
+    Args:
+        buffer (bytes | mmap.mmap): Content of the file.
+
+    Returns:
+        bool: True if the header of the file contains a NUL byte.
+    """
+    return b"\0" in buffer[:BINARY_CHECK_SIZE]
+
+
+def decode_python_source(buffer: bytes | mmap.mmap) -> str:
+    """
+    Decodes Python source respecting a BOM or PEP 263 encoding declaration.
+
+    Args:
+        buffer (bytes | mmap.mmap): Content of the file.
+
+    Returns:
+        str: The decoded source.
+    """
+    encoding, _ = tokenize.detect_encoding(
+        io.BytesIO(buffer[:BINARY_CHECK_SIZE]).readline
+    )
+    return str(buffer, encoding)
@@ -0,0 +1,45 @@
+from __future__ import annotations
+
+import black
+
+from lilith.core.utils import DiskCache
+
+
+class FormatCache(DiskCache):
+    """
+    Content-addressed on-disk cache of black formatted code.
+
+    Entries are keyed by the unformatted source, the black version and the
+    normalization mode.
+    """
+
+    def get(self, code: str, mode: str) -> str | None:
+        """
+        Returns the cached formatted code, or None on a cache miss.
+
+        Args:
+            code (str): The unformatted source.
+            mode (str): The normalization mode the code was formatted with.
+
+        Returns:
+            str | None: The formatted code if it is cached.
+        """
+        data = self.read_entry(self.get_key(black.__version__, mode, code))
+
+        try:
+            return None if data is None else data.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+
+    def put(self, code: str, mode: str, formatted_code: str) -> None:
+        """
+        Stores formatted code in the cache.
+
+        Args:
+            code (str): The unformatted source.
+            mode (str): The normalization mode the code was formatted with.
+            formatted_code (str): The formatted source.
+        """
+        self.write_entry(
+            self.get_key(black.__version__, mode, code), formatted_code.encode("utf-8")
+        )
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import logging
+import re
+
+from typing import TYPE_CHECKING
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from pathlib import Path
+
+
+logger = logging.getLogger(__name__)
+
+
+GITIGNORE_FILE_NAME = ".gitignore"
+
+DEFAULT_EXCLUDE_PATTERNS = (
+    ".git/",
+    ".hg/",
+    ".svn/",
+    ".lilith/",
+    "node_modules/",
+    ".venv/",
+    "venv/",
+    "__pycache__/",
+    ".mypy_cache/",
+    ".pytest_cache/",
+    ".ruff_cache/",
+    ".tox/",
+    ".nox/",
+    "*.egg-info/",
+    "build/",
+    "dist/",
+)
+
+
+def translate_pattern(pattern: str) -> str:
+    """
+    Translates a gitignore style glob into a regular expression.
+
+    '*' and '?' do not match '/', '**' matches across directories.
+
+    Args:
+        pattern (str): The glob without negation, leading or trailing slashes.
+
+    Returns:
+        str: The regular expression matching the whole path.
+    """
+    output = []
+    i = 0
+    n = len(pattern)
+
+    while i < n:
+        char = pattern[i]
+
+        if char == "*":
+            if pattern[i : i + 3] == "**/":
+                output.append("(?:.*/)?")
+                i += 3
+                continue
+            if pattern[i : i + 2] == "**":
+                output.append(".*")
+                i += 2
+                continue
+            output.append("[^/]*")
+        elif char == "?":
+            output.append("[^/]")
+        elif char == "[":
+            closing = pattern.find("]", i + 1)
+            if closing == -1:
+                output.append(re.escape(char))
+            else:
+                char_class = pattern[i + 1 : closing].replace("\\", "\\\\")
+                if char_class.startswith("!"):
+                    char_class = "^" + char_class[1:]
+                output.append(f"[{char_class}]")
+                i = closing + 1
+                continue
+        elif char == "\\" and i + 1 < n:
+            output.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            output.append(re.escape(char))
+
+        i += 1
+
+    return "".join(output)
+
+
+class IgnoreRule:
+
+    def __init__(self, pattern: str, base: str = "") -> None:
+        """
+        Parses one gitignore style pattern.
+
+        Args:
+            pattern (str): The pattern line, without comments or surrounding blanks.
+            base (str, optional): Directory the pattern is relative to, as a posix
+                path relative to the walk root. Defaults to the root.
+        """
+        self.pattern = pattern
+        self.base = base
+        self.negate = pattern.startswith("!")
+
+        if self.negate:
+            pattern = pattern[1:]
+
+        self.dir_only = pattern.endswith("/")
+        pattern = pattern.rstrip("/")
+
+        # patterns without an inner slash match a name at any level
+        self.anchored = "/" in pattern
+        pattern = pattern.lstrip("/")
+
+        self.regex = re.compile(f"^{translate_pattern(pattern)}$")
+
+    def __repr__(self):
+        return f"{self.__class__.__name__}(pattern={self.pattern}, base={self.base})"
+
+    def matches(self, relative_path: str, is_dir: bool) -> bool:
+        if self.dir_only and not is_dir:
+            return False
+
+        if self.base:
+            if not relative_path.startswith(self.base + "/"):
+                return False
+            relative_path = relative_path[len(self.base) + 1 :]
+
+        if self.anchored:
+            return self.regex.match(relative_path) is not None
+
+        return self.regex.match(relative_path.rsplit("/", 1)[-1]) is not None
+
+
+class IgnoreRules:
+    """
+    Ordered set of gitignore style rules, the last matching rule decides.
+
+    The walker prunes ignored directories, so only the path itself has to be
+    checked and never its parents.
+    """
+
+    def __init__(self, rules: tuple[IgnoreRule, ...] = ()) -> None:
+        self.rules = rules
+
+    @classmethod
+    def from_patterns(cls, patterns: Iterable[str], base: str = "") -> IgnoreRules:
+        rules = []
+
+        for line in patterns:
+            line = line.rstrip("\n\r")
+            if line.endswith(" ") and not line.endswith("\\ "):
+                line = line.rstrip(" ")
+
+            if not line or line.startswith("#"):
+                continue
+
+            rules.append(IgnoreRule(line, base=base))
+
+        return cls(tuple(rules))
+
+    def extended(self, other: IgnoreRules) -> IgnoreRules:
+        if not other.rules:
+            return self
+
+        return IgnoreRules(self.rules + other.rules)
+
+    def extended_with_gitignore(
+        self, gitignore_path: Path, base: str
+    ) -> IgnoreRules:
+        """
+        Returns these rules followed by the rules of a .gitignore file.
+
+        Args:
+            gitignore_path (Path): The .gitignore file.
+            base (str): Directory of the .gitignore relative to the walk root.
+
+        Returns:
+            IgnoreRules: The combined rules, or these rules if the file is unreadable.
+        """
+        try:
+            with open(gitignore_path, encoding="utf-8", errors="replace") as f:
+                return self.extended(IgnoreRules.from_patterns(f, base=base))
+        except OSError as e:
+            logger.warning(f"Could not read {gitignore_path}: {e}")
+            return self
+
+    def is_ignored(self, relative_path: str, is_dir: bool) -> bool:
+        ignored = False
+
+        for rule in self.rules:
+            if rule.matches(relative_path, is_dir):
+                ignored = not rule.negate
+
+        return ignored
@@ -0,0 +1,185 @@
+"""
+Timers and counters of a build.
+
+The stages of a build record into the process wide build_metrics registry. Work
+done in worker processes is measured there and returned with the result of the
+file, see read_and_split_code_file, and recorded by the main process, so timers
+of per-file work sum up the time of all workers.
+"""
+
+from __future__ import annotations
+
+import json
+import sys
+import threading
+import time
+
+from contextlib import contextmanager
+from pathlib import Path
+
+
+METRICS_FORMAT_JSON = "json"
+METRICS_FORMAT_PROMETHEUS = "prometheus"
+METRICS_FORMATS = (METRICS_FORMAT_JSON, METRICS_FORMAT_PROMETHEUS)
+
+PROMETHEUS_PREFIX = "lilith_build"
+
+
+def get_peak_rss() -> int | None:
+    """
+    Returns the peak resident set size of this process and its children in
+    bytes, or None where it is not available.
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+
+    return scale * max(
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss,
+    )
+
+
+class BuildMetrics:
+    """
+    Thread safe registry of named timers, in seconds, and counters.
+
+    Timers of stages that run once are wall-clock times, timers of per-file work
+    are summed over the files and can exceed the wall-clock time of the build
+    with more than one job.
+    """
+
+    def __init__(self) -> None:
+        self.__lock = threading.Lock()
+        self.__timers = {}
+        self.__counters = {}
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__timers = {}
+            self.__counters = {}
+
+    def add_time(self, name: str, seconds: float) -> None:
+        with self.__lock:
+            self.__timers[name] = self.__timers.get(name, 0.0) + seconds
+
+    def add(self, name: str, value: int | float = 1) -> None:
+        with self.__lock:
+            self.__counters[name] = self.__counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start)
+
+    def get_time(self, name: str) -> float:
+        with self.__lock:
+            return self.__timers.get(name, 0.0)
+
+    def get_count(self, name: str) -> int | float:
+        with self.__lock:
+            return self.__counters.get(name, 0)
+
+    def snapshot(self) -> dict:
+        """
+        Returns the recorded metrics, the write rate and the peak RSS.
+
+        Returns:
+            dict: 'timers' in seconds, 'counters', 'rates' per second and
+                'peak_rss_bytes'.
+        """
+        with self.__lock:
+            timers = dict(self.__timers)
+            counters = dict(self.__counters)
+
+        rates = {}
+        if timers.get("db_write"):
+            rates["db_rows_per_second"] = (
+                counters.get("db_rows", 0) / timers["db_write"]
+            )
+        if timers.get("total"):
+            rates["files_per_second"] = (
+                counters.get("files_processed", 0) / timers["total"]
+            )
+
+        return {
+            "timers": timers,
+            "counters": counters,
+            "rates": rates,
+            "peak_rss_bytes": get_peak_rss(),
+        }
+
+    def write(
+        self,
+        path: Path,
+        metrics_format: str = METRICS_FORMAT_JSON,
+        labels: dict[str, str] | None = None,
+    ) -> None:
+        """
+        Writes a summary of the metrics.
+
+        Args:
+            path (Path): The metrics file.
+            metrics_format (str, optional): 'json', or 'prometheus' for the text
+                exposition format read by the node exporter's textfile collector.
+                Defaults to 'json'.
+            labels (dict[str, str], optional): Labels of every metric, e.g. the
+                repository. Defaults to None.
+        """
+        snapshot = self.snapshot()
+        labels = labels or {}
+
+        if metrics_format == METRICS_FORMAT_PROMETHEUS:
+            content = format_prometheus(snapshot, labels)
+        else:
+            content = json.dumps({"labels": labels, **snapshot}, indent=2) + "\n"
+
+        Path(path).write_text(content, encoding="utf-8")
+
+
+def format_prometheus(snapshot: dict, labels: dict[str, str]) -> str:
+    label_text = ",".join(
+        f'{key}="{escape_label_value(value)}"' for key, value in sorted(labels.items())
+    )
+    label_text = f"{{{label_text}}}" if label_text else ""
+
+    samples = [
+        (f"{name}_seconds", "Seconds spent in the build stage.", value)
+        for name, value in snapshot["timers"].items()
+    ]
+    samples.extend(
+        (name, "Counter of the last build.", value)
+        for name, value in snapshot["counters"].items()
+    )
+    samples.extend(
+        (name, "Rate of the last build.", value)
+        for name, value in snapshot["rates"].items()
+    )
+
+    if snapshot["peak_rss_bytes"] is not None:
+        samples.append(
+            ("peak_rss_bytes", "Peak resident set size.", snapshot["peak_rss_bytes"])
+        )
+
+    lines = []
+    for name, help_text, value in sorted(samples):
+        metric = f"{PROMETHEUS_PREFIX}_{name}"
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} gauge")
+        lines.append(f"{metric}{label_text} {value}")
+
+    return "\n".join(lines) + "\n"
+
+
+def escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+build_metrics = BuildMetrics()
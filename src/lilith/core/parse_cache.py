@@ -0,0 +1,264 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import sqlite3
+import time
+import zlib
+
+from pathlib import Path
+
+
+PARSE_CACHE_DIR_NAME = ".lilith"
+PARSE_CACHE_FILE_NAME = "parse_cache.sqlite3"
+
+DEFAULT_PARSE_CACHE_SIZE = 256 * 1024 * 1024
+
+# pending writes are committed in transactions of this many files
+COMMIT_INTERVAL = 500
+
+logger = logging.getLogger(__name__)
+
+# caches opened in this process, worker processes reuse one connection per cache
+# instead of connecting for every file
+__shared_caches = {}
+
+
+def get_shared_parse_cache(cache_path: Path, max_size: int) -> ParseCache:
+    key = (os.fspath(cache_path), max_size)
+
+    if key not in __shared_caches:
+        __shared_caches[key] = ParseCache(cache_path, max_size=max_size)
+
+    return __shared_caches[key]
+
+
+class ParseCache:
+    """
+    Persistent SQLite cache of split files, kept between builds.
+
+    A file is looked up by path, size and modification time, which yields the
+    content hash it had when it was split, and the result is looked up by that
+    content hash and the chunking key, see get_chunking_key. A warm build only
+    stats unchanged files, a file that was touched but not changed is read and
+    hashed but not parsed again.
+
+    Results are evicted least recently used first once the cache grows beyond
+    max_size bytes. Worker processes only read, a pickled cache is restored as
+    the cache shared by the process, see get_shared_parse_cache.
+    """
+
+    def __init__(
+        self, cache_path: Path, max_size: int = DEFAULT_PARSE_CACHE_SIZE
+    ) -> None:
+        self.cache_path = Path(cache_path)
+        self.max_size = max_size
+        self.hit_count = 0
+        self.read_count = 0
+
+        self.__connection = None
+        self.__pending_writes = 0
+        self.__used_keys = set()
+
+    def __reduce__(self):
+        return get_shared_parse_cache, (self.cache_path, self.max_size)
+
+    def __get_connection(self) -> sqlite3.Connection:
+        if self.__connection is None:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+
+            self.__connection = sqlite3.connect(self.cache_path, timeout=30)
+            # readers in worker processes are not blocked by the writer
+            self.__connection.execute("PRAGMA journal_mode=WAL")
+            self.__connection.execute("PRAGMA synchronous=NORMAL")
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS files ("
+                "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, "
+                "content_hash TEXT)"
+            )
+            self.__connection.execute(
+                "CREATE TABLE IF NOT EXISTS results ("
+                "content_hash TEXT, chunking_key TEXT, data BLOB, size INTEGER, "
+                "last_used REAL, PRIMARY KEY (content_hash, chunking_key))"
+            )
+            self.__connection.commit()
+
+        return self.__connection
+
+    def get_file_result(
+        self, file_path: Path, chunking_key: str
+    ) -> tuple[os.stat_result | None, dict | None]:
+        """
+        Returns the cached result of a file whose size and mtime did not change.
+
+        Args:
+            file_path (Path): The Python file.
+            chunking_key (str): Identity of the chunking settings.
+
+        Returns:
+            tuple[os.stat_result | None, dict | None]: The current stat of the file,
+                None if it cannot be stat'ed, and the cached result, None on a miss.
+        """
+        try:
+            file_stat = os.stat(file_path)
+        except OSError:
+            return None, None
+
+        row = (
+            self.__get_connection()
+            .execute(
+                "SELECT content_hash FROM files "
+                "WHERE path = ? AND size = ? AND mtime_ns = ?",
+                (os.fspath(file_path), file_stat.st_size, file_stat.st_mtime_ns),
+            )
+            .fetchone()
+        )
+
+        if row is None:
+            return file_stat, None
+
+        return file_stat, self.get_result(row[0], chunking_key)
+
+    def get_result(self, content_hash: str, chunking_key: str) -> dict | None:
+        """
+        Returns the cached result of a file content, or None on a cache miss.
+
+        Args:
+            content_hash (str): Content hash of the file.
+            chunking_key (str): Identity of the chunking settings.
+
+        Returns:
+            dict | None: 'content_hash', 'chunks' and 'error' as returned by
+                read_and_split_code_file, with 'cached' set.
+        """
+        row = (
+            self.__get_connection()
+            .execute(
+                "SELECT data FROM results WHERE content_hash = ? AND chunking_key = ?",
+                (content_hash, chunking_key),
+            )
+            .fetchone()
+        )
+
+        if row is None:
+            return None
+
+        cached = json.loads(zlib.decompress(row[0]))
+        return {
+            "content_hash": content_hash,
+            "chunks": cached["chunks"],
+            "error": cached["error"],
+            "cached": True,
+        }
+
+    def put(
+        self,
+        file_path: Path,
+        file_stat: os.stat_result | None,
+        chunking_key: str,
+        result: dict,
+    ) -> None:
+        """
+        Records the result of a processed file.
+
+        Args:
+            file_path (Path): The Python file.
+            file_stat (os.stat_result, optional): Stat of the file taken before it
+                was read, a file changed in between is not found by it again.
+            chunking_key (str): Identity of the chunking settings.
+            result (dict): The result of read_and_split_code_file.
+        """
+        content_hash = result["content_hash"]
+        if content_hash is None or file_stat is None:
+            return
+
+        connection = self.__get_connection()
+        connection.execute(
+            "INSERT OR REPLACE INTO files (path, size, mtime_ns, content_hash) "
+            "VALUES (?, ?, ?, ?)",
+            (
+                os.fspath(file_path),
+                file_stat.st_size,
+                file_stat.st_mtime_ns,
+                content_hash,
+            ),
+        )
+
+        if result.get("cached"):
+            self.hit_count += 1
+        else:
+            self.read_count += 1
+
+        # unchanged files of incremental builds are hashed but not split
+        if result.get("cached") or (
+            result["chunks"] is None and result["error"] is None
+        ):
+            self.__used_keys.add((content_hash, chunking_key))
+        else:
+            data = zlib.compress(
+                json.dumps(
+                    {"chunks": result["chunks"], "error": result["error"]}
+                ).encode("utf-8")
+            )
+            connection.execute(
+                "INSERT OR REPLACE INTO results "
+                "(content_hash, chunking_key, data, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (content_hash, chunking_key, data, len(data), time.time()),
+            )
+
+        self.__pending_writes += 1
+        if self.__pending_writes >= COMMIT_INTERVAL:
+            connection.commit()
+            self.__pending_writes = 0
+
+    def evict(self) -> None:
+        """
+        Deletes the least recently used results beyond max_size bytes, and the
+        files pointing to them.
+        """
+        connection = self.__get_connection()
+        deleted = connection.execute(
+            "DELETE FROM results WHERE rowid IN ("
+            "SELECT rowid FROM ("
+            "SELECT rowid, SUM(size) OVER (ORDER BY last_used DESC) AS total "
+            "FROM results) WHERE total > ?)",
+            (self.max_size,),
+        ).rowcount
+
+        if deleted:
+            connection.execute(
+                "DELETE FROM files WHERE content_hash NOT IN "
+                "(SELECT content_hash FROM results)"
+            )
+            logger.debug(f"Evicted {deleted} entries from the parse cache.")
+
+        connection.commit()
+
+    def close(self) -> None:
+        if self.__connection is None:
+            return
+
+        if self.__used_keys:
+            now = time.time()
+            self.__connection.executemany(
+                "UPDATE results SET last_used = ? "
+                "WHERE content_hash = ? AND chunking_key = ?",
+                [(now, *key) for key in self.__used_keys],
+            )
+            self.__used_keys = set()
+
+        self.evict()
+        self.__connection.close()
+        self.__connection = None
+
+        logger.info(
+            f"Parse cache: {self.hit_count} files taken from cache, {self.read_count} files read."
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
@@ -1,57 +1,90 @@
 from __future__ import annotations
 
-import re
+import hashlib
+import os
+import tempfile
 
+from pathlib import Path
 
-class CoreError(Exception):
-    pass
-
-
-def get_function_definition(func_str: str):
-
-    func_str = func_str.strip()
-
-    # remove def
-    func_str = func_str[4:]
-
-    first_parentheses = func_str.find("(")
-    number_of_parentheses = 1
-
-    result = None
-
-    for i, char in enumerate(
-        func_str[(first_parentheses + 1) :], start=first_parentheses + 1
-    ):
 
-        if char == "(":
-            number_of_parentheses += 1
+LILITH_CACHE_DIR_VAR = "LILITH_CACHE_DIR"
 
-        if char == ")":
-            number_of_parentheses -= 1
 
-        if number_of_parentheses == 0:
-            result = i
-            break
-
-    pattern = re.compile(r"\s+")
-    return re.sub(pattern, "", func_str[: result + 1])
-
-
-def get_class_definition(class_str: str):
-
-    class_str = class_str.strip()[6:]
-
-    first_par = class_str.find("(")
-    first_dots = class_str.find(":")
-
-    if first_par == -1:
-        return class_str[:first_dots]
-
-    if first_dots == -1:
-        return class_str[:first_par]
+class CoreError(Exception):
+    pass
 
-    if first_par < first_dots:
-        closing_par = class_str.find(")")
-        return class_str[:closing_par + 1]
 
-    return class_str[:first_dots]
+def get_cache_dir() -> Path:
+    """
+    Returns the user level cache directory of lilith.
+
+    Uses $LILITH_CACHE_DIR if set, otherwise $XDG_CACHE_HOME/lilith or ~/.cache/lilith.
+
+    Returns:
+        Path: The cache directory, it is not created by this function.
+    """
+    cache_dir = os.environ.get(LILITH_CACHE_DIR_VAR, None)
+    if cache_dir:
+        return Path(cache_dir)
+
+    cache_home = os.environ.get("XDG_CACHE_HOME", None) or Path.home() / ".cache"
+    return Path(cache_home) / "lilith"
+
+
+class DiskCache:
+    """
+    Content-addressed on-disk cache of byte strings, the storage of the format,
+    embedding and description caches.
+
+    Entries are keyed by the SHA-256 of their key parts and sharded into
+    directories by the first two hex digits. Writes go through a temporary file
+    and an atomic rename, so a cache can be shared between builds, repositories
+    and worker processes.
+    """
+
+    def __init__(self, cache_dir: Path) -> None:
+        self.cache_dir = Path(cache_dir)
+
+    @staticmethod
+    def get_key(*parts: str) -> str:
+        key_source = "\0".join(parts)
+        return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+    def __entry_path(self, key: str) -> Path:
+        return self.cache_dir / key[:2] / key
+
+    def read_entry(self, key: str) -> bytes | None:
+        """
+        Returns the content of an entry, or None on a cache miss.
+
+        Args:
+            key (str): The entry key, see get_key.
+
+        Returns:
+            bytes | None: The content if it is cached.
+        """
+        try:
+            return self.__entry_path(key).read_bytes()
+        except FileNotFoundError:
+            return None
+
+    def write_entry(self, key: str, data: bytes) -> None:
+        """
+        Stores the content of an entry, a failed write leaves the cache as it was.
+
+        Args:
+            key (str): The entry key, see get_key.
+            data (bytes): The content.
+        """
+        entry_path = self.__entry_path(key)
+        entry_path.parent.mkdir(parents=True, exist_ok=True)
+
+        file_descriptor, temp_path = tempfile.mkstemp(
+            dir=entry_path.parent, suffix=".tmp"
+        )
+        try:
+            with os.fdopen(file_descriptor, "wb") as f:
+                f.write(data)
+            os.replace(temp_path, entry_path)
+        except OSError:
+            Path(temp_path).unlink(missing_ok=True)
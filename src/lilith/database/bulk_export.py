@@ -0,0 +1,387 @@
+"""
+Files for the offline bulk importer, `neo4j-admin database import full`.
+
+Nodes and HAS_CHILD relationships are written while the export is streamed, into
+data files of at most rows_per_file rows. CSV exports get a separate header file
+per table, Parquet files carry the header as their column names.
+"""
+
+from __future__ import annotations
+
+import csv
+import logging
+import os
+import re
+
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from lilith.database.utils import Neo4jDatabaseError
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+EXPORT_FORMAT_CSV = "csv"
+EXPORT_FORMAT_PARQUET = "parquet"
+EXPORT_FORMATS = (EXPORT_FORMAT_CSV, EXPORT_FORMAT_PARQUET)
+
+DEFAULT_ROWS_PER_FILE = 1_000_000
+
+# rows buffered before a Parquet row group is written
+PARQUET_ROW_GROUP_SIZE = 10_000
+
+# the unit separator, ast.unparse escapes control characters, so it never occurs
+# in a decorator. neo4j-admin takes it as U+001F.
+ARRAY_DELIMITER = "\x1f"
+ARRAY_DELIMITER_OPTION = "U+001F"
+IMPORT_SCRIPT_NAME = "neo4j-admin-import.sh"
+
+# data files of either format, the import script selects them by a pattern
+DATA_FILE_PATTERN = re.compile(r"(nodes|relationships)-[0-9]+\.(csv|parquet)")
+
+NODE_LABEL = "Node"
+RELATIONSHIP_TYPE = "HAS_CHILD"
+
+# (exported key, header field) of the node table, the key of the label is None
+NODE_FIELDS = (
+    ("id", "id:ID"),
+    (None, ":LABEL"),
+    ("type", "type"),
+    ("repository", "repository"),
+    ("name", "name"),
+    ("path", "path"),
+    ("parent", "parent"),
+    ("code_content", "code_content"),
+    ("embedding", "embedding:float[]"),
+    ("description", "description"),
+    ("content_hash", "content_hash"),
+    ("start_line", "start_line:int"),
+    ("end_line", "end_line:int"),
+    ("qualified_name", "qualified_name"),
+    ("signature", "signature"),
+    ("decorators", "decorators:string[]"),
+    ("docstring", "docstring"),
+    ("part", "part:int"),
+    ("part_count", "part_count:int"),
+    ("overlap_lines", "overlap_lines:int"),
+)
+RELATIONSHIP_FIELDS = (":START_ID", ":END_ID", ":TYPE")
+
+logger = logging.getLogger(__name__)
+
+
+def join_array(values: list) -> str:
+    """
+    Joins the elements of an array field for neo4j-admin.
+
+    Args:
+        values (list): The elements.
+
+    Raises:
+        Neo4jDatabaseError: If an element contains the array delimiter.
+
+    Returns:
+        str: The elements separated by ARRAY_DELIMITER.
+    """
+    elements = [str(value) for value in values]
+
+    for element in elements:
+        if ARRAY_DELIMITER in element:
+            raise Neo4jDatabaseError(
+                f"Array element {element!r} contains the array delimiter."
+            )
+
+    return ARRAY_DELIMITER.join(elements)
+
+
+class CsvTableWriter:
+    """Writes one table as a header file and data files of at most rows_per_file rows."""
+
+    def __init__(
+        self, export_dir: Path, name: str, header: Iterable[str], rows_per_file: int
+    ) -> None:
+        self.export_dir = export_dir
+        self.name = name
+        self.rows_per_file = rows_per_file
+        self.row_count = 0
+
+        with open(
+            export_dir / f"{name}_header.csv", "w", encoding="utf-8", newline=""
+        ) as f:
+            csv.writer(f).writerow(header)
+
+        self.__file = None
+        self.__writer = None
+        self.__file_rows = 0
+        self.__file_index = 0
+
+    @property
+    def file_pattern(self) -> str:
+        return f"{self.name}_header.csv,{self.name}-[0-9]+\\.csv"
+
+    def __open_next_file(self) -> None:
+        self.close()
+
+        self.__file_index += 1
+        # stays open across write_row calls until the next file or close
+        self.__file = open(  # noqa: SIM115
+            self.export_dir / f"{self.name}-{self.__file_index:05}.csv",
+            "w",
+            encoding="utf-8",
+            newline="",
+        )
+        self.__writer = csv.writer(self.__file)
+        self.__file_rows = 0
+
+    def write_row(self, row: list) -> None:
+        if self.__file is None or self.__file_rows >= self.rows_per_file:
+            self.__open_next_file()
+
+        self.__writer.writerow(
+            [join_array(value) if isinstance(value, list) else value for value in row]
+        )
+        self.__file_rows += 1
+        self.row_count += 1
+
+    def close(self) -> None:
+        if self.__file is not None:
+            self.__file.close()
+            self.__file = None
+
+
+class ParquetTableWriter:
+    """Writes one table as Parquet files of at most rows_per_file rows."""
+
+    def __init__(self, export_dir: Path, name: str, schema, rows_per_file: int) -> None:
+        self.export_dir = export_dir
+        self.name = name
+        self.schema = schema
+        self.rows_per_file = rows_per_file
+        self.row_count = 0
+
+        self.__writer = None
+        self.__file_rows = 0
+        self.__file_index = 0
+        self.__rows = []
+
+    @property
+    def file_pattern(self) -> str:
+        return f"{self.name}-[0-9]+\\.parquet"
+
+    def __flush(self) -> None:
+        import pyarrow
+        import pyarrow.parquet
+
+        if not self.__rows:
+            return
+
+        if self.__writer is None:
+            self.__file_index += 1
+            self.__writer = pyarrow.parquet.ParquetWriter(
+                self.export_dir / f"{self.name}-{self.__file_index:05}.parquet",
+                self.schema,
+            )
+
+        columns = list(zip(*self.__rows))
+        self.__writer.write_table(
+            pyarrow.Table.from_arrays(
+                [
+                    pyarrow.array(column, type=field.type)
+                    for column, field in zip(columns, self.schema)
+                ],
+                schema=self.schema,
+            )
+        )
+        self.__file_rows += len(self.__rows)
+        self.__rows = []
+
+        if self.__file_rows >= self.rows_per_file:
+            self.__close_file()
+
+    def write_row(self, row: list) -> None:
+        self.__rows.append(row)
+        self.row_count += 1
+
+        # a row group never crosses the file size limit
+        if (
+            len(self.__rows) >= PARQUET_ROW_GROUP_SIZE
+            or self.__file_rows + len(self.__rows) >= self.rows_per_file
+        ):
+            self.__flush()
+
+    def __close_file(self) -> None:
+        if self.__writer is not None:
+            self.__writer.close()
+            self.__writer = None
+            self.__file_rows = 0
+
+    def close(self) -> None:
+        self.__flush()
+        self.__close_file()
+
+
+def get_parquet_schemas():
+    try:
+        import pyarrow
+    except ImportError:
+        raise Neo4jDatabaseError(
+            "Parquet exports require pyarrow, install lilith with the 'parquet' extra."
+        )
+
+    types = {
+        "embedding:float[]": pyarrow.list_(pyarrow.float32()),
+        "start_line:int": pyarrow.int64(),
+        "end_line:int": pyarrow.int64(),
+        "decorators:string[]": pyarrow.list_(pyarrow.string()),
+        "part:int": pyarrow.int64(),
+        "part_count:int": pyarrow.int64(),
+        "overlap_lines:int": pyarrow.int64(),
+    }
+    node_schema = pyarrow.schema(
+        [(header, types.get(header, pyarrow.string())) for _, header in NODE_FIELDS]
+    )
+    relationship_schema = pyarrow.schema(
+        [(header, pyarrow.string()) for header in RELATIONSHIP_FIELDS]
+    )
+
+    return node_schema, relationship_schema
+
+
+def remove_data_files(export_dir: Path) -> int:
+    """
+    Removes the data files of an earlier export, the import script would pick up
+    the ones beyond the files of the next export.
+
+    Args:
+        export_dir (Path): The export directory.
+
+    Returns:
+        int: The number of removed files.
+    """
+    removed = 0
+
+    for file_path in export_dir.iterdir():
+        if file_path.is_file() and DATA_FILE_PATTERN.fullmatch(file_path.name):
+            file_path.unlink()
+            removed += 1
+
+    return removed
+
+
+def write_import_script(
+    export_dir: Path, export_format: str, node_pattern: str, relationship_pattern: str
+) -> Path:
+    options = [
+        "--overwrite-destination",
+        f"--array-delimiter={ARRAY_DELIMITER_OPTION}",
+        f"--nodes='{node_pattern}'",
+        f"--relationships='{relationship_pattern}'",
+    ]
+
+    if export_format == EXPORT_FORMAT_CSV:
+        # chunks of code span several lines
+        options.insert(1, "--multiline-fields=true")
+    else:
+        options.insert(1, "--input-type=parquet")
+
+    script_path = export_dir / IMPORT_SCRIPT_NAME
+    script_path.write_text(
+        "#!/bin/sh\n"
+        "# Run from this directory with the database stopped, then start it and run\n"
+        "# lilith build --incremental once to create the constraints and indexes.\n"
+        'cd "$(dirname "$0")" || exit 1\n'
+        "exec neo4j-admin database import full "
+        + " ".join(options)
+        + ' "${1:-neo4j}"\n',
+        encoding="utf-8",
+    )
+    script_path.chmod(0o755)
+
+    return script_path
+
+
+def export_bulk_import_files(
+    nodes: Iterable[dict],
+    export_dir: Path,
+    export_format: str = EXPORT_FORMAT_CSV,
+    rows_per_file: int = DEFAULT_ROWS_PER_FILE,
+) -> tuple[int, int]:
+    """
+    Writes exported nodes and their HAS_CHILD relationships as import files.
+
+    nodes can be a lazy iterator, every row is written as soon as it arrives.
+    Next to the data, a neo4j-admin-import.sh script with the matching import
+    command is written.
+
+    Args:
+        nodes (Iterable[dict]): Exported nodes, see dictify_for_neo4j.
+        export_dir (Path): Directory of the files, created if missing. The data
+            files of a previous export are removed first.
+        export_format (str, optional): 'csv' or 'parquet'. Defaults to 'csv'.
+        rows_per_file (int, optional): Rows per data file. Defaults to 1,000,000.
+
+    Raises:
+        Neo4jDatabaseError: On an unknown format, or if pyarrow is missing for
+            Parquet exports.
+
+    Returns:
+        tuple[int, int]: The number of written nodes and relationships.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise Neo4jDatabaseError(f"Unknown export format: {export_format}")
+
+    if rows_per_file < 1:
+        raise Neo4jDatabaseError(
+            f"Rows per file must be positive, got {rows_per_file}."
+        )
+
+    export_dir = Path(export_dir)
+    os.makedirs(export_dir, exist_ok=True)
+
+    removed = remove_data_files(export_dir)
+    if removed:
+        logger.info(f"Removed {removed} data files of a previous export.")
+
+    if export_format == EXPORT_FORMAT_CSV:
+        node_writer = CsvTableWriter(
+            export_dir, "nodes", [header for _, header in NODE_FIELDS], rows_per_file
+        )
+        relationship_writer = CsvTableWriter(
+            export_dir, "relationships", RELATIONSHIP_FIELDS, rows_per_file
+        )
+    else:
+        node_schema, relationship_schema = get_parquet_schemas()
+        node_writer = ParquetTableWriter(
+            export_dir, "nodes", node_schema, rows_per_file
+        )
+        relationship_writer = ParquetTableWriter(
+            export_dir, "relationships", relationship_schema, rows_per_file
+        )
+
+    try:
+        for node in nodes:
+            node_writer.write_row(
+                [NODE_LABEL if key is None else node[key] for key, _ in NODE_FIELDS]
+            )
+
+            if node["parent"]:
+                relationship_writer.write_row(
+                    [node["parent"], node["id"], RELATIONSHIP_TYPE]
+                )
+    finally:
+        node_writer.close()
+        relationship_writer.close()
+
+    script_path = write_import_script(
+        export_dir,
+        export_format,
+        node_writer.file_pattern,
+        relationship_writer.file_pattern,
+    )
+    logger.info(
+        f"Exported {node_writer.row_count} nodes and {relationship_writer.row_count} relationships, import them with {script_path}."
+    )
+
+    return node_writer.row_count, relationship_writer.row_count
@@ -1,26 +1,110 @@
 import logging
 import os
+import time
+
+from collections.abc import Iterable
+from collections.abc import Iterator
+from collections.abc import Sized
 
 from neo4j import GraphDatabase
 from tqdm import tqdm
 
+from lilith.core.metrics import build_metrics
+from lilith.database.pipelined_writer import DEFAULT_QUEUE_SIZE
+from lilith.database.pipelined_writer import PipelinedWriter
+from lilith.database.utils import RETRYABLE_ERRORS
 from lilith.database.utils import Neo4jDatabaseError
+from lilith.database.utils import get_path_prefix
+from lilith.database.utils import get_retry_backoff
+from lilith.database.utils import iterate_in_batches
+from lilith.database.vector_search import VECTOR_SIMILARITY_COSINE
+from lilith.database.vector_search import BruteForceVectorIndex
+from lilith.database.vector_search import get_type_filter
+from lilith.database.vector_search import validate_similarity
 
 
 NEO4J_URI_VAR = "NEO4J_URI"
 NEO4J_NAME_VAR = "NEO4J_NAME"
 NEO4J_PASSWORD_VAR = "NEO4J_PASSWORD"
 
+DEFAULT_BATCH_SIZE = 5000
+DEFAULT_MAX_RETRIES = 3
+
+VECTOR_INDEX_NAME = "node_embedding"
+VECTOR_INDEX_TIMEOUT_SECONDS = 600
+
+# the vector index is searched before the type filter is applied, so more
+# candidates than requested are fetched when filtering
+VECTOR_FILTER_OVERSAMPLING = 10
+
+CREATE_NODES_QUERY = (
+    "UNWIND $rows AS row "
+    "CREATE (n:Node { id: row.id, type: row.type, repository: row.repository, name: row.name, path: row.path, parent: row.parent, code_content: row.code_content, embedding: row.embedding, description: row.description, content_hash: row.content_hash, start_line: row.start_line, end_line: row.end_line, qualified_name: row.qualified_name, signature: row.signature, decorators: row.decorators, docstring: row.docstring, part: row.part, part_count: row.part_count, overlap_lines: row.overlap_lines })"
+)
+
+# only nodes that are new or whose content, location or part count changed
+# are written
+MERGE_NODES_QUERY = (
+    "UNWIND $rows AS row "
+    "MERGE (n:Node {id: row.id}) "
+    "WITH n, row "
+    "WHERE n.type IS NULL "
+    "OR coalesce(n.content_hash, '') <> coalesce(row.content_hash, '') "
+    "OR coalesce(n.start_line, -1) <> coalesce(row.start_line, -1) "
+    "OR coalesce(n.end_line, -1) <> coalesce(row.end_line, -1) "
+    "OR coalesce(n.parent, '') <> coalesce(row.parent, '') "
+    # parts of a chunk that gained or lost a part keep their code
+    "OR coalesce(n.part_count, -1) <> coalesce(row.part_count, -1) "
+    "OR coalesce(n.overlap_lines, -1) <> coalesce(row.overlap_lines, -1) "
+    "OR (n.embedding IS NULL AND row.embedding IS NOT NULL) "
+    "WITH n, row, n.content_hash = row.content_hash AS unchanged, "
+    "n.description AS description, n.embedding AS embedding "
+    "SET n += row "
+    # descriptions are generated later and embeddings only with --embed, keep
+    # them while the code is the same
+    "SET n.description = CASE WHEN unchanged AND row.description IS NULL "
+    "THEN description ELSE row.description END "
+    "SET n.embedding = coalesce(row.embedding, CASE WHEN unchanged THEN embedding END)"
+)
+
+CREATE_EDGES_QUERY = (
+    "UNWIND $rows AS row "
+    "MATCH (child:Node {id: row.id}) "
+    "MATCH (parent:Node {id: row.parent}) "
+    "CREATE (parent)-[:HAS_CHILD]->(child)"
+)
+
+MERGE_EDGES_QUERY = (
+    "UNWIND $rows AS row "
+    "MATCH (child:Node {id: row.id}) "
+    "MATCH (parent:Node {id: row.parent}) "
+    "MERGE (parent)-[:HAS_CHILD]->(child)"
+)
+
+logger = logging.getLogger(__name__)
+
 
 class Neo4jGraphDatabase:
 
-    def __init__(self):
+    def __init__(
+        self,
+        batch_size: int = DEFAULT_BATCH_SIZE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+    ):
         """_summary_
 
+        Args:
+            batch_size (int): Number of rows written per write transaction.
+            max_retries (int): How many times a failed batch is retried on
+                transient errors before giving up.
+
         Raises:
             Neo4jDatabaseError: _description_
         """
         self.__driver = None
+        self.__batch_size = batch_size
+        self.__max_retries = max_retries
+        self.__fallback_index = None
 
         self.__uri = os.environ.get(NEO4J_URI_VAR, None)
         self.__name = os.environ.get(NEO4J_NAME_VAR, None)
@@ -49,18 +133,109 @@ class Neo4jGraphDatabase:
         except Exception as e:
             raise Neo4jDatabaseError(f"Could not setup database connection: {e}")
 
-    def reset_database(self) -> None:
-        def delete_all_nodes(tx):
-            tx.run("MATCH (n) DETACH DELETE n")
+    def reset_database(
+        self, root_path: str | None = None, repository: str | None = None
+    ) -> int:
+        """Deletes every node, or only the nodes of one repository or root folder.
+
+        Nodes are deleted in bounded write transactions of batch_size nodes, so
+        large graphs neither exhaust the transaction memory nor block the server
+        with one long transaction.
+
+        Args:
+            root_path (str, optional): Path of a built root folder, only the nodes
+                at and below it are deleted. Defaults to None.
+            repository (str, optional): Only the nodes of this repository are
+                deleted. Defaults to None, without root_path deleting everything.
+
+        Raises:
+            Neo4jDatabaseError: If no root folder with root_path exists, or both
+                root_path and repository are given.
+
+        Returns:
+            int: The number of deleted nodes.
+        """
+        if repository is not None and root_path is not None:
+            raise Neo4jDatabaseError(
+                "Nodes are deleted either by repository or by root folder, not both."
+            )
+
+        if repository is not None:
+            self.ensure_constraints()
+            match = "MATCH (n:Node {repository: $repository}) "
+            parameters = {"repository": repository}
+        elif root_path is None:
+            match = "MATCH (n) "
+            parameters = {}
+        else:
+            self.ensure_constraints()
+            root_path = self.__get_root_path(root_path)
+            match = "MATCH (n:Node) WHERE n.path = $root OR n.path STARTS WITH $prefix "
+            parameters = {"root": root_path, "prefix": get_path_prefix(root_path)}
+
+        def count_nodes(tx):
+            return tx.run(
+                match + "RETURN count(n) AS node_count", **parameters
+            ).single()["node_count"]
+
+        def delete_batch(tx):
+            return tx.run(
+                match + "WITH n LIMIT $limit DETACH DELETE n RETURN count(*) AS deleted",
+                limit=self.__batch_size,
+                **parameters,
+            ).single()["deleted"]
+
+        self.__fallback_index = None
+        deleted = 0
 
         with self.__driver.session() as session:
-            session.execute_write(delete_all_nodes)
+            total = session.execute_read(count_nodes)
 
-    def get_node_count(self) -> int:
-        """_summary_"""
+            with tqdm(
+                total=total,
+                desc="Deleting nodes...",
+                unit="node",
+                bar_format="Lilith - INFO - {l_bar}{bar}{r_bar}",
+            ) as pbar:
+                while batch_deleted := self.__write_batch(session, delete_batch):
+                    deleted += batch_deleted
+                    pbar.update(batch_deleted)
+
+        return deleted
+
+    def __get_root_path(self, root_path: str) -> str:
+        def get_root(tx):
+            return tx.run(
+                "MATCH (n:Node {type: 'folder', path: $path}) WHERE n.parent IS NULL "
+                "RETURN n.path AS path",
+                path=root_path,
+            ).single()
+
+        with self.__driver.session() as session:
+            root = session.execute_read(get_root)
+
+        if root is None:
+            raise Neo4jDatabaseError(f"No repository root was built from {root_path}.")
+
+        return root["path"]
+
+    def get_node_count(self, repository: str | None = None) -> int:
+        """Returns the number of nodes in the database or in one repository.
+
+        Args:
+            repository (str, optional): Only count the nodes of this repository.
+                Defaults to None.
+        """
 
         def get_database_size(tx):
-            result = tx.run("MATCH (n) RETURN count(n) AS node_count")
+            if repository is None:
+                result = tx.run("MATCH (n) RETURN count(n) AS node_count")
+            else:
+                result = tx.run(
+                    "MATCH (n:Node {repository: $repository}) "
+                    "RETURN count(n) AS node_count",
+                    repository=repository,
+                )
             node_count = result.single()["node_count"]
 
             return node_count
@@ -70,66 +245,545 @@ class Neo4jGraphDatabase:
 
         return node_count
 
-    def __insert_nodes(self, node_list: list[dict]):
-        def create_node(tx, node):
+    def prune_subtrees(self, kept_descendants: dict[str, list[str]]) -> None:
+        """Deletes the descendants of the given nodes that are not kept.
+
+        Args:
+            kept_descendants (dict[str, list[str]]): Ids of the descendants to keep,
+                keyed by the id of the node whose subtree is pruned.
+        """
+
+        def prune_batch(tx, batch):
             query = (
-                "CREATE (n:Node { id: $id, type: $type, name: $name, path: $path, parent: $parent, code_content: $code_content, embedding: $embedding, description: $description })"
-                "RETURN n.id AS node_id"
+                "UNWIND $rows AS row "
+                "MATCH (:Node {id: row.id})-[:HAS_CHILD*1..]->(n:Node) "
+                "WHERE NOT n.id IN row.keep "
+                "DETACH DELETE n"
             )
+            tx.run(query, rows=batch).consume()
+
+        rows = [
+            {"id": node_id, "keep": keep} for node_id, keep in kept_descendants.items()
+        ]
+
+        self.__fallback_index = None
 
+        with self.__driver.session() as session:
+            for batch in iterate_in_batches(rows, self.__batch_size):
+                self.__write_batch(session, prune_batch, batch)
+
+    def __write_batch(self, session, work, *args):
+        """Runs a transaction function in a write transaction, retrying on transient
+        errors.
+
+        Args:
+            session: Open neo4j session.
+            work: Transaction function taking (tx, *args), usually one batch.
+
+        Raises:
+            Neo4jDatabaseError: If the transaction still fails after all retries.
+
+        Returns:
+            The return value of work.
+        """
+        for attempt in range(1, self.__max_retries + 2):
+            try:
+                build_metrics.add("db_transactions")
+                with build_metrics.timer("db_transaction"):
+                    return session.execute_write(work, *args)
+            except RETRYABLE_ERRORS as e:
+                time.sleep(get_retry_backoff(e, attempt, self.__max_retries))
+
+    def get_indexed_files(self, repository: str | None = None) -> list[dict]:
+        """Returns every stored folder and file node for incremental builds.
+
+        Args:
+            repository (str, optional): Only the nodes of this repository.
+                Defaults to None.
+
+        Returns:
+            list[dict]: Rows with 'id', 'type', 'path', 'parent' and
+                'content_hash' keys.
+        """
+
+        def get_folders_and_files(tx):
+            repository_filter = (
+                "" if repository is None else "AND n.repository = $repository "
+            )
             result = tx.run(
-                query,
-                id=node["id"],
-                type=node["type"],
-                name=node["name"],
-                path=node["path"],
-                parent=node["parent"],
-                code_content=node["code_content"],
-                embedding=node["embedding"],
-                description=node["description"],
+                "MATCH (n:Node) WHERE n.type IN ['folder', 'file'] "
+                + repository_filter
+                + "RETURN n.id AS id, n.type AS type, n.path AS path, n.parent AS parent, "
+                "n.content_hash AS content_hash",
+                repository=repository,
+            )
+            return [record.data() for record in result]
+
+        with self.__driver.session() as session:
+            return session.execute_read(get_folders_and_files)
+
+    def delete_subtrees(self, root_ids: list[str]) -> None:
+        """Deletes the given nodes together with all of their descendants.
+
+        Args:
+            root_ids (list[str]): Ids of the subtree roots to delete.
+        """
+
+        def delete_batch(tx, batch):
+            query = (
+                "UNWIND $ids AS root_id "
+                "MATCH (:Node {id: root_id})-[:HAS_CHILD*0..]->(n:Node) "
+                "DETACH DELETE n"
             )
+            tx.run(query, ids=batch).consume()
 
-            record = result.single()
-            return record["node_id"]
+        self.__fallback_index = None
 
         with self.__driver.session() as session:
-            for node in tqdm(
-                node_list,
-                desc="Writing nodes to database...",
-                bar_format="Lilith - INFO - {l_bar}{bar}{r_bar}",
-            ):
-                session.execute_write(create_node, node)
-
-    def __create_relationships(self, node_list: list[dict]):
-        def create_parent_child_relationship(tx, child_id, parent_id):
-            if parent_id:
-                query = (
-                    "MATCH (child:Node {id: $child_id}) "
-                    "WITH child "
-                    "MATCH (parent:Node {id: $parent_id}) "
-                    "CREATE (parent)-[:HAS_CHILD]->(child)"
-                )
-                tx.run(query, child_id=child_id, parent_id=parent_id)
+            for batch in iterate_in_batches(root_ids, self.__batch_size):
+                self.__write_batch(session, delete_batch, batch)
+
+    def ensure_constraints(self) -> None:
+        """Creates the uniqueness constraint on :Node(id) if it does not exist yet.
+
+        The constraint is backed by an index, so every MATCH on Node.id during
+        relationship creation is an index seek instead of a label scan. Node.type
+        and Node.name are indexed for lookups by the query server, Node.path for
+        deleting a root folder by path prefix, Node.repository for the operations
+        scoped to one repository.
+        """
+
+        def create_constraints(tx):
+            tx.run(
+                "CREATE CONSTRAINT node_id_unique IF NOT EXISTS "
+                "FOR (n:Node) REQUIRE n.id IS UNIQUE"
+            ).consume()
+            tx.run(
+                "CREATE INDEX node_type IF NOT EXISTS FOR (n:Node) ON (n.type)"
+            ).consume()
+            tx.run(
+                "CREATE INDEX node_name IF NOT EXISTS FOR (n:Node) ON (n.name)"
+            ).consume()
+            tx.run(
+                "CREATE INDEX node_path IF NOT EXISTS FOR (n:Node) ON (n.path)"
+            ).consume()
+            tx.run(
+                "CREATE INDEX node_repository IF NOT EXISTS "
+                "FOR (n:Node) ON (n.repository)"
+            ).consume()
+            tx.run(
+                "CREATE INDEX node_repository_type IF NOT EXISTS "
+                "FOR (n:Node) ON (n.repository, n.type)"
+            ).consume()
 
         with self.__driver.session() as session:
-            for node in tqdm(
-                node_list,
-                desc="Creating parent-child relationships...",
-                bar_format="Lilith - INFO - {l_bar}{bar}{r_bar}",
+            session.execute_write(create_constraints)
+
+    def iterate_undescribed_chunks(
+        self,
+        types: Iterable[str] = ("function", "class"),
+        repository: str | None = None,
+    ) -> Iterator[dict]:
+        """Yields the chunks without a description of their current code.
+
+        A description belongs to the content hash stored in 'description_hash', so
+        chunks whose code changed since they were described are yielded again.
+        Chunks are paged by id, descriptions written in between do not shift pages.
+
+        Args:
+            types (Iterable[str], optional): Chunk types to describe.
+            repository (str, optional): Only the chunks of this repository.
+                Defaults to None.
+
+        Returns:
+            Iterator[dict]: Rows with 'id', 'type', 'name', 'path', 'code_content'
+                and 'content_hash' keys, ordered by id.
+        """
+        repository_filter = (
+            "" if repository is None else "AND n.repository = $repository "
+        )
+
+        def get_page(tx, after):
+            result = tx.run(
+                "MATCH (n:Node) WHERE n.type IN $types AND n.id > $after "
+                + repository_filter
+                + "AND n.code_content IS NOT NULL "
+                "AND coalesce(n.description_hash, '') <> coalesce(n.content_hash, '') "
+                "RETURN n.id AS id, n.type AS type, n.name AS name, n.path AS path, "
+                "n.code_content AS code_content, n.content_hash AS content_hash "
+                "ORDER BY n.id LIMIT $limit",
+                types=list(types),
+                after=after,
+                limit=self.__batch_size,
+                repository=repository,
+            )
+            return [record.data() for record in result]
+
+        after = ""
+
+        while True:
+            with self.__driver.session() as session:
+                page = session.execute_read(get_page, after)
+
+            yield from page
+
+            if len(page) < self.__batch_size:
+                return
+
+            after = page[-1]["id"]
+
+    def set_descriptions(self, rows: list[dict]) -> None:
+        """Stores generated descriptions.
+
+        A description is only stored if the chunk still has the content it was
+        generated for.
+
+        Args:
+            rows (list[dict]): Rows with 'id', 'description' and 'description_hash'
+                keys.
+        """
+
+        def set_batch(tx, batch):
+            tx.run(
+                "UNWIND $rows AS row "
+                "MATCH (n:Node {id: row.id}) "
+                "WHERE n.content_hash = row.description_hash "
+                "SET n.description = row.description, "
+                "n.description_hash = row.description_hash",
+                rows=batch,
+            ).consume()
+
+        with self.__driver.session() as session:
+            for batch in iterate_in_batches(rows, self.__batch_size):
+                self.__write_batch(session, set_batch, batch)
+
+    def get_vector_index(self) -> dict | None:
+        """Returns the settings of the vector index over Node.embedding.
+
+        Returns:
+            dict | None: 'dimensions', 'similarity' and 'state' of the index, None
+                if there is no vector index.
+        """
+
+        def show_vector_index(tx):
+            record = tx.run(
+                "SHOW INDEXES YIELD name, type, state, options "
+                "WHERE name = $name AND type = 'VECTOR' "
+                "RETURN state, options",
+                name=VECTOR_INDEX_NAME,
+            ).single()
+
+            if record is None:
+                return None
+
+            index_config = record["options"]["indexConfig"]
+            return {
+                "dimensions": index_config["vector.dimensions"],
+                "similarity": index_config["vector.similarity_function"].lower(),
+                "state": record["state"],
+            }
+
+        with self.__driver.session() as session:
+            return session.execute_read(show_vector_index)
+
+    def ensure_vector_index(
+        self,
+        dimensions: int,
+        similarity: str = VECTOR_SIMILARITY_COSINE,
+        timeout: float = VECTOR_INDEX_TIMEOUT_SECONDS,
+    ) -> None:
+        """Creates the vector index over Node.embedding and waits until it is online.
+
+        An existing index with other settings is dropped and recreated, the
+        embeddings of a different model cannot be searched with the old one.
+
+        Args:
+            dimensions (int): Size of the stored embeddings.
+            similarity (str, optional): 'cosine' or 'euclidean'. Defaults to 'cosine'.
+            timeout (float, optional): Seconds to wait for the index population.
+
+        Raises:
+            Neo4jDatabaseError: _description_
+        """
+        validate_similarity(similarity)
+
+        if dimensions < 1:
+            raise Neo4jDatabaseError(
+                f"Vector index dimensions must be positive, got {dimensions}."
+            )
+
+        existing_index = self.get_vector_index()
+
+        if existing_index is not None and (
+            existing_index["dimensions"] != dimensions
+            or existing_index["similarity"] != similarity
+        ):
+            logger.info(
+                f"Recreating vector index {VECTOR_INDEX_NAME} "
+                f"({existing_index['dimensions']} {existing_index['similarity']} -> {dimensions} {similarity})."
+            )
+            self.drop_vector_index()
+            existing_index = None
+
+        # schema commands do not accept parameters in OPTIONS, both values are
+        # validated above
+        with self.__driver.session() as session:
+            if existing_index is None:
+                session.run(
+                    f"CREATE VECTOR INDEX {VECTOR_INDEX_NAME} IF NOT EXISTS "
+                    "FOR (n:Node) ON (n.embedding) "
+                    "OPTIONS {indexConfig: {"
+                    f"`vector.dimensions`: {int(dimensions)}, "
+                    f"`vector.similarity_function`: '{similarity}'"
+                    "}}"
+                ).consume()
+
+            session.run(
+                "CALL db.awaitIndex($name, $timeout)",
+                name=VECTOR_INDEX_NAME,
+                timeout=timeout,
+            ).consume()
+
+    def drop_vector_index(self) -> None:
+        """Drops the vector index over Node.embedding.
+
+        Similarity searches fall back to the brute-force search until the index is
+        created again with ensure_vector_index.
+        """
+        with self.__driver.session() as session:
+            session.run(f"DROP INDEX {VECTOR_INDEX_NAME} IF EXISTS").consume()
+
+    def search_similar(
+        self,
+        vector: list[float],
+        k: int = 10,
+        type_filter: str | Iterable[str] | None = None,
+    ) -> list[dict]:
+        """Returns the k nodes whose embeddings are most similar to the vector.
+
+        The vector index is used when it is online, otherwise the embeddings are
+        loaded once into an in-process BruteForceVectorIndex.
+
+        Args:
+            vector (list[float]): Query embedding.
+            k (int, optional): Number of results. Defaults to 10.
+            type_filter (str | Iterable[str], optional): Only nodes of these types,
+                e.g. 'function' or ['function', 'class']. Defaults to None.
+
+        Raises:
+            Neo4jDatabaseError: _description_
+
+        Returns:
+            list[dict]: Rows with 'id', 'type', 'name', 'path', 'start_line',
+                'end_line' and 'score' keys, best first.
+        """
+        if k < 1:
+            raise Neo4jDatabaseError(f"k must be positive, got {k}.")
+
+        types = get_type_filter(type_filter)
+        vector_index = self.get_vector_index()
+
+        if vector_index is not None and vector_index["state"] == "ONLINE":
+            return self.__search_vector_index(vector, k, types)
+
+        return self.__search_brute_force(
+            vector,
+            k,
+            types,
+            similarity=(
+                vector_index["similarity"]
+                if vector_index is not None
+                else VECTOR_SIMILARITY_COSINE
+            ),
+        )
+
+    def __search_vector_index(
+        self, vector: list[float], k: int, types: list[str] | None
+    ) -> list[dict]:
+        def query_vector_index(tx):
+            result = tx.run(
+                "CALL db.index.vector.queryNodes($name, $candidates, $vector) "
+                "YIELD node, score "
+                "WHERE $types IS NULL OR node.type IN $types "
+                "RETURN node.id AS id, node.type AS type, node.name AS name, "
+                "node.path AS path, node.start_line AS start_line, "
+                "node.end_line AS end_line, score "
+                "ORDER BY score DESC LIMIT $k",
+                name=VECTOR_INDEX_NAME,
+                candidates=k if types is None else k * VECTOR_FILTER_OVERSAMPLING,
+                vector=vector,
+                types=types,
+                k=k,
+            )
+            return [record.data() for record in result]
+
+        with self.__driver.session() as session:
+            return session.execute_read(query_vector_index)
+
+    def __search_brute_force(
+        self, vector: list[float], k: int, types: list[str] | None, similarity: str
+    ) -> list[dict]:
+        def get_embeddings(tx):
+            result = tx.run(
+                "MATCH (n:Node) WHERE n.embedding IS NOT NULL "
+                "RETURN n.id AS id, n.type AS type, n.embedding AS embedding"
+            )
+            ids, node_types, vectors = [], [], []
+            for record in result:
+                ids.append(record["id"])
+                node_types.append(record["type"])
+                vectors.append(record["embedding"])
+            return ids, node_types, vectors
+
+        def get_nodes(tx, ids):
+            result = tx.run(
+                "UNWIND $ids AS node_id "
+                "MATCH (n:Node {id: node_id}) "
+                "RETURN n.id AS id, n.type AS type, n.name AS name, n.path AS path, "
+                "n.start_line AS start_line, n.end_line AS end_line",
+                ids=ids,
+            )
+            return {record["id"]: record.data() for record in result}
+
+        with self.__driver.session() as session:
+            if (
+                self.__fallback_index is None
+                or self.__fallback_index.similarity != similarity
             ):
-                if node["parent"]:
-                    session.execute_write(
-                        create_parent_child_relationship, node["id"], node["parent"]
-                    )
+                ids, node_types, vectors = session.execute_read(get_embeddings)
+                self.__fallback_index = BruteForceVectorIndex(
+                    ids, node_types, vectors, similarity=similarity
+                )
 
-    def insert_data(self, node_list: list[dict]):
-        """_summary_
+            matches = self.__fallback_index.search(vector, k, types)
+            nodes = session.execute_read(get_nodes, [node_id for node_id, _ in matches])
+
+        return [
+            {**nodes[node_id], "score": score}
+            for node_id, score in matches
+            if node_id in nodes
+        ]
+
+    def __insert_batches(
+        self, nodes: Iterable[dict], total: int | None, merge: bool
+    ) -> int:
+        def create_nodes_and_relationships(tx, batch):
+            tx.run(CREATE_NODES_QUERY, rows=batch).consume()
+            tx.run(CREATE_EDGES_QUERY, rows=get_edges(batch)).consume()
+
+        def merge_nodes_and_relationships(tx, batch):
+            tx.run(MERGE_NODES_QUERY, rows=batch).consume()
+            tx.run(MERGE_EDGES_QUERY, rows=get_edges(batch)).consume()
+
+        def get_edges(batch):
+            return [
+                {"id": node["id"], "parent": node["parent"]}
+                for node in batch
+                if node["parent"]
+            ]
+
+        if merge:
+            work = merge_nodes_and_relationships
+        else:
+            work = create_nodes_and_relationships
+        written = 0
+
+        with self.__driver.session() as session, tqdm(
+            total=total,
+            desc="Writing nodes to database...",
+            unit="node",
+            bar_format="Lilith - INFO - {l_bar}{bar}{r_bar}",
+        ) as pbar:
+            for batch in iterate_in_batches(nodes, self.__batch_size):
+                self.__write_batch(session, work, batch)
+                written += len(batch)
+                build_metrics.add("db_rows", len(batch))
+                pbar.update(len(batch))
+
+        return written
+
+    def __insert_pipelined(
+        self,
+        nodes: Iterable[dict],
+        total: int | None,
+        merge: bool,
+        write_concurrency: int,
+        queue_size: int,
+    ) -> int:
+        writer = PipelinedWriter(
+            self.__uri,
+            (self.__name, self.__password),
+            nodes_query=MERGE_NODES_QUERY if merge else CREATE_NODES_QUERY,
+            edges_query=MERGE_EDGES_QUERY if merge else CREATE_EDGES_QUERY,
+            batch_size=self.__batch_size,
+            concurrency=write_concurrency,
+            queue_size=queue_size,
+            max_retries=self.__max_retries,
+        )
+
+        with tqdm(
+            total=total,
+            desc="Writing nodes to database...",
+            unit="node",
+            bar_format="Lilith - INFO - {l_bar}{bar}{r_bar}",
+        ) as pbar:
+            return writer.write(nodes, pbar=pbar)
+
+    def insert_data(
+        self,
+        nodes: Iterable[dict],
+        merge: bool = False,
+        write_concurrency: int | None = None,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+    ) -> int:
+        """Writes nodes and their HAS_CHILD relationships in batches.
+
+        nodes can be a lazy iterator, only one batch is materialized at a time.
+        Every parent has to come before its children, as in a pre-order export,
+        so a node and the relationship to its parent are written in the same
+        transaction.
+
+        With write_concurrency, nodes are consumed in the calling thread while
+        earlier batches are written by that many concurrent transactions, see
+        PipelinedWriter. Producing and writing then overlap, instead of the
+        producer waiting for every batch to be written.
 
         Args:
-            node_list (list[dict]): _description_
+            nodes (Iterable[dict]): Exported nodes in pre-order.
+            merge (bool, optional): Upsert nodes and relationships by id with MERGE
+                instead of creating them, this is idempotent and leaves unchanged
+                nodes untouched. Defaults to False.
+            write_concurrency (int, optional): Concurrent write transactions of
+                the pipelined writer. Defaults to None, writing every batch in
+                the calling thread.
+            queue_size (int, optional): Batches the pipelined writer holds before
+                the producer is blocked. Defaults to 4.
+
+        Returns:
+            int: The number of written nodes.
         """
-        self.__insert_nodes(node_list)
-        self.__create_relationships(node_list)
+        self.ensure_constraints()
+        self.__fallback_index = None
+
+        start = time.perf_counter()
+
+        total = len(nodes) if isinstance(nodes, Sized) else None
+
+        if write_concurrency is None:
+            written = self.__insert_batches(nodes, total, merge)
+        else:
+            written = self.__insert_pipelined(
+                nodes, total, merge, write_concurrency, queue_size
+            )
+
+        elapsed = time.perf_counter() - start
+        build_metrics.add_time("db_write", elapsed)
+        rate = written / elapsed if elapsed > 0 else float("inf")
+        logger.info(
+            f"Inserted {written} nodes in {elapsed:.2f}s ({rate:.0f} rows/s, batch size {self.__batch_size})."
+        )
+
+        return written
 
     def close(self):
         self.__driver.close()
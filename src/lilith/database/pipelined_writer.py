@@ -0,0 +1,290 @@
+"""
+Writes a node stream with an AsyncDriver while the stream is still produced.
+
+The calling thread keeps producing nodes, walking, splitting and embedding, and
+hands them over in batches through a bounded queue to an event loop on a writer
+thread, where several write transactions run concurrently. A full queue blocks
+the producer, so a database that falls behind slows the build down instead of
+letting batches pile up in memory.
+
+Concurrent transactions may commit out of order, while the relationship of a
+node can only be created once its parent is committed. Relationships to a
+parent in a batch that is still in flight are therefore deferred, and written
+once every batch is committed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import contextlib
+import logging
+import threading
+
+from typing import TYPE_CHECKING
+
+from neo4j import AsyncGraphDatabase
+
+from lilith.core.metrics import build_metrics
+from lilith.database.utils import RETRYABLE_ERRORS
+from lilith.database.utils import Neo4jDatabaseError
+from lilith.database.utils import get_retry_backoff
+from lilith.database.utils import iterate_in_batches
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+    from tqdm import tqdm
+
+
+DEFAULT_WRITE_CONCURRENCY = 4
+DEFAULT_QUEUE_SIZE = 4
+
+logger = logging.getLogger(__name__)
+
+
+class PipelinedWriter:
+
+    def __init__(
+        self,
+        uri: str,
+        auth: tuple[str, str],
+        nodes_query: str,
+        edges_query: str,
+        batch_size: int,
+        concurrency: int = DEFAULT_WRITE_CONCURRENCY,
+        queue_size: int = DEFAULT_QUEUE_SIZE,
+        max_retries: int = 3,
+    ) -> None:
+        """
+        Writer of one node stream, see write.
+
+        Args:
+            uri (str): Database uri.
+            auth (tuple[str, str]): User name and password.
+            nodes_query (str): Writes the nodes of the $rows batch.
+            edges_query (str): Writes the HAS_CHILD relationships of the $rows
+                batch of 'id' and 'parent' pairs.
+            batch_size (int): Nodes per write transaction.
+            concurrency (int, optional): Write transactions in flight at the
+                same time. Defaults to 4.
+            queue_size (int, optional): Batches waiting for a transaction before
+                the producer is blocked. Defaults to 4.
+            max_retries (int, optional): Retries of a batch on transient errors.
+        """
+        self.uri = uri
+        self.auth = auth
+        self.nodes_query = nodes_query
+        self.edges_query = edges_query
+        self.batch_size = batch_size
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.max_retries = max_retries
+
+        self.__loop = None
+        self.__queue = None
+        self.__consumer_task = None
+        self.__started = threading.Event()
+        self.__error = None
+
+        # ids of the batches queued or in flight, guarded by the lock as they
+        # are added by the producer and removed by the writer thread
+        self.__lock = threading.Lock()
+        self.__pending_ids = set()
+        self.__deferred_edges = []
+
+        self.__written = 0
+        self.__pbar = None
+
+    def write(self, nodes: Iterable[dict], pbar: tqdm | None = None) -> int:
+        """
+        Writes nodes and their HAS_CHILD relationships, consuming nodes in the
+        calling thread while earlier batches are written.
+
+        Args:
+            nodes (Iterable[dict]): Exported nodes in pre-order.
+            pbar (tqdm, optional): Advanced by every committed batch.
+
+        Raises:
+            Neo4jDatabaseError: If a batch still fails after all retries.
+
+        Returns:
+            int: The number of written nodes.
+        """
+        self.__pbar = pbar
+
+        writer_thread = threading.Thread(
+            target=self.__run_writer, name="lilith-writer", daemon=True
+        )
+        writer_thread.start()
+        self.__started.wait()
+
+        try:
+            for batch in iterate_in_batches(nodes, self.batch_size):
+                ids = {row["id"] for row in batch}
+
+                with self.__lock:
+                    self.__pending_ids.update(ids)
+
+                self.__put((batch, ids))
+
+            # the end of the stream, every writer hands it on to the next one
+            self.__put(None)
+        except BaseException:
+            self.__cancel_writer()
+            writer_thread.join()
+            raise
+
+        writer_thread.join()
+        self.__raise_writer_error()
+
+        return self.__written
+
+    def __run_writer(self) -> None:
+        try:
+            asyncio.run(self.__consume())
+        except BaseException as e:
+            if self.__error is None:
+                self.__error = e
+        finally:
+            # the producer is never left waiting for a writer that did not start
+            self.__started.set()
+
+    def __put(self, item) -> None:
+        if self.__error is not None:
+            self.__raise_writer_error()
+
+        put = self.__queue.put(item)
+
+        try:
+            # time the producer is held back by a full queue
+            with build_metrics.timer("pipeline_backpressure"):
+                asyncio.run_coroutine_threadsafe(put, self.__loop).result()
+        except RuntimeError:
+            # the loop of the writer is already closed
+            put.close()
+            self.__raise_writer_error()
+        except concurrent.futures.CancelledError:
+            # the writer failed while the producer was waiting for room
+            self.__raise_writer_error()
+
+    def __cancel_writer(self) -> None:
+        if self.__loop is None:
+            return
+
+        # the loop of the writer may already be closed
+        with contextlib.suppress(RuntimeError):
+            self.__loop.call_soon_threadsafe(self.__consumer_task.cancel)
+
+    def __raise_writer_error(self) -> None:
+        if self.__error is None:
+            return
+
+        if isinstance(self.__error, Neo4jDatabaseError):
+            raise self.__error
+
+        raise Neo4jDatabaseError(f"Writing nodes failed: {self.__error}")
+
+    async def __consume(self) -> None:
+        self.__loop = asyncio.get_running_loop()
+        self.__queue = asyncio.Queue(maxsize=self.queue_size)
+        self.__consumer_task = asyncio.current_task()
+        self.__started.set()
+
+        async with AsyncGraphDatabase.driver(
+            self.uri, auth=self.auth, max_connection_pool_size=self.concurrency
+        ) as driver:
+            writers = [
+                asyncio.create_task(self.__write_batches(driver))
+                for _ in range(self.concurrency)
+            ]
+
+            try:
+                await asyncio.gather(*writers)
+            except Exception as e:
+                # the error stops the producer at its next batch, until then its
+                # batches are taken off the queue so it never waits for room. The
+                # loop only closes once the producer is done putting, a put is
+                # never scheduled on a closed loop.
+                self.__error = e
+                await self.__cancel(writers)
+
+                while await self.__queue.get() is not None:
+                    pass
+
+                raise
+            finally:
+                await self.__cancel(writers)
+
+            if self.__deferred_edges:
+                logger.debug(
+                    f"Writing {len(self.__deferred_edges)} deferred relationships."
+                )
+
+                async with driver.session() as session:
+                    for edges in iterate_in_batches(
+                        self.__deferred_edges, self.batch_size
+                    ):
+                        await self.__write_batch(session, [], edges)
+
+    @staticmethod
+    async def __cancel(tasks: list[asyncio.Task]) -> None:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def __write_batches(self, driver) -> None:
+        async with driver.session() as session:
+            while (item := await self.__queue.get()) is not None:
+                batch, ids = item
+                edges = self.__get_edges(batch, ids)
+
+                await self.__write_batch(session, batch, edges)
+
+                with self.__lock:
+                    self.__pending_ids.difference_update(ids)
+
+                self.__written += len(batch)
+                build_metrics.add("db_rows", len(batch))
+                if self.__pbar is not None:
+                    self.__pbar.update(len(batch))
+
+            # nothing is queued after the end of the stream, so there is room
+            self.__queue.put_nowait(None)
+
+    def __get_edges(self, batch: list[dict], ids: set[str]) -> list[dict]:
+        """
+        Returns the relationships of a batch that can be written with it, the
+        ones to a parent in another uncommitted batch are deferred.
+        """
+        edges = []
+
+        with self.__lock:
+            for node in batch:
+                if not node["parent"]:
+                    continue
+
+                edge = {"id": node["id"], "parent": node["parent"]}
+
+                if node["parent"] in ids or node["parent"] not in self.__pending_ids:
+                    edges.append(edge)
+                else:
+                    self.__deferred_edges.append(edge)
+
+        return edges
+
+    async def __write_batch(self, session, batch: list[dict], edges: list[dict]):
+        async def write_nodes_and_relationships(tx):
+            if batch:
+                await (await tx.run(self.nodes_query, rows=batch)).consume()
+            if edges:
+                await (await tx.run(self.edges_query, rows=edges)).consume()
+
+        for attempt in range(1, self.max_retries + 2):
+            try:
+                build_metrics.add("db_transactions")
+                with build_metrics.timer("db_transaction"):
+                    return await session.execute_write(write_nodes_and_relationships)
+            except RETRYABLE_ERRORS as e:
+                await asyncio.sleep(get_retry_backoff(e, attempt, self.max_retries))
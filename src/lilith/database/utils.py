@@ -1,5 +1,93 @@
 from __future__ import annotations
 
+import logging
+import os
+
+from itertools import islice
+from typing import TYPE_CHECKING
+
+from neo4j.exceptions import ServiceUnavailable
+from neo4j.exceptions import SessionExpired
+from neo4j.exceptions import TransientError
+
+from lilith.core.metrics import build_metrics
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from collections.abc import Iterator
+
+
+RETRY_BACKOFF_SECONDS = 1.0
+
+# errors after which a write transaction may succeed when it is run again
+RETRYABLE_ERRORS = (TransientError, ServiceUnavailable, SessionExpired)
+
+logger = logging.getLogger(__name__)
+
 
 class Neo4jDatabaseError(Exception):
     pass
+
+
+def get_retry_backoff(error: Exception, attempt: int, max_retries: int) -> float:
+    """
+    Counts a failed write attempt and returns the seconds to wait before the next
+    one, the wait doubles with every attempt.
+
+    Args:
+        error (Exception): The retryable error of the attempt, see RETRYABLE_ERRORS.
+        attempt (int): The failed attempt, starting at 1.
+        max_retries (int): Attempts after the first one before giving up.
+
+    Raises:
+        Neo4jDatabaseError: If the attempt was the last one.
+
+    Returns:
+        float: The backoff in seconds.
+    """
+    build_metrics.add("db_retries")
+
+    if attempt > max_retries:
+        raise Neo4jDatabaseError(
+            f"Write transaction failed after {attempt} attempts: {error}"
+        )
+
+    backoff = RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+    logger.warning(
+        f"Transient error while writing (attempt {attempt}), retrying in {backoff:.1f}s: {error}"
+    )
+    return backoff
+
+
+def iterate_in_batches(items: Iterable, batch_size: int) -> Iterator[list]:
+    """
+    Splits any iterable into consecutive lists of at most batch_size elements.
+
+    Args:
+        items (Iterable): The items to split, can be a lazy generator.
+        batch_size (int): Maximum number of items per batch.
+
+    Returns:
+        Iterator[list]: Batches in the original order of the items.
+    """
+    if batch_size < 1:
+        raise Neo4jDatabaseError(f"Batch size must be positive, got {batch_size}.")
+
+    iterator = iter(items)
+
+    while batch := list(islice(iterator, batch_size)):
+        yield batch
+
+
+def get_path_prefix(root_path: str) -> str:
+    """
+    Returns the prefix shared by the paths of every node below a root folder.
+
+    Args:
+        root_path (str): Path of the root folder.
+
+    Returns:
+        str: The root path ending in a separator, so '/a/b' does not match '/a/bc'.
+    """
+    return root_path if root_path.endswith(os.sep) else root_path + os.sep
@@ -0,0 +1,155 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+from lilith.database.utils import Neo4jDatabaseError
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+
+
+VECTOR_SIMILARITY_COSINE = "cosine"
+VECTOR_SIMILARITY_EUCLIDEAN = "euclidean"
+VECTOR_SIMILARITY_FUNCTIONS = (VECTOR_SIMILARITY_COSINE, VECTOR_SIMILARITY_EUCLIDEAN)
+
+
+def import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        raise Neo4jDatabaseError(
+            "The brute-force similarity search requires numpy, install lilith with the 'vector' extra."
+        )
+
+    return numpy
+
+
+def validate_similarity(similarity: str) -> str:
+    if similarity not in VECTOR_SIMILARITY_FUNCTIONS:
+        raise Neo4jDatabaseError(
+            f"Unknown similarity function '{similarity}', expected one of {', '.join(VECTOR_SIMILARITY_FUNCTIONS)}."
+        )
+
+    return similarity
+
+
+def get_type_filter(type_filter: str | Iterable[str] | None) -> list[str] | None:
+    if type_filter is None:
+        return None
+
+    if isinstance(type_filter, str):
+        return [type_filter]
+
+    return list(type_filter)
+
+
+class BruteForceVectorIndex:
+    """
+    Exact in-process top-k search over a matrix of embeddings.
+
+    Used when the database has no vector index. Scores are scaled the same way as
+    the scores of Neo4j vector indexes, (1 + cos) / 2 for cosine and 1 / (1 + d²)
+    for euclidean similarity, so results of both searches can be compared.
+    """
+
+    def __init__(
+        self,
+        ids: list[str],
+        types: list[str],
+        vectors: list[list[float]],
+        similarity: str = VECTOR_SIMILARITY_COSINE,
+    ) -> None:
+        """
+        Args:
+            ids (list[str]): Node ids, one per vector.
+            types (list[str]): Node types, one per vector.
+            vectors (list[list[float]]): Embeddings, all of the same size.
+            similarity (str, optional): 'cosine' or 'euclidean'. Defaults to 'cosine'.
+
+        Raises:
+            Neo4jDatabaseError: If the vectors differ in size.
+        """
+        numpy = import_numpy()
+
+        self.similarity = validate_similarity(similarity)
+        self.ids = numpy.asarray(ids, dtype=object)
+        self.types = numpy.asarray(types, dtype=object)
+
+        try:
+            self.matrix = numpy.asarray(vectors, dtype=numpy.float32)
+        except ValueError:
+            raise Neo4jDatabaseError(
+                "Embeddings of different sizes cannot be searched."
+            )
+
+        if self.matrix.ndim != 2:
+            # no embeddings at all
+            self.matrix = self.matrix.reshape(0, 0)
+
+        norms = numpy.linalg.norm(self.matrix, axis=1)
+
+        if self.similarity == VECTOR_SIMILARITY_COSINE:
+            # normalized once, every search is a single matrix-vector product
+            self.matrix /= numpy.where(norms > 0, norms, 1.0)[:, None]
+        else:
+            self.squared_norms = norms**2
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def search(
+        self,
+        vector: list[float],
+        k: int,
+        type_filter: str | Iterable[str] | None = None,
+    ) -> list[tuple[str, float]]:
+        """
+        Returns the k most similar vectors.
+
+        Args:
+            vector (list[float]): Query embedding.
+            k (int): Number of results.
+            type_filter (str | Iterable[str], optional): Only nodes of these types.
+
+        Returns:
+            list[tuple[str, float]]: (node id, score) pairs, best first.
+        """
+        numpy = import_numpy()
+
+        if len(self.ids) == 0:
+            return []
+
+        query = numpy.asarray(vector, dtype=numpy.float32)
+
+        if query.shape != (self.matrix.shape[1],):
+            raise Neo4jDatabaseError(
+                f"Query vector has {query.size} dimensions, the index has {self.matrix.shape[1]}."
+            )
+
+        if self.similarity == VECTOR_SIMILARITY_COSINE:
+            query_norm = numpy.linalg.norm(query)
+            cosine = self.matrix @ (query / query_norm if query_norm else query)
+            scores = (1.0 + cosine) / 2.0
+        else:
+            squared_distances = (
+                self.squared_norms - 2.0 * (self.matrix @ query) + query @ query
+            )
+            scores = 1.0 / (1.0 + numpy.maximum(squared_distances, 0.0))
+
+        candidates = numpy.arange(len(self.ids))
+
+        types = get_type_filter(type_filter)
+        if types is not None:
+            candidates = candidates[numpy.isin(self.types, types)]
+            scores = scores[candidates]
+
+        k = min(k, len(candidates))
+        if k <= 0:
+            return []
+
+        # argpartition is linear, only the k best are sorted
+        top = numpy.argpartition(-scores, k - 1)[:k]
+        top = top[numpy.argsort(-scores[top], kind="stable")]
+
+        return [(self.ids[candidates[i]], float(scores[i])) for i in top]
@@ -0,0 +1,363 @@
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+
+from abc import ABC
+from abc import abstractmethod
+from typing import TYPE_CHECKING
+
+from lilith.description.utils import DescriptionError
+from lilith.description.utils import RetryableDescriptionError
+from lilith.description.utils import TokenRateLimiter
+from lilith.embedding.utils import estimate_tokens
+from lilith.embedding.utils import truncate_to_tokens
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from collections.abc import Iterator
+
+    from lilith.description.utils import DescriptionCache
+
+
+OPENAI_DESCRIPTION_MODEL_VAR = "OPENAI_DESCRIPTION_MODEL"
+
+DEFAULT_OPENAI_MODEL = "gpt-4o-mini"
+DEFAULT_MAX_INPUT_TOKENS = 4000
+DEFAULT_MAX_OUTPUT_TOKENS = 200
+DEFAULT_MAX_CONCURRENCY = 4
+DEFAULT_TOKENS_PER_MINUTE = 200_000
+DEFAULT_MAX_RETRIES = 5
+RETRY_BACKOFF_SECONDS = 1.0
+
+# number of chunks described before their descriptions are handed on to be
+# written, a crash loses at most one window of unwritten (but cached) work
+DEFAULT_WINDOW_SIZE = 100
+
+# part of the cache identity, bump it when the prompt changes
+PROMPT_VERSION = 1
+
+SYSTEM_PROMPT = (
+    "You describe Python code for a code search index. Answer with two or three "
+    "plain sentences stating what the code does, its inputs and its result. "
+    "Do not repeat the code."
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_prompt(node: dict, max_input_tokens: int) -> str:
+    code = truncate_to_tokens(node["code_content"], max_input_tokens)
+    return f"{node['type']} {node['name']} in {node['path']}:\n\n{code}"
+
+
+class DescriptionBackend(ABC):
+    """
+    Answers the prompt of one chunk with a short description of its code.
+
+    backend_id is part of the DescriptionCache key, and max_output_tokens is
+    charged to the token rate of the DescriptionPipeline with every request.
+    """
+
+    backend_id = None
+    max_output_tokens = DEFAULT_MAX_OUTPUT_TOKENS
+
+    @abstractmethod
+    async def describe(self, node: dict, prompt: str) -> str:
+        """
+        Describes a chunk.
+
+        Args:
+            node (dict): The chunk, see DescriptionPipeline.describe_nodes.
+            prompt (str): The prompt of the chunk, see get_prompt.
+
+        Raises:
+            RetryableDescriptionError: If the request may succeed when retried.
+            DescriptionError: If the request fails.
+
+        Returns:
+            str: The description.
+        """
+
+    async def close(self) -> None:  # noqa: B027
+        """Called when the pipeline exits, before its event loop is closed."""
+
+
+class OpenAIDescriptionBackend(DescriptionBackend):
+
+    def __init__(
+        self,
+        model: str | None = None,
+        max_output_tokens: int = DEFAULT_MAX_OUTPUT_TOKENS,
+        base_url: str | None = None,
+        api_key: str | None = None,
+    ) -> None:
+        """
+        Backend for the OpenAI chat completions API or any server compatible with it.
+
+        Args:
+            model (str, optional): Chat model, defaults to $OPENAI_DESCRIPTION_MODEL
+                or gpt-4o-mini.
+            max_output_tokens (int, optional): Length limit of one description.
+            base_url (str, optional): API url, defaults to $OPENAI_BASE_URL or OpenAI.
+            api_key (str, optional): API key, defaults to $OPENAI_API_KEY.
+        """
+        from openai import AsyncOpenAI
+
+        self.model = model or os.environ.get(
+            OPENAI_DESCRIPTION_MODEL_VAR, DEFAULT_OPENAI_MODEL
+        )
+        self.max_output_tokens = max_output_tokens
+        self.backend_id = f"openai:{self.model}:{max_output_tokens}"
+
+        # retries are done by the pipeline, with the rate limiter in the loop
+        self.__client = AsyncOpenAI(base_url=base_url, api_key=api_key, max_retries=0)
+
+    async def describe(self, node: dict, prompt: str) -> str:
+        from openai import APIConnectionError
+        from openai import APITimeoutError
+        from openai import InternalServerError
+        from openai import OpenAIError
+        from openai import RateLimitError
+
+        try:
+            response = await self.__client.chat.completions.create(
+                model=self.model,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": prompt},
+                ],
+                max_tokens=self.max_output_tokens,
+                temperature=0,
+            )
+        except (
+            RateLimitError,
+            APITimeoutError,
+            APIConnectionError,
+            InternalServerError,
+        ) as e:
+            raise RetryableDescriptionError(f"Description request failed: {e}")
+        except OpenAIError as e:
+            raise DescriptionError(f"Description request failed: {e}")
+
+        return (response.choices[0].message.content or "").strip()
+
+    async def close(self) -> None:
+        await self.__client.close()
+
+
+class MockDescriptionBackend(DescriptionBackend):
+
+    def __init__(self, latency: float = 0.0) -> None:
+        """
+        Local, deterministic stand-in for a language model, meant for offline runs
+        and testing.
+
+        Args:
+            latency (float, optional): Seconds every request takes. Defaults to 0.
+        """
+        self.latency = latency
+        self.backend_id = "mock"
+
+    async def describe(self, node: dict, prompt: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        line_count = node["code_content"].count("\n") + 1
+        return (
+            f"The {node['type']} {node['name']} defined in {node['path']}, "
+            f"{line_count} lines long."
+        )
+
+
+def get_description_backend(
+    name: str, model: str | None = None, max_output_tokens: int | None = None
+) -> DescriptionBackend:
+    """
+    Creates a description backend by name.
+
+    Args:
+        name (str): 'openai' or 'mock'.
+        model (str, optional): Model of the openai backend.
+        max_output_tokens (int, optional): Length limit of one description.
+
+    Raises:
+        DescriptionError: If the backend name is unknown.
+
+    Returns:
+        DescriptionBackend: The backend.
+    """
+    if name == "openai":
+        return OpenAIDescriptionBackend(
+            model=model, max_output_tokens=max_output_tokens or DEFAULT_MAX_OUTPUT_TOKENS
+        )
+
+    if name == "mock":
+        return MockDescriptionBackend()
+
+    raise DescriptionError(f"Unknown description backend: {name}")
+
+
+class DescriptionPipeline:
+
+    def __init__(
+        self,
+        backend: DescriptionBackend,
+        cache: DescriptionCache | None = None,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        tokens_per_minute: int = DEFAULT_TOKENS_PER_MINUTE,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        max_input_tokens: int = DEFAULT_MAX_INPUT_TOKENS,
+        window_size: int = DEFAULT_WINDOW_SIZE,
+    ) -> None:
+        """
+        Generates descriptions of code chunks.
+
+        Chunks are consumed in windows, the cache misses of a window are requested
+        concurrently, at most max_concurrency at a time and within the token rate,
+        on an event loop owned by the pipeline. Retryable failures are retried
+        with exponential backoff.
+
+        Args:
+            backend (DescriptionBackend): Produces the descriptions.
+            cache (DescriptionCache, optional): Descriptions by prompt.
+            max_concurrency (int, optional): Requests in flight at the same time.
+            tokens_per_minute (int, optional): Estimated prompt and completion
+                tokens sent per minute.
+            max_retries (int, optional): Retries of one request.
+            max_input_tokens (int, optional): Longer chunks are truncated.
+            window_size (int, optional): Chunks described before yielding them.
+        """
+        self.backend = backend
+        self.cache = cache
+        self.max_concurrency = max_concurrency
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.max_input_tokens = max_input_tokens
+        self.window_size = window_size
+
+        self.described_count = 0
+        self.cached_count = 0
+        self.failed_count = 0
+
+        # descriptions are cached by their prompt, which holds the truncated code,
+        # the system prompt is identified by its version
+        self.__cache_id = f"{backend.backend_id}:{PROMPT_VERSION}"
+
+        self.__loop = None
+        self.__rate_limiter = None
+
+    def __enter__(self):
+        self.__loop = asyncio.new_event_loop()
+        self.__rate_limiter = TokenRateLimiter(self.tokens_per_minute)
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__loop.run_until_complete(self.backend.close())
+        self.__loop.close()
+
+        logger.info(
+            f"Descriptions: {self.described_count} generated, {self.cached_count} taken from cache, "
+            f"{self.failed_count} failed."
+        )
+
+    def describe_nodes(self, nodes: Iterable[dict]) -> Iterator[list[dict]]:
+        """
+        Yields the descriptions of the given chunks, one list per window.
+
+        Chunks whose description failed, after all retries or with an error that
+        is not retried, are left out, they are picked up again by the next run.
+
+        Args:
+            nodes (Iterable[dict]): Chunks with 'id', 'type', 'name', 'path',
+                'code_content' and 'content_hash' keys.
+
+        Returns:
+            Iterator[list[dict]]: Rows with 'id', 'description' and
+                'description_hash' keys.
+        """
+        window = []
+
+        for node in nodes:
+            window.append(node)
+
+            if len(window) >= self.window_size:
+                yield self.__loop.run_until_complete(self.__describe_window(window))
+                window = []
+
+        if window:
+            yield self.__loop.run_until_complete(self.__describe_window(window))
+
+    async def __describe_window(self, window: list[dict]) -> list[dict]:
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def describe(node):
+            prompt = get_prompt(node, self.max_input_tokens)
+
+            if self.cache is not None:
+                description = self.cache.get(prompt, self.__cache_id)
+                if description is not None:
+                    self.cached_count += 1
+                    return description
+
+            async with semaphore:
+                description = await self.__describe_with_retries(node, prompt)
+
+            if description is not None and self.cache is not None:
+                self.cache.put(prompt, self.__cache_id, description)
+
+            return description
+
+        descriptions = await asyncio.gather(*(describe(node) for node in window))
+
+        return [
+            {
+                "id": node["id"],
+                "description": description,
+                "description_hash": node["content_hash"],
+            }
+            for node, description in zip(window, descriptions)
+            if description is not None
+        ]
+
+    async def __describe_with_retries(self, node: dict, prompt: str) -> str | None:
+        tokens = (
+            estimate_tokens(SYSTEM_PROMPT)
+            + estimate_tokens(prompt)
+            + self.backend.max_output_tokens
+        )
+
+        for attempt in range(1, self.max_retries + 2):
+            await self.__rate_limiter.acquire(tokens)
+
+            try:
+                description = await self.backend.describe(node, prompt)
+                self.described_count += 1
+                return description
+            except RetryableDescriptionError as e:
+                if attempt > self.max_retries:
+                    logger.warning(
+                        f"Describing {node['name']} in {node['path']} failed after {attempt} attempts: {e}"
+                    )
+                    self.failed_count += 1
+                    return None
+
+                # jitter spreads the retries of concurrent requests apart
+                backoff = RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+                backoff *= random.uniform(0.5, 1.5)
+                logger.debug(
+                    f"Retrying description of {node['name']} in {backoff:.1f}s: {e}"
+                )
+                await asyncio.sleep(backoff)
+            except DescriptionError as e:
+                # the chunk stays undescribed, the rest of the run goes on
+                logger.warning(
+                    f"Describing {node['name']} in {node['path']} failed: {e}"
+                )
+                self.failed_count += 1
+                return None
+
+        return None
@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import asyncio
+import time
+
+from lilith.core.utils import DiskCache
+
+
+class DescriptionError(Exception):
+    pass
+
+
+class RetryableDescriptionError(DescriptionError):
+    """Raised by backends for failures worth retrying, like rate limits or timeouts."""
+
+
+class TokenRateLimiter:
+    """
+    Async token bucket limiting the tokens sent per minute.
+
+    The bucket starts full and refills continuously, a request larger than the
+    whole bucket waits until the bucket is full and is then let through alone.
+    """
+
+    def __init__(self, tokens_per_minute: int) -> None:
+        self.capacity = tokens_per_minute
+        self.__tokens = float(tokens_per_minute)
+        self.__updated_at = time.monotonic()
+        self.__lock = asyncio.Lock()
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        self.__tokens = min(
+            self.capacity,
+            self.__tokens + (now - self.__updated_at) * self.capacity / 60,
+        )
+        self.__updated_at = now
+
+    async def acquire(self, tokens: int) -> None:
+        tokens = min(tokens, self.capacity)
+
+        # the lock keeps waiting requests in order, a large request is not
+        # starved by smaller ones arriving later
+        async with self.__lock:
+            self.__refill()
+
+            while self.__tokens < tokens:
+                await asyncio.sleep((tokens - self.__tokens) * 60 / self.capacity)
+                self.__refill()
+
+            self.__tokens -= tokens
+
+
+class DescriptionCache(DiskCache):
+    """
+    Content-addressed on-disk cache of generated descriptions.
+
+    Descriptions are keyed by the rendered prompt, the code of the chunk with its
+    type, name and path, and the identity of the backend, model and prompt
+    version that produced them.
+    """
+
+    def get(self, prompt: str, cache_id: str) -> str | None:
+        """
+        Returns the cached description, or None on a cache miss.
+
+        Args:
+            prompt (str): The prompt the chunk is described with.
+            cache_id (str): Identity of the backend, model and prompt.
+
+        Returns:
+            str | None: The description if it is cached.
+        """
+        data = self.read_entry(self.get_key(cache_id, prompt))
+
+        try:
+            return None if data is None else data.decode("utf-8")
+        except UnicodeDecodeError:
+            return None
+
+    def put(self, prompt: str, cache_id: str, description: str) -> None:
+        """
+        Stores a description in the cache.
+
+        Args:
+            prompt (str): The prompt the chunk is described with.
+            cache_id (str): Identity of the backend, model and prompt.
+            description (str): The description.
+        """
+        self.write_entry(self.get_key(cache_id, prompt), description.encode("utf-8"))
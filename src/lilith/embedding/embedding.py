@@ -0,0 +1,379 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import math
+import os
+import re
+
+from abc import ABC
+from abc import abstractmethod
+from typing import TYPE_CHECKING
+
+from lilith.embedding.utils import EmbeddingError
+from lilith.embedding.utils import InputTooLongError
+from lilith.embedding.utils import estimate_tokens
+from lilith.embedding.utils import truncate_to_tokens
+
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from collections.abc import Iterator
+
+    from lilith.embedding.utils import EmbeddingCache
+
+
+OPENAI_EMBEDDING_MODEL_VAR = "OPENAI_EMBEDDING_MODEL"
+
+DEFAULT_OPENAI_MODEL = "text-embedding-3-small"
+DEFAULT_DIMENSIONS = 1536
+DEFAULT_MAX_BATCH_TOKENS = 100_000
+DEFAULT_MAX_INPUT_TOKENS = 8000
+DEFAULT_MAX_CONCURRENCY = 4
+
+# number of exported nodes collected before their embeddings are requested
+DEFAULT_WINDOW_SIZE = 1000
+
+# an input rejected as too long is halved until it fits, but not below this length
+MIN_SHORTENED_INPUT_LENGTH = 256
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackend(ABC):
+    """
+    Turns batches of chunk texts into vectors for the EmbeddingPipeline.
+
+    Subclasses set backend_id, which is part of the EmbeddingCache key, and
+    dimensions if the vector size is known before the first request.
+    """
+
+    backend_id = None
+    dimensions = None
+
+    @abstractmethod
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embeds texts.
+
+        Args:
+            texts (list[str]): The texts.
+
+        Raises:
+            InputTooLongError: If a text exceeds the input limit of the model.
+            EmbeddingError: If the request fails.
+
+        Returns:
+            list[list[float]]: One vector per text, in order.
+        """
+
+    async def close(self) -> None:  # noqa: B027
+        """Called once the pipeline is done, remote backends close their client."""
+
+
+class OpenAIEmbeddingBackend(EmbeddingBackend):
+
+    def __init__(
+        self,
+        model: str | None = None,
+        dimensions: int | None = None,
+        base_url: str | None = None,
+        api_key: str | None = None,
+    ) -> None:
+        """
+        Backend for the OpenAI embeddings API or any server compatible with it.
+
+        Args:
+            model (str, optional): Embedding model, defaults to $OPENAI_EMBEDDING_MODEL
+                or text-embedding-3-small.
+            dimensions (int, optional): Requested vector size, if the model supports it.
+            base_url (str, optional): API url, defaults to $OPENAI_BASE_URL or OpenAI.
+            api_key (str, optional): API key, defaults to $OPENAI_API_KEY.
+        """
+        from openai import AsyncOpenAI
+
+        self.model = model or os.environ.get(
+            OPENAI_EMBEDDING_MODEL_VAR, DEFAULT_OPENAI_MODEL
+        )
+        self.dimensions = dimensions
+        self.backend_id = f"openai:{self.model}:{dimensions}"
+        self.__client = AsyncOpenAI(base_url=base_url, api_key=api_key)
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        from openai import BadRequestError
+        from openai import OpenAIError
+
+        kwargs = {"dimensions": self.dimensions} if self.dimensions else {}
+
+        try:
+            response = await self.__client.embeddings.create(
+                model=self.model, input=texts, **kwargs
+            )
+        except BadRequestError as e:
+            if (
+                e.code == "context_length_exceeded"
+                or "maximum context length" in e.message
+            ):
+                raise InputTooLongError(f"Embedding input too long: {e}")
+            raise EmbeddingError(f"Embedding request failed: {e}")
+        except OpenAIError as e:
+            raise EmbeddingError(f"Embedding request failed: {e}")
+
+        data = sorted(response.data, key=lambda item: item.index)
+        return [item.embedding for item in data]
+
+    async def close(self) -> None:
+        await self.__client.close()
+
+
+class HashEmbeddingBackend(EmbeddingBackend):
+
+    TOKEN_PATTERN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+|\S")
+
+    def __init__(self, dimensions: int = DEFAULT_DIMENSIONS) -> None:
+        """
+        Local, deterministic stand-in for a real embedding model.
+
+        Tokens of the text are hashed into a bag-of-words vector, so texts sharing
+        identifiers are similar. Meant for offline runs and testing.
+
+        Args:
+            dimensions (int, optional): Vector size. Defaults to 1536.
+        """
+        self.dimensions = dimensions
+        self.backend_id = f"hash:{dimensions}"
+
+    def embed_text(self, text: str) -> list[float]:
+        vector = [0.0] * self.dimensions
+
+        for token in self.TOKEN_PATTERN.findall(text):
+            digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+            index = int.from_bytes(digest[:4], "little") % self.dimensions
+            sign = 1.0 if digest[4] & 1 else -1.0
+            vector[index] += sign
+
+        norm = math.sqrt(sum(value * value for value in vector))
+        if norm == 0:
+            return vector
+
+        return [value / norm for value in vector]
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_text(text) for text in texts]
+
+
+def get_embedding_backend(
+    name: str, model: str | None = None, dimensions: int | None = None
+) -> EmbeddingBackend:
+    """
+    Creates an embedding backend by name.
+
+    Args:
+        name (str): 'openai' or 'hash'.
+        model (str, optional): Model of the openai backend.
+        dimensions (int, optional): Vector size.
+
+    Raises:
+        EmbeddingError: If the backend name is unknown.
+
+    Returns:
+        EmbeddingBackend: The backend.
+    """
+    if name == "openai":
+        return OpenAIEmbeddingBackend(model=model, dimensions=dimensions)
+
+    if name == "hash":
+        return HashEmbeddingBackend(dimensions=dimensions or DEFAULT_DIMENSIONS)
+
+    raise EmbeddingError(f"Unknown embedding backend: {name}")
+
+
+def group_by_token_budget(
+    items: list[tuple[dict, str]], max_batch_tokens: int
+) -> list[list[tuple[dict, str]]]:
+    """
+    Groups (node, text) pairs into request batches of at most max_batch_tokens.
+
+    Args:
+        items (list[tuple[dict, str]]): Nodes with the text to embed.
+        max_batch_tokens (int): Estimated token budget of one request.
+
+    Returns:
+        list[list[tuple[dict, str]]]: The request batches.
+    """
+    batches = []
+    batch = []
+    batch_tokens = 0
+
+    for item in items:
+        tokens = estimate_tokens(item[1])
+
+        if batch and batch_tokens + tokens > max_batch_tokens:
+            batches.append(batch)
+            batch = []
+            batch_tokens = 0
+
+        batch.append(item)
+        batch_tokens += tokens
+
+    if batch:
+        batches.append(batch)
+
+    return batches
+
+
+class EmbeddingPipeline:
+
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        cache: EmbeddingCache | None = None,
+        max_batch_tokens: int = DEFAULT_MAX_BATCH_TOKENS,
+        max_input_tokens: int = DEFAULT_MAX_INPUT_TOKENS,
+        max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+        window_size: int = DEFAULT_WINDOW_SIZE,
+    ) -> None:
+        """
+        Fills the 'embedding' field of exported nodes with code content.
+
+        Nodes are consumed in windows, the cache misses of a window are grouped by
+        token budget and requested concurrently, at most max_concurrency requests
+        at a time, on an event loop owned by the pipeline.
+
+        Args:
+            backend (EmbeddingBackend): Produces the vectors.
+            cache (EmbeddingCache, optional): Vectors by content hash. Defaults to None.
+            max_batch_tokens (int, optional): Token budget of one request.
+            max_input_tokens (int, optional): Longer chunks are truncated.
+            max_concurrency (int, optional): Requests in flight at the same time.
+            window_size (int, optional): Nodes collected before embedding them.
+        """
+        self.backend = backend
+        self.cache = cache
+        self.max_batch_tokens = max_batch_tokens
+        self.max_input_tokens = max_input_tokens
+        self.max_concurrency = max_concurrency
+        self.window_size = window_size
+
+        self.embedded_count = 0
+        self.cached_count = 0
+
+        # size of the produced vectors, taken from the first one if the backend
+        # leaves it to the model
+        self.dimensions = backend.dimensions
+
+        # truncation changes the embedded text, so it is part of the cache identity
+        self.__cache_id = f"{backend.backend_id}:{max_input_tokens}"
+
+        self.__loop = None
+
+    def __enter__(self):
+        self.__loop = asyncio.new_event_loop()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.__loop.run_until_complete(self.backend.close())
+        self.__loop.close()
+
+        logger.info(
+            f"Embeddings: {self.embedded_count} computed, {self.cached_count} taken from cache."
+        )
+
+    def embed_nodes(self, nodes: Iterable[dict]) -> Iterator[dict]:
+        """
+        Yields the given nodes, in order, with their 'embedding' filled in.
+
+        Args:
+            nodes (Iterable[dict]): Exported nodes.
+
+        Returns:
+            Iterator[dict]: The same nodes.
+        """
+        window = []
+
+        for node in nodes:
+            window.append(node)
+
+            if len(window) >= self.window_size:
+                self.__loop.run_until_complete(self.__embed_window(window))
+                yield from window
+                window = []
+
+        if window:
+            self.__loop.run_until_complete(self.__embed_window(window))
+            yield from window
+
+    async def __embed_window(self, window: list[dict]) -> None:
+        missing = []
+
+        for node in window:
+            if not node["code_content"]:
+                continue
+
+            if self.cache is not None:
+                vector = self.cache.get(node["content_hash"], self.__cache_id)
+                if vector is not None:
+                    node["embedding"] = vector
+                    self.dimensions = len(vector)
+                    self.cached_count += 1
+                    continue
+
+            missing.append(
+                (node, truncate_to_tokens(node["code_content"], self.max_input_tokens))
+            )
+
+        if not missing:
+            return
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed_batch(batch):
+            async with semaphore:
+                vectors = await self.__embed_texts([text for _, text in batch])
+
+            if len(vectors) != len(batch):
+                raise EmbeddingError(
+                    f"Expected {len(batch)} embeddings, the backend returned {len(vectors)}."
+                )
+
+            for (node, _), vector in zip(batch, vectors):
+                node["embedding"] = vector
+                self.dimensions = len(vector)
+
+                if self.cache is not None:
+                    self.cache.put(node["content_hash"], self.__cache_id, vector)
+
+            self.embedded_count += len(batch)
+
+        await asyncio.gather(
+            *(
+                embed_batch(batch)
+                for batch in group_by_token_budget(missing, self.max_batch_tokens)
+            )
+        )
+
+    async def __embed_texts(self, texts: list[str]) -> list[list[float]]:
+        """
+        Embeds texts, shortening them while the model rejects an input as too
+        long. The token estimate is a guess, a rejected batch is split in halves
+        until the input at fault is alone, and that input is cut in half until
+        it fits.
+        """
+        try:
+            return await self.backend.embed(texts)
+        except InputTooLongError:
+            if len(texts) > 1:
+                middle = len(texts) // 2
+                return [
+                    *await self.__embed_texts(texts[:middle]),
+                    *await self.__embed_texts(texts[middle:]),
+                ]
+
+            if len(texts[0]) <= MIN_SHORTENED_INPUT_LENGTH:
+                raise
+
+            logger.debug(
+                f"Embedding input of {len(texts[0])} characters too long, shortening it."
+            )
+            return await self.__embed_texts([texts[0][: len(texts[0]) // 2]])
@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from array import array
+
+from lilith.core.utils import DiskCache
+
+
+# rough average for source code, used instead of a tokenizer dependency
+CHARACTERS_PER_TOKEN = 4
+# inputs are truncated at a lower ratio, as code dense with punctuation and short
+# identifiers has fewer characters per token than the average
+TRUNCATION_CHARACTERS_PER_TOKEN = 3
+
+
+class EmbeddingError(Exception):
+    pass
+
+
+class InputTooLongError(EmbeddingError):
+    pass
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARACTERS_PER_TOKEN + 1
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    return text[: max_tokens * TRUNCATION_CHARACTERS_PER_TOKEN]
+
+
+class EmbeddingCache(DiskCache):
+    """
+    Content-addressed on-disk cache of embedding vectors.
+
+    Vectors are keyed by the content hash of the embedded chunk and the identity of
+    the backend that produced them, and stored as raw float32 arrays.
+    """
+
+    def get(self, content_hash: str, cache_id: str) -> list[float] | None:
+        """
+        Returns the cached vector, or None on a cache miss.
+
+        Args:
+            content_hash (str): Content hash of the embedded chunk.
+            cache_id (str): Identity of the backend, model and settings.
+
+        Returns:
+            list[float] | None: The vector if it is cached.
+        """
+        data = self.read_entry(self.get_key(cache_id, content_hash))
+        if data is None:
+            return None
+
+        vector = array("f")
+        vector.frombytes(data)
+        return vector.tolist()
+
+    def put(self, content_hash: str, cache_id: str, vector: list[float]) -> None:
+        """
+        Stores a vector in the cache.
+
+        Args:
+            content_hash (str): Content hash of the embedded chunk.
+            cache_id (str): Identity of the backend, model and settings.
+            vector (list[float]): The embedding.
+        """
+        self.write_entry(
+            self.get_key(cache_id, content_hash), array("f", vector).tobytes()
+        )
@@ -0,0 +1,309 @@
+"""
+Async read-only query service over the code graph.
+
+One pooled AsyncDriver is created in the lifespan of the app and shared by every
+request, queries borrow a connection from its pool instead of connecting per
+call. All queries are routed to readers and run with a server side transaction
+timeout.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+
+from contextlib import asynccontextmanager
+from typing import TYPE_CHECKING
+
+from fastapi import FastAPI
+from fastapi import HTTPException
+from fastapi import Query as QueryParameter
+from fastapi import Request
+from fastapi.responses import StreamingResponse
+from neo4j import READ_ACCESS
+from neo4j import AsyncGraphDatabase
+from neo4j import Query
+from neo4j import RoutingControl
+from neo4j.exceptions import ClientError
+from neo4j.exceptions import DriverError
+from neo4j.exceptions import Neo4jError
+from pydantic import BaseModel
+from pydantic import Field
+
+from lilith.database.database import NEO4J_NAME_VAR
+from lilith.database.database import NEO4J_PASSWORD_VAR
+from lilith.database.database import NEO4J_URI_VAR
+from lilith.database.database import VECTOR_FILTER_OVERSAMPLING
+from lilith.database.database import VECTOR_INDEX_NAME
+from lilith.lilith_server.utils import ServerError
+
+
+if TYPE_CHECKING:
+    from collections.abc import AsyncIterator
+
+    from lilith.embedding.embedding import EmbeddingBackend
+
+
+DEFAULT_QUERY_TIMEOUT_SECONDS = 10.0
+DEFAULT_MAX_CONNECTION_POOL_SIZE = 100
+DEFAULT_CONNECTION_ACQUISITION_TIMEOUT_SECONDS = 30.0
+DEFAULT_NAME_LOOKUP_LIMIT = 50
+MAX_SIMILARITY_RESULTS = 1000
+
+# node properties returned by every endpoint, embeddings are left out on purpose
+NODE_PROJECTION = (
+    "{.id, .type, .repository, .name, .path, .parent, .content_hash, .start_line, "
+    ".end_line, .qualified_name, .signature, .decorators, .docstring, .part, "
+    ".part_count, .overlap_lines, .description, "
+    "code_content: CASE WHEN $include_code THEN n.code_content END}"
+)
+
+logger = logging.getLogger(__name__)
+
+
+class SimilaritySearchRequest(BaseModel):
+    vector: list[float] | None = None
+    text: str | None = None
+    k: int = Field(default=10, ge=1, le=MAX_SIMILARITY_RESULTS)
+    type_filter: list[str] | None = None
+    repository: str | None = None
+    include_code: bool = False
+
+
+def get_query(text: str, timeout: float) -> Query:
+    return Query(text, timeout=timeout)
+
+
+def raise_http_error(e: Exception) -> None:
+    """
+    Translates driver errors into HTTP errors.
+
+    Raises:
+        HTTPException: 504 on transaction timeouts, 503 if the database or the
+            connection pool is unavailable, 500 otherwise.
+    """
+    if isinstance(e, ClientError) and "TransactionTimedOut" in (e.code or ""):
+        raise HTTPException(status_code=504, detail="Query timed out.")
+
+    if isinstance(e, DriverError):
+        raise HTTPException(status_code=503, detail=f"Database unavailable: {e}")
+
+    raise HTTPException(status_code=500, detail=str(e))
+
+
+def create_app(
+    query_timeout: float = DEFAULT_QUERY_TIMEOUT_SECONDS,
+    max_connection_pool_size: int = DEFAULT_MAX_CONNECTION_POOL_SIZE,
+    embedding_backend: EmbeddingBackend | None = None,
+) -> FastAPI:
+    """
+    Creates the query service.
+
+    Args:
+        query_timeout (float, optional): Transaction timeout of every query in seconds.
+        max_connection_pool_size (int, optional): Connections shared by all requests.
+        embedding_backend (EmbeddingBackend, optional): Embeds the 'text' of
+            similarity searches, has to be the backend the graph was built with.
+            Defaults to None, then only 'vector' searches are served.
+
+    Raises:
+        ServerError: If the database connection is not configured.
+
+    Returns:
+        FastAPI: The application.
+    """
+    uri = os.environ.get(NEO4J_URI_VAR, None)
+    name = os.environ.get(NEO4J_NAME_VAR, None)
+    password = os.environ.get(NEO4J_PASSWORD_VAR, None)
+
+    for var, value in (
+        (NEO4J_URI_VAR, uri),
+        (NEO4J_NAME_VAR, name),
+        (NEO4J_PASSWORD_VAR, password),
+    ):
+        if value is None:
+            raise ServerError(f"{var} not set.")
+
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        driver = AsyncGraphDatabase.driver(
+            uri,
+            auth=(name, password),
+            max_connection_pool_size=max_connection_pool_size,
+            connection_acquisition_timeout=DEFAULT_CONNECTION_ACQUISITION_TIMEOUT_SECONDS,
+        )
+
+        try:
+            await driver.verify_connectivity()
+        except Exception as e:
+            await driver.close()
+            raise ServerError(f"Could not setup database connection: {e}")
+
+        app.state.driver = driver
+        logger.info(f"Connected to {uri}, pool of {max_connection_pool_size}.")
+
+        try:
+            yield
+        finally:
+            await driver.close()
+
+            if embedding_backend is not None:
+                await embedding_backend.close()
+
+    app = FastAPI(title="Lilith", lifespan=lifespan)
+
+    async def read(request: Request, text: str, **parameters) -> list[dict]:
+        try:
+            records, _, _ = await request.app.state.driver.execute_query(
+                get_query(text, query_timeout),
+                parameters,
+                routing_=RoutingControl.READ,
+            )
+        except (Neo4jError, DriverError) as e:
+            raise_http_error(e)
+
+        return [record.data() for record in records]
+
+    @app.get("/health")
+    async def get_health(request: Request):
+        await read(request, "RETURN 1 AS ok")
+        return {"status": "ok"}
+
+    @app.get("/nodes/{node_id}")
+    async def get_node(request: Request, node_id: str, include_code: bool = True):
+        nodes = await read(
+            request,
+            f"MATCH (n:Node {{id: $id}}) RETURN n {NODE_PROJECTION} AS node",
+            id=node_id,
+            include_code=include_code,
+        )
+
+        if not nodes:
+            raise HTTPException(status_code=404, detail="Node not found.")
+
+        return nodes[0]["node"]
+
+    @app.get("/nodes")
+    async def find_nodes(
+        request: Request,
+        name: str,
+        prefix: bool = False,
+        node_type: str | None = QueryParameter(default=None, alias="type"),
+        repository: str | None = None,
+        limit: int = QueryParameter(default=DEFAULT_NAME_LOOKUP_LIMIT, ge=1, le=1000),
+        include_code: bool = False,
+    ):
+        # both predicates are answered by the range index on Node.name
+        name_predicate = "n.name STARTS WITH $name" if prefix else "n.name = $name"
+
+        nodes = await read(
+            request,
+            f"MATCH (n:Node) WHERE {name_predicate} "
+            "AND ($type IS NULL OR n.type = $type) "
+            "AND ($repository IS NULL OR n.repository = $repository) "
+            f"RETURN n {NODE_PROJECTION} AS node LIMIT $limit",
+            name=name,
+            type=node_type,
+            repository=repository,
+            limit=limit,
+            include_code=include_code,
+        )
+
+        return [node["node"] for node in nodes]
+
+    @app.get("/nodes/{node_id}/subtree")
+    async def get_subtree(
+        request: Request,
+        node_id: str,
+        max_depth: int | None = QueryParameter(default=None, ge=0),
+        include_code: bool = True,
+    ):
+        """Streams the subtree of a node as newline delimited JSON, one node per line."""
+        depth = "" if max_depth is None else str(int(max_depth))
+        query = get_query(
+            "MATCH (root:Node {id: $id}) "
+            f"MATCH p = (root)-[:HAS_CHILD*0..{depth}]->(n:Node) "
+            f"RETURN n {NODE_PROJECTION} AS node, length(p) AS depth",
+            query_timeout,
+        )
+
+        session = request.app.state.driver.session(default_access_mode=READ_ACCESS)
+
+        # the first record is fetched before the response starts, errors and
+        # unknown ids can still be answered with a status code
+        try:
+            result = await session.run(query, id=node_id, include_code=include_code)
+            first_record = await anext(result, None)
+        except (Neo4jError, DriverError) as e:
+            await session.close()
+            raise_http_error(e)
+
+        if first_record is None:
+            await session.close()
+            raise HTTPException(status_code=404, detail="Node not found.")
+
+        async def stream_records() -> AsyncIterator[bytes]:
+            try:
+                yield encode_record(first_record)
+
+                async for record in result:
+                    yield encode_record(record)
+            except (Neo4jError, DriverError) as e:
+                # the status line is already sent, the error ends the stream
+                logger.warning(f"Streaming subtree of {node_id} failed: {e}")
+                yield json.dumps({"error": str(e)}).encode() + b"\n"
+            finally:
+                await session.close()
+
+        return StreamingResponse(stream_records(), media_type="application/x-ndjson")
+
+    @app.post("/search/similar")
+    async def search_similar(request: Request, search: SimilaritySearchRequest):
+        if (search.vector is None) == (search.text is None):
+            raise HTTPException(
+                status_code=422, detail="Exactly one of 'vector' or 'text' is required."
+            )
+
+        vector = search.vector
+
+        if vector is None:
+            if embedding_backend is None:
+                raise HTTPException(
+                    status_code=422,
+                    detail="The server has no embedding backend, send a 'vector'.",
+                )
+
+            vector = (await embedding_backend.embed([search.text]))[0]
+
+        # the vector index is searched before the filters are applied
+        candidates = (
+            search.k
+            if search.type_filter is None and search.repository is None
+            else search.k * VECTOR_FILTER_OVERSAMPLING
+        )
+
+        matches = await read(
+            request,
+            "CALL db.index.vector.queryNodes($index, $candidates, $vector) "
+            "YIELD node AS n, score "
+            "WHERE ($types IS NULL OR n.type IN $types) "
+            "AND ($repository IS NULL OR n.repository = $repository) "
+            f"RETURN n {NODE_PROJECTION} AS node, score "
+            "ORDER BY score DESC LIMIT $k",
+            index=VECTOR_INDEX_NAME,
+            candidates=candidates,
+            vector=vector,
+            types=search.type_filter,
+            repository=search.repository,
+            k=search.k,
+            include_code=search.include_code,
+        )
+
+        return [{**match["node"], "score": match["score"]} for match in matches]
+
+    return app
+
+
+def encode_record(record) -> bytes:
+    return json.dumps({**record["node"], "depth": record["depth"]}).encode() + b"\n"
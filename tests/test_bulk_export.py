@@ -0,0 +1,38 @@
+from __future__ import annotations
+
+from lilith.database.bulk_export import export_bulk_import_files
+
+
+def get_node(index: int) -> dict:
+    return {
+        "id": f"node-{index}",
+        "type": "function",
+        "repository": "lilith-tests",
+        "name": f"f{index}",
+        "path": "/lilith-tests/module.py",
+        "parent": None if index == 0 else "node-0",
+        "code_content": f"def f{index}():\n    pass\n",
+        "embedding": None,
+        "description": None,
+        "content_hash": str(index),
+        "start_line": 1,
+        "end_line": 2,
+        "qualified_name": f"f{index}",
+        "signature": f"def f{index}()",
+        "decorators": [],
+        "docstring": None,
+        "part": None,
+        "part_count": None,
+        "overlap_lines": None,
+    }
+
+
+def test_export_removes_data_files_of_previous_export(tmp_path):
+    export_bulk_import_files([get_node(i) for i in range(3)], tmp_path, rows_per_file=1)
+    assert len(list(tmp_path.glob("nodes-*.csv"))) == 3
+
+    export_bulk_import_files([get_node(0)], tmp_path, rows_per_file=1)
+
+    assert [path.name for path in tmp_path.glob("nodes-*.csv")] == ["nodes-00001.csv"]
+    assert list(tmp_path.glob("relationships-*.csv")) == []
+    assert (tmp_path / "nodes_header.csv").exists()
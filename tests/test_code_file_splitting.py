@@ -0,0 +1,68 @@
+from __future__ import annotations
+
+import black
+import pytest
+
+from lilith.core import code_file_splitting
+from lilith.core.code_file_splitting import format_code
+from lilith.core.code_file_splitting import split_code_source
+
+
+def test_form_feed_does_not_shift_lines():
+    # a form feed is a line boundary for str.splitlines but not for the AST
+    source = "x = 1  # a\x0cb\ndef f():\n    return 1\n"
+
+    chunks = split_code_source(source)
+
+    assert [chunk["type"] for chunk in chunks] == ["code_piece", "function"]
+    assert chunks[0]["code"] == "x = 1  # a\x0cb\n"
+    assert chunks[1]["code"] == "def f():\n    return 1\n"
+    assert (chunks[1]["start_line"], chunks[1]["end_line"]) == (2, 3)
+
+
+def test_parts_of_split_chunk_follow_ast_lines():
+    body = "".join(f"    x{i} = {i}  # \x0c\n" for i in range(8))
+    source = f"def f():\n{body}    return 1\n"
+
+    parts = split_code_source(
+        source, split_min_lines=0, max_chunk_size=80, chunk_overlap_lines=1
+    )
+
+    assert [part["part"] for part in parts] == list(range(1, len(parts) + 1))
+    assert parts[0]["start_line"] == 1
+    assert parts[-1]["end_line"] == 10
+
+    source_lines = [line for line in source.split("\n") if line]
+    for part in parts:
+        code_lines = [line for line in part["code"].split("\n") if line]
+        assert code_lines == source_lines[part["start_line"] - 1 : part["end_line"]]
+        assert part["overlap_lines"] <= 1
+
+
+@pytest.mark.parametrize("normalize", ["fast", "full"])
+def test_code_black_cannot_parse_stays_unformatted(normalize):
+    code = "print 'python 2'\n"
+
+    assert format_code(code, normalize=normalize) == code
+
+
+@pytest.mark.parametrize(
+    "error",
+    [
+        black.parsing.ASTSafetyError("not equivalent"),
+        AssertionError("not stable"),
+    ],
+)
+def test_code_failing_black_checks_stays_unformatted(monkeypatch, error):
+    def format_file_contents(*args, **kwargs):
+        raise error
+
+    monkeypatch.setattr(
+        code_file_splitting.black, "format_file_contents", format_file_contents
+    )
+
+    assert format_code("x  =  1\n", normalize="full") == "x  =  1\n"
+
+
+def test_code_is_formatted():
+    assert format_code("x  =  1\n", normalize="fast") == "x = 1\n"
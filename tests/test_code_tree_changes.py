@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import pytest
+
+from lilith.core.code_tree import iterate_code_tree_changes
+from lilith.core.code_tree import iterate_code_tree_streaming
+from lilith.core.code_tree import iterate_processed_files
+from lilith.core.code_tree import walk_code_tree
+
+
+REPOSITORY = "lilith-tests"
+
+
+def iterate_tree(root, known_file_hashes=None):
+    tree_root, pending_files = walk_code_tree(
+        root, known_file_hashes=known_file_hashes, repository=REPOSITORY
+    )
+    return iterate_code_tree_streaming(
+        tree_root,
+        iterate_processed_files(pending_files, known_file_hashes=known_file_hashes),
+    )
+
+
+def get_indexed_nodes(root) -> list[dict]:
+    """The folder and file nodes a full build of root stores."""
+    return [
+        {key: node[key] for key in ("id", "type", "path", "parent", "content_hash")}
+        for node in (item.dictify_for_neo4j() for item in iterate_tree(root))
+        if node["type"] in ("folder", "file")
+    ]
+
+
+def get_changes(root, indexed_nodes, skip_unchanged=True):
+    known_file_hashes = {
+        item["path"]: item["content_hash"]
+        for item in indexed_nodes
+        if item["type"] == "file"
+    }
+    stale_ids = []
+    kept_descendants = {}
+    nodes = list(
+        iterate_code_tree_changes(
+            iterate_tree(root, known_file_hashes if skip_unchanged else None),
+            indexed_nodes,
+            stale_ids,
+            kept_descendants,
+        )
+    )
+
+    return nodes, stale_ids, kept_descendants
+
+
+def get_indexed(indexed_nodes, path) -> dict:
+    return next(item for item in indexed_nodes if item["path"] == str(path))
+
+
+@pytest.fixture
+def project(tmp_path):
+    (tmp_path / "a.py").write_text("def a():\n    return 1\n")
+    (tmp_path / "b.py").write_text("def b():\n    return 2\n\n\ndef c():\n    pass\n")
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / "d.py").write_text("X = 1\n")
+    return tmp_path
+
+
+def test_unchanged_project_writes_nothing(project):
+    indexed_nodes = get_indexed_nodes(project)
+
+    assert get_changes(project, indexed_nodes) == ([], [], {})
+
+
+def test_changed_file_is_written_with_its_chunks_and_pruned(project):
+    indexed_nodes = get_indexed_nodes(project)
+    (project / "b.py").write_text("def b():\n    return 3\n")
+
+    nodes, stale_ids, kept_descendants = get_changes(project, indexed_nodes)
+
+    file_id = get_indexed(indexed_nodes, project / "b.py")["id"]
+    assert [node["type"] for node in nodes] == ["file", "function"]
+    assert nodes[0]["id"] == file_id
+    assert nodes[1]["parent"] == file_id
+    assert stale_ids == []
+    assert kept_descendants == {file_id: [nodes[1]["id"]]}
+
+
+def test_removed_file_is_deleted(project):
+    indexed_nodes = get_indexed_nodes(project)
+    (project / "a.py").unlink()
+
+    assert get_changes(project, indexed_nodes) == (
+        [],
+        [get_indexed(indexed_nodes, project / "a.py")["id"]],
+        {},
+    )
+
+
+def test_removed_folder_is_deleted_with_its_subtree(project):
+    indexed_nodes = get_indexed_nodes(project)
+    (project / "pkg" / "d.py").unlink()
+    (project / "pkg").rmdir()
+
+    # the file goes with the folder, it is not deleted on its own
+    assert get_changes(project, indexed_nodes) == (
+        [],
+        [get_indexed(indexed_nodes, project / "pkg")["id"]],
+        {},
+    )
+
+
+def test_legacy_ids_are_taken_over_or_replaced(project):
+    indexed_nodes = get_indexed_nodes(project)
+    folder = get_indexed(indexed_nodes, project / "pkg")
+    file = get_indexed(indexed_nodes, project / "pkg" / "d.py")
+    folder["id"] = "legacy-folder"
+    file["id"] = "legacy-file"
+    file["parent"] = "legacy-folder"
+    (project / "pkg" / "d.py").write_text("X = 2\n")
+
+    nodes, stale_ids, kept_descendants = get_changes(project, indexed_nodes)
+
+    # the folder keeps its stored id, the changed file is written under its
+    # derived id and its old subtree is deleted
+    assert [node["type"] for node in nodes] == ["file", "code_piece"]
+    assert nodes[0]["parent"] == "legacy-folder"
+    assert nodes[0]["id"] != "legacy-file"
+    assert stale_ids == ["legacy-file"]
+    assert kept_descendants == {}
+
+
+def test_merge_writes_every_file_and_prunes_it(project):
+    indexed_nodes = get_indexed_nodes(project)
+
+    nodes, stale_ids, kept_descendants = get_changes(
+        project, indexed_nodes, skip_unchanged=False
+    )
+
+    file_ids = {item["id"] for item in indexed_nodes if item["type"] == "file"}
+    assert {node["id"] for node in nodes if node["type"] == "file"} == file_ids
+    assert set(kept_descendants) == file_ids
+    assert stale_ids == []
+
+
+def test_unchanged_file_keeps_its_legacy_id(project):
+    indexed_nodes = get_indexed_nodes(project)
+    get_indexed(indexed_nodes, project / "a.py")["id"] = "legacy-file"
+    (project / "b.py").write_text("def b():\n    return 3\n")
+
+    nodes, stale_ids, _ = get_changes(project, indexed_nodes)
+
+    assert [node["path"] for node in nodes if node["type"] == "file"] == [
+        str(project / "b.py")
+    ]
+    assert stale_ids == []
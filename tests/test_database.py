@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import os
+
+import pytest
+
+from neo4j import GraphDatabase
+
+from lilith.database.database import NEO4J_NAME_VAR
+from lilith.database.database import NEO4J_PASSWORD_VAR
+from lilith.database.database import NEO4J_URI_VAR
+from lilith.database.database import Neo4jGraphDatabase
+from lilith.database.utils import Neo4jDatabaseError
+
+
+TEST_REPOSITORY = "lilith-tests"
+
+
+@pytest.fixture
+def neo4j_database():
+    """
+    A database of the NEO4J_* settings, with the nodes of the test repository
+    deleted before and after the test. Tests using it are skipped without one.
+    """
+    if not all(
+        os.environ.get(var)
+        for var in (NEO4J_URI_VAR, NEO4J_NAME_VAR, NEO4J_PASSWORD_VAR)
+    ):
+        pytest.skip("no Neo4j database configured")
+
+    db = Neo4jGraphDatabase(batch_size=100)
+
+    try:
+        db.connect()
+    except Neo4jDatabaseError as e:
+        pytest.skip(f"Neo4j database not reachable: {e}")
+
+    db.reset_database(repository=TEST_REPOSITORY)
+    yield db
+    db.reset_database(repository=TEST_REPOSITORY)
+    db.close()
+
+
+def get_node_row(node_id: str, parent: str | None, **properties) -> dict:
+    return {
+        "id": node_id,
+        "type": "function",
+        "repository": TEST_REPOSITORY,
+        "name": node_id,
+        "path": "/lilith-tests/module.py",
+        "parent": parent,
+        "code_content": "def f():\n    return 1\n",
+        "embedding": None,
+        "description": None,
+        "content_hash": "f",
+        "start_line": 1,
+        "end_line": 2,
+        "part": None,
+        "part_count": None,
+        "overlap_lines": None,
+        **properties,
+    }
+
+
+def get_node_properties(node_id: str) -> dict:
+    with GraphDatabase.driver(
+        os.environ[NEO4J_URI_VAR],
+        auth=(os.environ[NEO4J_NAME_VAR], os.environ[NEO4J_PASSWORD_VAR]),
+    ) as driver:
+        records, _, _ = driver.execute_query(
+            "MATCH (n:Node {id: $id}) RETURN properties(n) AS properties", id=node_id
+        )
+
+    return records[0]["properties"]
+
+
+def test_merge_keeps_embedding_of_moved_chunk(neo4j_database):
+    file_row = get_node_row("test-file", None, type="file", code_content=None)
+    neo4j_database.insert_data(
+        [file_row, get_node_row("test-f", "test-file", embedding=[1.0, 0.0])],
+        merge=True,
+    )
+
+    # a line was added above the function, the build runs without --embed
+    neo4j_database.insert_data(
+        [file_row, get_node_row("test-f", "test-file", start_line=2, end_line=3)],
+        merge=True,
+    )
+
+    properties = get_node_properties("test-f")
+    assert properties["start_line"] == 2
+    assert properties["embedding"] == [1.0, 0.0]
+
+
+def test_merge_drops_embedding_of_changed_chunk(neo4j_database):
+    file_row = get_node_row("test-file", None, type="file", code_content=None)
+    neo4j_database.insert_data(
+        [file_row, get_node_row("test-f", "test-file", embedding=[1.0, 0.0])],
+        merge=True,
+    )
+
+    neo4j_database.insert_data(
+        [file_row, get_node_row("test-f", "test-file", content_hash="g")],
+        merge=True,
+    )
+
+    assert "embedding" not in get_node_properties("test-f")
+
+
+def test_merge_updates_part_count_of_unchanged_part(neo4j_database):
+    file_row = get_node_row("test-file", None, type="file", code_content=None)
+    neo4j_database.insert_data(
+        [file_row, get_node_row("test-f", "test-file", part=1, part_count=2)],
+        merge=True,
+    )
+
+    # a later part was added, the code of the first part stayed the same
+    neo4j_database.insert_data(
+        [file_row, get_node_row("test-f", "test-file", part=1, part_count=3)],
+        merge=True,
+    )
+
+    assert get_node_properties("test-f")["part_count"] == 3
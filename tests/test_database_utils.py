@@ -0,0 +1,22 @@
+from __future__ import annotations
+
+import pytest
+
+from neo4j.exceptions import TransientError
+
+from lilith.database.utils import RETRY_BACKOFF_SECONDS
+from lilith.database.utils import Neo4jDatabaseError
+from lilith.database.utils import get_retry_backoff
+
+
+def test_retry_backoff_doubles_until_retries_are_exhausted():
+    error = TransientError("deadlock")
+
+    assert [get_retry_backoff(error, attempt, 3) for attempt in (1, 2, 3)] == [
+        RETRY_BACKOFF_SECONDS,
+        RETRY_BACKOFF_SECONDS * 2,
+        RETRY_BACKOFF_SECONDS * 4,
+    ]
+
+    with pytest.raises(Neo4jDatabaseError, match="after 4 attempts"):
+        get_retry_backoff(error, 4, 3)
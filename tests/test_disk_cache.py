@@ -0,0 +1,40 @@
+from __future__ import annotations
+
+from lilith.core.format_cache import FormatCache
+from lilith.core.utils import DiskCache
+from lilith.description.utils import DescriptionCache
+from lilith.embedding.utils import EmbeddingCache
+
+
+def test_entries_are_sharded_by_key(tmp_path):
+    cache = DiskCache(tmp_path)
+    key = cache.get_key("a", "b")
+
+    assert cache.read_entry(key) is None
+
+    cache.write_entry(key, b"value")
+
+    assert cache.read_entry(key) == b"value"
+    assert (tmp_path / key[:2] / key).is_file()
+    assert list(tmp_path.rglob("*.tmp")) == []
+
+
+def test_key_parts_are_not_ambiguous():
+    assert DiskCache.get_key("ab", "c") != DiskCache.get_key("a", "bc")
+
+
+def test_caches_round_trip(tmp_path):
+    format_cache = FormatCache(tmp_path / "format")
+    format_cache.put("x=1", "fast", "x = 1\n")
+    assert format_cache.get("x=1", "fast") == "x = 1\n"
+    assert format_cache.get("x=1", "full") is None
+
+    embedding_cache = EmbeddingCache(tmp_path / "embeddings")
+    embedding_cache.put("hash", "hash:2", [0.5, -1.0])
+    assert embedding_cache.get("hash", "hash:2") == [0.5, -1.0]
+    assert embedding_cache.get("hash", "hash:3") is None
+
+    description_cache = DescriptionCache(tmp_path / "descriptions")
+    description_cache.put("prompt", "mock:1", "Returns one.")
+    assert description_cache.get("prompt", "mock:1") == "Returns one."
+    assert description_cache.get("other prompt", "mock:1") is None
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from lilith.core.code_tree import walk_code_tree
+from lilith.core.ignore_rules import IgnoreRules
+
+
+@pytest.mark.parametrize(
+    ("patterns", "path", "is_dir", "ignored"),
+    [
+        # names match at any level
+        (["*.pyc"], "a.pyc", False, True),
+        (["*.pyc"], "pkg/sub/a.pyc", False, True),
+        (["*.pyc"], "a.py", False, False),
+        (["tmp"], "pkg/tmp", True, True),
+        (["tmp"], "pkg/tmp", False, True),
+        # '*' and '?' stop at slashes
+        (["pkg/*.py"], "pkg/a.py", False, True),
+        (["pkg/*.py"], "pkg/sub/a.py", False, False),
+        (["a?.py"], "ab.py", False, True),
+        (["a?.py"], "a/.py", False, False),
+        (["[ab].py"], "b.py", False, True),
+        (["[!ab].py"], "b.py", False, False),
+        # a leading or inner slash anchors to the root
+        (["/build.py"], "build.py", False, True),
+        (["/build.py"], "pkg/build.py", False, False),
+        (["pkg/gen"], "pkg/gen", True, True),
+        (["pkg/gen"], "src/pkg/gen", True, False),
+        # a trailing slash only matches directories, at any level
+        (["out/"], "out", True, True),
+        (["out/"], "out", False, False),
+        (["out/"], "pkg/out", True, True),
+        # '**' matches across directories
+        (["**/cache"], "cache", True, True),
+        (["**/cache"], "a/b/cache", True, True),
+        (["docs/**"], "docs/a/b.py", False, True),
+        (["docs/**"], "docs", True, False),
+        (["a/**/b.py"], "a/b.py", False, True),
+        (["a/**/b.py"], "a/x/y/b.py", False, True),
+        (["a/**/b.py"], "c/a/b.py", False, False),
+        # the last matching rule decides
+        (["*.py", "!keep.py"], "keep.py", False, False),
+        (["*.py", "!keep.py"], "drop.py", False, True),
+        (["!keep.py", "*.py"], "keep.py", False, True),
+        (["gen/", "!gen/"], "gen", True, False),
+        # comments, blanks and escapes
+        (["# a.py", "", "   "], "# a.py", False, False),
+        (["\\#a.py"], "#a.py", False, True),
+        (["\\!a.py"], "!a.py", False, True),
+        (["a.py   "], "a.py", False, True),
+    ],
+)
+def test_patterns(patterns, path, is_dir, ignored):
+    assert IgnoreRules.from_patterns(patterns).is_ignored(path, is_dir) is ignored
+
+
+def test_rules_of_a_nested_gitignore_are_relative_to_its_folder():
+    rules = IgnoreRules.from_patterns(["*.tmp"]).extended(
+        IgnoreRules.from_patterns(["/local.py", "!keep.tmp"], base="pkg")
+    )
+
+    assert rules.is_ignored("pkg/local.py", False)
+    assert not rules.is_ignored("local.py", False)
+    assert not rules.is_ignored("pkg/sub/local.py", False)
+    assert not rules.is_ignored("pkg/keep.tmp", False)
+    assert rules.is_ignored("keep.tmp", False)
+
+
+def test_walk_applies_nested_gitignore_files(tmp_path):
+    (tmp_path / ".gitignore").write_text("generated/\n*_pb2.py\n")
+    (tmp_path / "a.py").write_text("")
+    (tmp_path / "a_pb2.py").write_text("")
+    (tmp_path / "generated").mkdir()
+    (tmp_path / "generated" / "b.py").write_text("")
+    (tmp_path / "pkg").mkdir()
+    (tmp_path / "pkg" / ".gitignore").write_text("/local.py\n!keep_pb2.py\n")
+    (tmp_path / "pkg" / "local.py").write_text("")
+    (tmp_path / "pkg" / "keep_pb2.py").write_text("")
+    (tmp_path / "pkg" / "sub").mkdir()
+    (tmp_path / "pkg" / "sub" / "local.py").write_text("")
+
+    _, files = walk_code_tree(tmp_path)
+
+    assert sorted(
+        Path(file.file_path).relative_to(tmp_path).as_posix() for file in files
+    ) == ["a.py", "pkg/keep_pb2.py", "pkg/sub/local.py"]
+
+
+def test_walk_can_ignore_gitignore_files(tmp_path):
+    (tmp_path / ".gitignore").write_text("a.py\n")
+    (tmp_path / "a.py").write_text("")
+
+    _, files = walk_code_tree(tmp_path, use_gitignore=False)
+
+    assert [Path(file.file_path).name for file in files] == ["a.py"]
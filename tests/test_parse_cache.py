@@ -0,0 +1,112 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+
+from itertools import count
+from types import SimpleNamespace
+
+import pytest
+
+from lilith.core import parse_cache
+from lilith.core.parse_cache import ParseCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Gives every cache write and use its own, increasing time."""
+    ticks = count(1)
+    monkeypatch.setattr(parse_cache, "time", SimpleNamespace(time=lambda: next(ticks)))
+
+
+def get_result(content_hash: str) -> dict:
+    return {
+        "content_hash": content_hash,
+        "chunks": [{"type": "code_piece", "code": f"X = {content_hash!r}\n"}],
+        "error": None,
+    }
+
+
+def put_file(cache: ParseCache, file_path, content_hash: str, key: str = "k"):
+    file_path.write_text(f"X = {content_hash!r}\n")
+    cache.put(file_path, os.stat(file_path), key, get_result(content_hash))
+
+
+def get_result_sizes(cache_path) -> dict[str, int]:
+    with sqlite3.connect(cache_path) as connection:
+        return dict(connection.execute("SELECT content_hash, size FROM results"))
+
+
+def test_unchanged_file_is_a_hit(tmp_path):
+    with ParseCache(tmp_path / "cache.sqlite3") as cache:
+        put_file(cache, tmp_path / "a.py", "a")
+
+    with ParseCache(tmp_path / "cache.sqlite3") as cache:
+        file_stat, result = cache.get_file_result(tmp_path / "a.py", "k")
+
+    assert file_stat.st_size == (tmp_path / "a.py").stat().st_size
+    assert result == {**get_result("a"), "cached": True}
+
+
+def test_unknown_file_is_a_miss(tmp_path):
+    (tmp_path / "a.py").write_text("")
+
+    with ParseCache(tmp_path / "cache.sqlite3") as cache:
+        file_stat, result = cache.get_file_result(tmp_path / "a.py", "k")
+        missing_stat, missing_result = cache.get_file_result(tmp_path / "b.py", "k")
+
+    assert file_stat is not None
+    assert result is None
+    assert (missing_stat, missing_result) == (None, None)
+
+
+def test_changed_file_or_settings_are_a_miss(tmp_path):
+    with ParseCache(tmp_path / "cache.sqlite3") as cache:
+        put_file(cache, tmp_path / "a.py", "a")
+
+        # other chunking settings
+        assert cache.get_file_result(tmp_path / "a.py", "other")[1] is None
+
+        # another size and mtime, the stored content hash is not trusted
+        (tmp_path / "a.py").write_text("X = 'changed'\n")
+        assert cache.get_file_result(tmp_path / "a.py", "k")[1] is None
+
+        # the result of the old content is still found by its hash
+        assert cache.get_result("a", "k") is not None
+        assert cache.get_result("b", "k") is None
+
+
+def test_least_recently_used_results_are_evicted(tmp_path, clock):
+    cache_path = tmp_path / "cache.sqlite3"
+
+    with ParseCache(cache_path) as cache:
+        for name in ("a", "b", "c"):
+            put_file(cache, tmp_path / f"{name}.py", name)
+
+    sizes = get_result_sizes(cache_path)
+
+    # a is used again, b is now the least recently used result
+    cache = ParseCache(cache_path, max_size=sizes["a"] + sizes["c"])
+    cache.put(
+        tmp_path / "a.py",
+        os.stat(tmp_path / "a.py"),
+        "k",
+        cache.get_file_result(tmp_path / "a.py", "k")[1],
+    )
+    cache.close()
+
+    assert set(get_result_sizes(cache_path)) == {"a", "c"}
+
+    with ParseCache(cache_path) as cache:
+        assert cache.get_file_result(tmp_path / "b.py", "k")[1] is None
+        assert cache.get_file_result(tmp_path / "a.py", "k")[1] is not None
+        assert cache.get_file_result(tmp_path / "c.py", "k")[1] is not None
+
+
+def test_results_beyond_max_size_are_evicted_on_close(tmp_path, clock):
+    cache_path = tmp_path / "cache.sqlite3"
+
+    with ParseCache(cache_path, max_size=0) as cache:
+        put_file(cache, tmp_path / "a.py", "a")
+
+    assert get_result_sizes(cache_path) == {}